@@ -0,0 +1,96 @@
+# DatabaseWriter.py (Background thread for project database writes)
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+
+
+MAX_BATCH = 256 # Queued writes committed together in one transaction
+
+
+class DatabaseWriter:
+    """Runs ProjectManager write methods on a dedicated thread.
+
+    The thread owns its own ProjectManager (an SQLite connection may only
+    be used by the thread that created it); with the file in WAL mode the
+    GUI connection keeps reading while it writes. Writes that queue up are
+    committed together in one transaction, so a burst of measurements
+    costs one sync to disk. submit() returns a concurrent.futures.Future
+    that is resolved once the write is committed.
+    """
+    def __init__(self, open_manager):
+        self._open_manager = open_manager # Called on the writer thread, returns a ProjectManager
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="DatabaseWriter", daemon=True)
+        self._thread.start()
+
+    def submit(self, method, *args):
+        """Queue a call of ProjectManager.<method>(*args). Returns a Future of its result."""
+        future = Future()
+        if self._closed:
+            future.set_exception(RuntimeError("Database writer is closed."))
+            return future
+        self._queue.put((future, method, args))
+        return future
+
+    def flush(self):
+        """Block until every write submitted so far has been committed (or has failed)."""
+        if self._thread.is_alive():
+            self._queue.join()
+
+    def close(self):
+        """Finish the queued writes and stop the thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        try:
+            manager = self._open_manager()
+        except Exception as e:
+            print(f"Database writer could not open the project: {e}")
+            manager = None
+        while True:
+            batch = [self._queue.get()]
+            while batch[-1] is not None and len(batch) < MAX_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            jobs = [job for job in batch if job is not None]
+            if jobs:
+                self._write(manager, jobs)
+            for _ in batch:
+                self._queue.task_done()
+            if batch[-1] is None:
+                break
+        if manager:
+            manager.close()
+
+    def _write(self, manager, jobs):
+        jobs = [job for job in jobs if job[0].set_running_or_notify_cancel()]
+        if manager is None:
+            for future, _, _ in jobs:
+                future.set_exception(RuntimeError("Project database is not open."))
+            return
+        results = []
+        try:
+            with manager.transaction():
+                for future, method, args in jobs:
+                    try:
+                        results.append((future, getattr(manager, method)(*args)))
+                    except Exception as e:
+                        print(f"Error in background write {method}: {e}")
+                        future.set_exception(e)
+        except sqlite3.Error as e:
+            # The commit failed and nothing of this batch is stored
+            print(f"Error committing background writes: {e}")
+            for future, _ in results:
+                future.set_exception(e)
+            return
+        # Results are only handed out once they are committed
+        for future, result in results:
+            future.set_result(result)
@@ -0,0 +1,76 @@
+# DocumentPool.py (Bounded pool of open PyMuPDF documents, least recently used closed first)
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import fitz # PyMuPDF
+
+
+MAX_OPEN_DOCUMENTS = 8 # Open fitz.Document handles kept per pool
+
+
+class DocumentPool:
+    """Opens PDF documents on first use and keeps at most `max_open` of them open.
+
+    A project can reference dozens of PDFs; each open document holds a
+    file descriptor and MuPDF's parsed objects, so only the recently used
+    ones stay open and the least recently used is closed when another is
+    needed. Documents in use (between acquire and release) are never
+    closed; the pool can then hold more than `max_open` for a while.
+    The bookkeeping is behind a lock, but a document itself must still
+    be used from one thread at a time (see RenderWorker).
+
+        with pool.document(path) as doc:
+            page = doc.load_page(0)
+    """
+    def __init__(self, max_open=MAX_OPEN_DOCUMENTS):
+        self.max_open = max(1, max_open)
+        self._lock = threading.Lock()
+        self._open = OrderedDict() # path -> [document, users], least recently used first
+        self.opens = 0 # Documents opened, for diagnostics
+
+    def __len__(self):
+        return len(self._open)
+
+    def __contains__(self, path):
+        return path in self._open
+
+    def acquire(self, path):
+        """The open document for `path`, opened if needed. Pair with release()."""
+        with self._lock:
+            entry = self._open.get(path)
+            if entry is None:
+                entry = self._open[path] = [fitz.open(path), 0]
+                self.opens += 1
+            self._open.move_to_end(path)
+            entry[1] += 1
+            self._evict()
+            return entry[0]
+
+    def release(self, path):
+        with self._lock:
+            entry = self._open.get(path)
+            if entry is not None:
+                entry[1] -= 1
+            self._evict()
+
+    @contextmanager
+    def document(self, path):
+        doc = self.acquire(path)
+        try:
+            yield doc
+        finally:
+            self.release(path)
+
+    def _evict(self):
+        excess = len(self._open) - self.max_open
+        for path in [path for path, (_, users) in self._open.items() if users == 0][:max(excess, 0)]:
+            self._open.pop(path)[0].close()
+
+    def close(self, path=None):
+        """Close one document (if not in use), or every unused document without `path`."""
+        with self._lock:
+            for open_path in [path] if path is not None else list(self._open):
+                entry = self._open.get(open_path)
+                if entry is not None and entry[1] == 0:
+                    self._open.pop(open_path)[0].close()
@@ -0,0 +1,118 @@
+# GeometryKernel.py (Vectorized measurement geometry over packed point arrays)
+import numpy as np
+
+
+def concat_points(blobs):
+    """Concatenate packed point BLOBs into one (N, 2) array.
+
+    Returns (points, offsets, counts): item i owns points[offsets[i]:offsets[i] + counts[i]].
+    """
+    arrays = [np.frombuffer(blob, dtype='<f8') if blob else np.empty(0) for blob in blobs]
+    counts = np.fromiter((len(a) // 2 for a in arrays), dtype=np.int64, count=len(arrays))
+    offsets = np.zeros(len(arrays), dtype=np.int64)
+    if len(arrays) > 1:
+        np.cumsum(counts[:-1], out=offsets[1:])
+    points = np.concatenate(arrays).reshape(-1, 2) if arrays else np.empty((0, 2))
+    return points, offsets, counts
+
+
+def measure(blobs):
+    """Pixel lengths, perimeters and areas of many items in one pass.
+
+    `blobs` are packed points as stored in items.points. For each item:
+    length is the open polyline length, perimeter the closed ring length
+    and area the absolute shoelace area. Returns three float64 arrays.
+    """
+    points, offsets, counts = concat_points(blobs)
+    n_items = len(counts)
+    lengths, perimeters, areas = np.zeros(n_items), np.zeros(n_items), np.zeros(n_items)
+    used = counts > 0
+    if not used.any():
+        return lengths, perimeters, areas
+
+    # Index of the next vertex of each vertex's ring, wrapping at the ring end
+    starts, ends = offsets[used], offsets[used] + counts[used] - 1
+    following = np.arange(1, len(points) + 1)
+    following[ends] = starts
+    nxt = points[following]
+
+    segments = np.hypot(nxt[:, 0] - points[:, 0], nxt[:, 1] - points[:, 1])
+    closing = np.zeros(len(points), dtype=bool)
+    closing[ends] = True
+    cross = points[:, 0] * nxt[:, 1] - nxt[:, 0] * points[:, 1]
+
+    perimeters[used] = np.add.reduceat(segments, starts)
+    lengths[used] = np.add.reduceat(np.where(closing, 0.0, segments), starts)
+    areas[used] = np.abs(np.add.reduceat(cross, starts)) / 2.0
+    return lengths, perimeters, areas
+
+
+def hole_areas(holes_blobs):
+    """Summed area of the holes of each item; `holes_blobs` are packed rings as stored in items.holes (or None)."""
+    totals = np.zeros(len(holes_blobs))
+    for index, blob in enumerate(holes_blobs):
+        if not blob:
+            continue
+        values = np.frombuffer(blob, dtype='<f8')
+        count = int(values[0])
+        lengths = values[1:1 + count].astype(np.int64)
+        ring_blobs = np.split(values[1 + count:], np.cumsum(2 * lengths)[:-1])
+        totals[index] = measure([ring.tobytes() for ring in ring_blobs])[2].sum()
+    return totals
+
+
+def scaled_values(types, blobs, scale_factor, holes_blobs=None):
+    """Real-world values for items at a new scale (real units per pixel).
+
+    Linear items get their length, areas their area less their holes;
+    other types get None (their value does not depend on the scale).
+    """
+    lengths, _, areas = measure(blobs)
+    if holes_blobs is not None:
+        areas = areas - hole_areas(holes_blobs)
+    types = np.asarray(types, dtype=object)
+    values = np.full(len(types), np.nan)
+    is_linear, is_area = types == 'linear', types == 'area'
+    values[is_linear] = lengths[is_linear] * scale_factor
+    values[is_area] = areas[is_area] * scale_factor ** 2
+    return [None if np.isnan(v) else float(v) for v in values]
+
+
+def simplify(points, tolerance, closed=False):
+    """Douglas-Peucker simplification of a polyline (or ring, if `closed`).
+
+    Keeps a vertex only where dropping it would move the outline by more
+    than `tolerance`, so the result stays within that distance of the
+    original. A ring is simplified as a path from its first vertex back
+    to itself. Returns an (M, 2) array; rings keep at least 3 vertices.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    path = np.vstack((points, points[:1])) if closed and len(points) else points
+    if len(path) < 3:
+        return points.copy()
+    keep = np.zeros(len(path), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(path) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start, inner = path[first], path[first + 1:last]
+        dx, dy = path[last] - start
+        chord = np.hypot(dx, dy)
+        if chord == 0: # Closed run: measure from the shared end point
+            distances = np.hypot(inner[:, 0] - start[0], inner[:, 1] - start[1])
+        else:
+            distances = np.abs(dx * (inner[:, 1] - start[1]) - dy * (inner[:, 0] - start[0])) / chord
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance:
+            split = first + 1 + index
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    simplified = path[keep]
+    if closed:
+        simplified = simplified[:-1]
+        if len(simplified) < 3:
+            return points.copy()
+    return simplified
@@ -4,6 +4,13 @@ from PyQt6.QtWidgets import QGraphicsView, QRubberBand
 from PyQt6.QtGui import QPainter, QMouseEvent, QWheelEvent, QTransform, QColor, QPen, QPolygonF, QBrush
 from PyQt6.QtCore import Qt, QRectF, QPointF, QRect, QPoint, pyqtSignal, QLineF
 
+from SnapIndex import SNAP_ENDPOINT, SNAP_INTERSECTION
+
+
+SNAP_TOOLS = ("measure_linear", "measure_area", "set_scale") # Tools whose clicks snap to PDF geometry
+SNAP_TOLERANCE_PX = 10 # Snap radius in view pixels, whatever the zoom
+SNAP_MARKER_PX = 6     # Half size of the snap marker in view pixels
+
 
 class GraphicsView(QGraphicsView):
     mouse_moved_scene_pos = pyqtSignal(QPointF)
@@ -11,6 +18,8 @@ class GraphicsView(QGraphicsView):
     mouse_double_clicked_scene_pos = pyqtSignal(QPointF) # For ending polygons etc.
     esc_pressed = pyqtSignal()
     selection_changed_signal = pyqtSignal(list) # Emit list of selected item IDs
+    visible_rect_changed = pyqtSignal(QRectF) # Scene area shown changed (scroll, zoom, resize)
+    symbol_box_selected = pyqtSignal(QRectF) # Find Symbols tool: box dragged around a symbol (scene rect)
 
     def __init__(self, scene, parent=None):
         super().__init__(scene, parent)
@@ -32,11 +41,18 @@ class GraphicsView(QGraphicsView):
         self._current_points_scene = [] # For multi-point tools like area
         self._temp_item = None # Item being drawn (e.g., QGraphicsLineItem)
 
+        # Snapping to the page's vector geometry (SnapIndex of the current page, set by MainWindow)
+        self.snap_index = None
+        self.snap_enabled = True
+        self._snap = None # (x, y, kind) of the feature under the cursor, drawn in drawForeground
+        self._last_visible_rect = QRectF()
+
 
     def set_tool(self, tool_name):
         self._current_tool = tool_name
         print(f"Tool changed to: {tool_name}")
         self.reset_drawing_state() # Clear temps when switching tool
+        self._set_snap(None)
         if tool_name == "pan":
             self.setDragMode(QGraphicsView.DragMode.ScrollHandDrag)
             self.setCursor(Qt.CursorShape.OpenHandCursor)
@@ -51,6 +67,86 @@ class GraphicsView(QGraphicsView):
     def get_tool(self):
         return self._current_tool
 
+    def set_snap_index(self, snap_index):
+        self.snap_index = snap_index
+        self._set_snap(None)
+
+    def snap_scene_pos(self, scene_pos, modifiers=Qt.KeyboardModifier.NoModifier):
+        """Move a scene position onto the nearest PDF feature within the snap tolerance.
+
+        Only drawing tools snap; holding Shift places the point freely.
+        """
+        snap = None
+        if (self.snap_enabled and self.snap_index is not None and self._current_tool in SNAP_TOOLS
+                and not modifiers & Qt.KeyboardModifier.ShiftModifier):
+            tolerance = SNAP_TOLERANCE_PX / self.transform().m11() # View pixels -> scene pixels
+            snap = self.snap_index.nearest(scene_pos.x(), scene_pos.y(), tolerance)
+        self._set_snap(snap)
+        return QPointF(snap[0], snap[1]) if snap else scene_pos
+
+    def _set_snap(self, snap):
+        if snap == self._snap:
+            return
+        # Repaint only around the old and the new marker
+        for marker in (self._snap, snap):
+            if marker:
+                center = self.mapFromScene(QPointF(marker[0], marker[1]))
+                size = SNAP_MARKER_PX + 2
+                self.viewport().update(QRect(center.x() - size, center.y() - size, 2 * size + 1, 2 * size + 1))
+        self._snap = snap
+
+    def _check_visible_rect(self):
+        """Emit visible_rect_changed when the scene area shown is not the one last reported."""
+        visible = self.mapToScene(self.viewport().rect()).boundingRect()
+        if visible != self._last_visible_rect:
+            self._last_visible_rect = visible
+            self.visible_rect_changed.emit(visible)
+
+    # Scrolling, resizing and every change of the transform report the visible area
+    def scrollContentsBy(self, dx, dy):
+        super().scrollContentsBy(dx, dy)
+        self._check_visible_rect()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._check_visible_rect()
+
+    def scale(self, sx, sy):
+        super().scale(sx, sy)
+        self._check_visible_rect()
+
+    def setTransform(self, matrix, combine=False):
+        super().setTransform(matrix, combine)
+        self._check_visible_rect()
+
+    def resetTransform(self):
+        super().resetTransform()
+        self._check_visible_rect()
+
+    def fitInView(self, *args, **kwargs):
+        super().fitInView(*args, **kwargs)
+        self._check_visible_rect()
+
+    def drawForeground(self, painter, rect):
+        super().drawForeground(painter, rect)
+        if not self._snap:
+            return
+        x, y, kind = self._snap
+        center = QPointF(self.mapFromScene(QPointF(x, y)))
+        size = SNAP_MARKER_PX
+        painter.save()
+        painter.resetTransform() # Draw the marker in view pixels so it keeps its size when zooming
+        painter.setPen(QPen(QColor("magenta"), 1.5))
+        painter.setBrush(Qt.BrushStyle.NoBrush)
+        if kind == SNAP_ENDPOINT:
+            painter.drawRect(QRectF(center.x() - size, center.y() - size, 2 * size, 2 * size))
+        elif kind == SNAP_INTERSECTION:
+            painter.drawLine(center + QPointF(-size, -size), center + QPointF(size, size))
+            painter.drawLine(center + QPointF(-size, size), center + QPointF(size, -size))
+        else: # Midpoint
+            painter.drawPolygon(QPolygonF([center + QPointF(0, -size), center + QPointF(size, size), center + QPointF(-size, size)]))
+        painter.restore()
+
     def wheelEvent(self, event: QWheelEvent):
         zoom_in_factor = 1.15
         zoom_out_factor = 1 / zoom_in_factor
@@ -76,7 +172,7 @@ class GraphicsView(QGraphicsView):
         event.accept() # Accept the event
 
     def mousePressEvent(self, event: QMouseEvent):
-        scene_pos = self.mapToScene(event.pos())
+        scene_pos = self.snap_scene_pos(self.mapToScene(event.pos()), event.modifiers())
         print(f"Mouse Press at View:{event.pos()}, Scene:{scene_pos}") # Debug
 
         if event.button() == Qt.MouseButton.MiddleButton:
@@ -110,7 +206,19 @@ class GraphicsView(QGraphicsView):
                 else: # Second click finishes linear/scale
                     self.finish_current_drawing(scene_pos)
 
-            # --- Add logic for Area, Count, Text, Curve etc. ---
+            elif self._current_tool == "find_symbols":
+                self._is_drawing = True
+                self._start_point_scene = scene_pos
+                self._temp_item = self.scene().addRect(
+                    QRectF(scene_pos, scene_pos),
+                    QPen(QColor("blue"), 1 / self.transform().m11(), Qt.PenStyle.DashLine)
+                )
+                self._temp_item.setZValue(1000) # Ensure it's on top
+
+            elif self._current_tool in ("count", "detect_room"):
+                pass # MainWindow acts on the click signal below
+
+            # --- Add logic for Area, Text, Curve etc. ---
             elif self._current_tool == "measure_area":
                  self._is_drawing = True # Keep drawing flag until finished
                  self._current_points_scene.append(scene_pos)
@@ -127,7 +235,7 @@ class GraphicsView(QGraphicsView):
             super().mousePressEvent(event) # Pass other buttons (like right-click) up
 
     def mouseMoveEvent(self, event: QMouseEvent):
-        scene_pos = self.mapToScene(event.pos())
+        scene_pos = self.snap_scene_pos(self.mapToScene(event.pos()), event.modifiers())
         self.mouse_moved_scene_pos.emit(scene_pos) # Emit for status bar update
 
         if self._is_panning and event.buttons() & Qt.MouseButton.MiddleButton:
@@ -154,6 +262,10 @@ class GraphicsView(QGraphicsView):
                     self._temp_item.setPolygon(poly)
                 event.accept()
                 return
+            elif self._current_tool == "find_symbols" and self._temp_item and self._start_point_scene:
+                self._temp_item.setRect(QRectF(self._start_point_scene, scene_pos).normalized())
+                event.accept()
+                return
             # Add logic for other drawing tools if needed (e.g., rect, circle resize)
 
         # For selection rubber band
@@ -183,6 +295,14 @@ class GraphicsView(QGraphicsView):
                  self.selection_changed_signal.emit(selected_db_ids)
                  return
 
+             elif self._current_tool == "find_symbols" and self._is_drawing:
+                 box = QRectF(self._start_point_scene, scene_pos).normalized()
+                 self.reset_drawing_state()
+                 if box.width() > 0 and box.height() > 0:
+                     self.symbol_box_selected.emit(box)
+                 event.accept()
+                 return
+
              # Don't finish linear/scale on release, wait for second click in mousePressEvent
              # Area also continues until double-click or key press
 
@@ -193,7 +313,7 @@ class GraphicsView(QGraphicsView):
             super().mouseReleaseEvent(event)
 
     def mouseDoubleClickEvent(self, event: QMouseEvent):
-        scene_pos = self.mapToScene(event.pos())
+        scene_pos = self.snap_scene_pos(self.mapToScene(event.pos()), event.modifiers())
         if event.button() == Qt.MouseButton.LeftButton:
             if self._current_tool == "measure_area" and self._is_drawing and len(self._current_points_scene) >= 3:
                 self.finish_current_drawing(scene_pos, is_double_click=True) # Final point is the double-click pos
@@ -1,21 +1,34 @@
 # MainWindow.py (Partial - Core structure, PDF/Image loading, basic actions)
 import os
 import math
+import sqlite3
+import time
+from itertools import islice
+from collections import OrderedDict
 from PyQt6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QFileDialog, QMessageBox,
     QGraphicsScene, QLabel, QStatusBar, QDockWidget, QListWidget,
     QInputDialog, QLineEdit, QDialog, QPushButton, QFormLayout, QSpinBox,
-    QListWidgetItem, QMenu, QHBoxLayout
+    QListWidgetItem, QMenu, QHBoxLayout, QProgressDialog, QApplication, QColorDialog,
+    QTableView, QHeaderView, QAbstractItemView, QProgressBar
 )
-from PyQt6.QtGui import QPixmap, QImage, QAction, QIcon, QColor, QPen, QPainterPath, QPolygonF
-from PyQt6.QtCore import Qt, QPointF, QSize, pyqtSlot, QLineF
-import fitz # PyMuPDF
-from PyQt6.QtGui import QImage, QPixmap # Make sure QImage is imported
+from PyQt6.QtGui import QPixmap, QAction, QIcon, QColor, QPen, QPainterPath
+from PyQt6.QtCore import Qt, QPointF, QRectF, QSize, pyqtSlot, pyqtSignal, QLineF, QSettings, QTimer
 
 # Assume other imports like GraphicsView, ProjectManager are available
 from GraphicsView import GraphicsView # Assuming GraphicsView.py exists
 from ProjectManager import ProjectManager # Assuming ProjectManager.py exists
-# from items import LinearMeasurementItem, AreaMeasurementItem # etc. - Placeholder
+from PageSource import ProjectPageSource
+from TiledPageItem import TiledPageItem
+from RenderWorker import RenderWorker, PREFETCH_RADIUS
+from RenderCache import DiskRenderCache, cache_dir_for_project, DEFAULT_DISK_CACHE_MB
+from PixmapCache import PixmapCache, DEFAULT_MEMORY_BUDGET_MB
+import GeometryKernel
+import PolygonOps
+from ResultsModel import ResultsModel, SubtotalsModel
+from SymbolMatcher import SymbolSearch, template_from_raster, DEFAULT_THRESHOLD, MATCH_DPI
+from RoomDetector import detect_room, ROOM_DPI
+from items import DirtyTracker, LayerRegistry, MeasurementRecord, MeasurementStore, MeasurementOverviewItem, ITEM_CLASSES
 
 
 # Helper function (consider moving to utils.py)
@@ -23,37 +36,21 @@ def calculate_distance(p1: QPointF, p2: QPointF):
     """Calculates Euclidean distance between two QPointF points."""
     return math.sqrt((p1.x() - p2.x())**2 + (p1.y() - p2.y())**2)
 
-# Placeholder for custom graphics items (move to items.py later)
-from PyQt6.QtWidgets import QGraphicsLineItem, QGraphicsPolygonItem, QGraphicsItem
-from PyQt6.QtGui import QPen, QColor, QBrush
-
-class LinearMeasurementItem(QGraphicsLineItem):
-    def __init__(self, p1, p2, db_id=None, layer_id=None, value=0, unit="", parent=None):
-        super().__init__(p1.x(), p1.y(), p2.x(), p2.y(), parent)
-        self.setPen(QPen(QColor("green"), 2, Qt.PenStyle.SolidLine)) # Example style
-        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsSelectable)
-        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsMovable) # Basic move
-        self.db_id = db_id
-        self.layer_id = layer_id
-        self.value = value
-        self.unit = unit
-        self.item_type = "linear"
-        self.setData(Qt.ItemDataRole.UserRole + 1, self.db_id) # Store db_id for easy retrieval
-
-    def get_data_for_db(self):
-        line = self.line()
-        return {
-            'id': self.db_id,
-            'layer_id': self.layer_id,
-            'type': self.item_type,
-            'points': [(line.p1().x(), line.p1().y()), (line.p2().x(), line.p2().y())],
-            'value': self.value,
-            'unit': self.unit,
-            'style': {'color': self.pen().color().name(), 'width': self.pen().width()}
-        }
+
+LOAD_SLICE_SECONDS = 0.03 # Time spent creating items per event-loop turn while a page loads
+LOAD_SLICE_ITEMS = 200    # Items created between time checks
+CULL_MARGIN = 0.5    # Items exist for measurements within this fraction of the view size around it
+ITEM_POOL_SIZE = 256 # Released items kept per type for reuse
+TINY_ITEM_PX = 3     # Measurements smaller than this on screen are drawn as dots by the overview item
+SNAP_INDEX_PAGES = 8 # Snap indexes kept in memory (they are also cached on disk)
+PAGE_RASTERS = 2     # Grayscale page rasters kept in memory for image analysis
+
 
 # --- Main Window ---
 class MainWindow(QMainWindow):
+    write_finished = pyqtSignal() # A background database write completed (emitted from the writer thread)
+    symbols_found = pyqtSignal(object) # A page of a symbol search finished (its Future, emitted from a pool thread)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("QSTape")
@@ -63,9 +60,34 @@ class MainWindow(QMainWindow):
         self.project_manager = ProjectManager()
         self.current_project_path = None
         self.project_data = {} # Holds metadata like scale, source path, etc.
-        self.pdf_images = [] # Holds QPixmap pages if PDF is loaded
+        self.page_source = None # ProjectPageSource, renders the sheets of the project's PDFs on demand
+        self.sources = [] # Source documents of the project in sheet order, dicts {'id', 'path', 'source_type'}
+        self.render_worker = None # RenderWorker, renders pages off the GUI thread
+        # Rendered previews and tiles, bounded by a memory budget
+        self.pixmap_cache = PixmapCache(QSettings().value("render/memory_budget_mb", DEFAULT_MEMORY_BUDGET_MB, type=int))
+        self.snap_indexes = OrderedDict() # page index -> SnapIndex, most recently used last
+        self.page_rasters = OrderedDict() # (page index, dpi) -> grayscale array, most recently used last
+        self.raster_waiters = {} # (page index, dpi) -> callbacks waiting for that raster
+        self.room_click = None # (page index, scene point) of the Detect Room click waiting for its raster
         self.current_page_index = 0
         self.background_item = None # QGraphicsPixmapItem for the image/PDF page
+        # Measurements of the current page; graphics items exist only for those near the view
+        self.measurement_store = MeasurementStore()
+        self.layer_registry = LayerRegistry() # Live measurement items, by layer
+        self.item_pool = {item_type: [] for item_type in ITEM_CLASSES} # Released items for reuse
+        self.overview_item = None # MeasurementOverviewItem drawing the measurements too small for items
+        # Measurements moved since the last save; only these are written back
+        self.dirty_tracker = DirtyTracker(on_change=lambda item: self.setWindowModified(True))
+        # New measurements whose insert is still queued on the writer thread:
+        # record -> (Future, index of the record in a bulk insert or None)
+        self.pending_saves = {}
+        self.write_finished.connect(self.apply_finished_saves)
+        self.symbol_search = None # SymbolSearch in progress
+        self.symbol_search_progress = None
+        self.symbol_search_layer_id = None
+        self.symbol_search_found = 0
+        self.symbols_found.connect(self.handle_symbols_found)
+        self.item_loader = None # Generator of the current page's item rows while it is being loaded
 
         # Active Layer Tracking
         self.layers = [] # List of layer dicts {'id': ..., 'name': ..., 'visible': ..., 'color': ...}
@@ -74,6 +96,7 @@ class MainWindow(QMainWindow):
         # --- Central Widget ---
         self.scene = QGraphicsScene(self)
         self.view = GraphicsView(self.scene, self)
+        self.view.snap_enabled = QSettings().value("snap/enabled", True, type=bool)
         self.setCentralWidget(self.view)
 
         # --- UI Elements ---
@@ -90,6 +113,12 @@ class MainWindow(QMainWindow):
         # self.view.measurement_complete.connect(self.handle_measurement_finished)
         self.view.mouse_clicked_scene_pos.connect(self.handle_view_click)
         self.view.mouse_double_clicked_scene_pos.connect(self.handle_view_double_click)
+        self.view.symbol_box_selected.connect(self.find_symbols)
+        # Create/release measurement items as the visible area changes (at most once per event-loop turn)
+        self.visible_items_timer = QTimer(self)
+        self.visible_items_timer.setSingleShot(True)
+        self.visible_items_timer.timeout.connect(self.update_visible_items)
+        self.view.visible_rect_changed.connect(lambda rect: self.visible_items_timer.start(0))
 
 
         # --- Initialization ---
@@ -107,6 +136,11 @@ class MainWindow(QMainWindow):
         self.save_project_action.triggered.connect(self.save_project)
         self.save_project_as_action = QAction(QIcon.fromTheme("document-save-as"), "Save Project &As...", self)
         self.save_project_as_action.triggered.connect(self.save_project_as)
+        self.duplicate_project_action = QAction(QIcon.fromTheme("edit-copy"), "&Duplicate Project...", self)
+        self.duplicate_project_action.triggered.connect(self.duplicate_project)
+        self.add_sources_action = QAction(QIcon.fromTheme("document-import"), "Add Source &Documents...", self)
+        self.add_sources_action.setToolTip("Add more PDF drawing sets to the project; their sheets follow the current ones")
+        self.add_sources_action.triggered.connect(self.add_source_documents)
         self.exit_action = QAction(QIcon.fromTheme("application-exit"), "E&xit", self)
         self.exit_action.triggered.connect(self.close)
 
@@ -129,7 +163,29 @@ class MainWindow(QMainWindow):
         self.measure_linear_action.triggered.connect(lambda: self.set_tool("measure_linear"))
         self.measure_area_action = QAction(QIcon.fromTheme("draw-polygon"), "Measure &Area", self, checkable=True)
         self.measure_area_action.triggered.connect(lambda: self.set_tool("measure_area"))
-        # Add actions for Count, Text, Curve, Shapes...
+        self.detect_room_action = QAction(QIcon.fromTheme("draw-polygon"), "Detect &Room", self, checkable=True)
+        self.detect_room_action.setToolTip("Click inside a room to measure its area")
+        self.detect_room_action.triggered.connect(lambda: self.set_tool("detect_room"))
+        self.count_tool_action = QAction(QIcon.fromTheme("list-add"), "&Count", self, checkable=True)
+        self.count_tool_action.triggered.connect(lambda: self.set_tool("count"))
+        self.find_symbols_action = QAction(QIcon.fromTheme("edit-find"), "Find &Symbols", self, checkable=True)
+        self.find_symbols_action.setToolTip("Box one symbol to count every copy of it on this page or all pages")
+        self.find_symbols_action.triggered.connect(lambda: self.set_tool("find_symbols"))
+        # Add actions for Text, Curve, Shapes...
+
+        # Edit Actions: boolean operations on area measurements
+        self.union_areas_action = QAction("&Union Selected Areas", self)
+        self.union_areas_action.triggered.connect(self.union_selected_areas)
+        self.intersect_areas_action = QAction("&Intersect Selected Areas", self)
+        self.intersect_areas_action.triggered.connect(self.intersect_selected_areas)
+        self.subtract_areas_action = QAction("&Subtract From Largest Selected Area", self)
+        self.subtract_areas_action.setToolTip("Cut the other selected areas out of the largest one (they are kept)")
+        self.subtract_areas_action.triggered.connect(self.subtract_selected_areas)
+        self.deduct_layer_action = QAction("&Deduct Layer From Active Layer...", self)
+        self.deduct_layer_action.setToolTip("Cut the areas of another layer (openings, voids) out of the active layer's areas on this page")
+        self.deduct_layer_action.triggered.connect(self.deduct_layer_areas)
+        self.merge_areas_action = QAction("&Merge Overlapping Areas on Active Layer", self)
+        self.merge_areas_action.triggered.connect(self.merge_layer_areas)
 
         # PDF Page Navigation (Disabled initially)
         self.prev_page_action = QAction(QIcon.fromTheme("go-previous"), "&Previous Page", self)
@@ -138,6 +194,12 @@ class MainWindow(QMainWindow):
         self.next_page_action.triggered.connect(self.next_page)
         self.goto_page_action = QAction(QIcon.fromTheme("go-jump"), "&Go To Page...", self)
         self.goto_page_action.triggered.connect(self.goto_page)
+        self.render_cache_action = QAction("Render &Memory Budget...", self)
+        self.render_cache_action.triggered.connect(self.configure_render_cache)
+        self.snap_action = QAction("S&nap to Geometry", self, checkable=True)
+        self.snap_action.setToolTip("Snap measurement points to PDF line ends, midpoints and crossings (hold Shift to place freely)")
+        self.snap_action.setChecked(self.view.snap_enabled)
+        self.snap_action.toggled.connect(self.set_snap_enabled)
 
         # Layer Actions
         self.add_layer_action = QAction(QIcon.fromTheme("list-add"), "Add Layer...", self)
@@ -151,7 +213,8 @@ class MainWindow(QMainWindow):
         # Group tools for radio-button behavior
         self.tool_actions = [
             self.select_tool_action, self.pan_tool_action,
-            self.set_scale_action, self.measure_linear_action, self.measure_area_action
+            self.set_scale_action, self.measure_linear_action, self.measure_area_action,
+            self.detect_room_action, self.count_tool_action, self.find_symbols_action
             # Add other tool actions here
         ]
 
@@ -165,12 +228,21 @@ class MainWindow(QMainWindow):
         file_menu.addAction(self.open_project_action)
         file_menu.addAction(self.save_project_action)
         file_menu.addAction(self.save_project_as_action)
+        file_menu.addAction(self.duplicate_project_action)
+        file_menu.addSeparator()
+        file_menu.addAction(self.add_sources_action)
         file_menu.addSeparator()
         file_menu.addAction(self.exit_action)
 
         # Edit Menu (Placeholder)
         edit_menu = menu_bar.addMenu("&Edit")
         # Add Undo/Redo, Copy/Paste, Delete actions later
+        edit_menu.addAction(self.union_areas_action)
+        edit_menu.addAction(self.intersect_areas_action)
+        edit_menu.addAction(self.subtract_areas_action)
+        edit_menu.addSeparator()
+        edit_menu.addAction(self.deduct_layer_action)
+        edit_menu.addAction(self.merge_areas_action)
 
         # View Menu
         view_menu = menu_bar.addMenu("&View")
@@ -182,6 +254,9 @@ class MainWindow(QMainWindow):
         view_menu.addAction(self.next_page_action)
         view_menu.addAction(self.goto_page_action)
         view_menu.addSeparator()
+        view_menu.addAction(self.render_cache_action)
+        view_menu.addAction(self.snap_action)
+        view_menu.addSeparator()
         # Option to show/hide docks
         view_menu.addAction(self.layers_dock.toggleViewAction())
 
@@ -194,6 +269,9 @@ class MainWindow(QMainWindow):
         tools_menu.addAction(self.set_scale_action)
         tools_menu.addAction(self.measure_linear_action)
         tools_menu.addAction(self.measure_area_action)
+        tools_menu.addAction(self.detect_room_action)
+        tools_menu.addAction(self.count_tool_action)
+        tools_menu.addAction(self.find_symbols_action)
         # Add other tools
 
         # Layers Menu (Could also be managed via Dock context menu)
@@ -227,6 +305,9 @@ class MainWindow(QMainWindow):
         tools_toolbar.addAction(self.set_scale_action)
         tools_toolbar.addAction(self.measure_linear_action)
         tools_toolbar.addAction(self.measure_area_action)
+        tools_toolbar.addAction(self.detect_room_action)
+        tools_toolbar.addAction(self.count_tool_action)
+        tools_toolbar.addAction(self.find_symbols_action)
         # Add other tools...
 
 
@@ -238,7 +319,12 @@ class MainWindow(QMainWindow):
         self.status_label_scale = QLabel("Scale: Not Set")
         self.status_label_page = QLabel("Page: -/-")
 
+        self.load_progress = QProgressBar() # Shown while a page's measurements are loading
+        self.load_progress.setMaximumWidth(160)
+        self.load_progress.hide()
+
         self.status_bar.addWidget(self.status_label_main, 1) # Stretch factor 1
+        self.status_bar.addPermanentWidget(self.load_progress)
         self.status_bar.addPermanentWidget(self.status_label_page)
         self.status_bar.addPermanentWidget(self.status_label_scale)
         self.status_bar.addPermanentWidget(self.status_label_coords)
@@ -276,10 +362,34 @@ class MainWindow(QMainWindow):
         self.layers_dock.setWidget(layer_widget)
         self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.layers_dock)
 
-        # Results Dock (Placeholder - populate later)
+        # Results Dock: table views over models, so only the visible rows are ever formatted
         self.results_dock = QDockWidget("Measurements", self)
-        self.results_list_widget = QListWidget() # Or a QTreeView for more structure
-        self.results_dock.setWidget(self.results_list_widget)
+        self.results_model = ResultsModel(self)
+        self.results_view = QTableView()
+        self.results_view.setModel(self.results_model)
+        self.results_view.setSortingEnabled(True) # Sorts in ResultsModel.sort
+        self.results_view.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.results_view.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.results_view.verticalHeader().hide()
+        # Fixed row heights: the view never measures rows it does not show
+        self.results_view.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.results_view.horizontalHeader().setStretchLastSection(True)
+
+        self.subtotals_model = SubtotalsModel(self.results_model, self)
+        self.subtotals_view = QTableView()
+        self.subtotals_view.setModel(self.subtotals_model)
+        self.subtotals_view.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.subtotals_view.verticalHeader().hide()
+        self.subtotals_view.horizontalHeader().setStretchLastSection(True)
+        self.subtotals_view.setMaximumHeight(150)
+
+        results_widget = QWidget()
+        results_layout = QVBoxLayout(results_widget)
+        results_layout.addWidget(self.results_view)
+        results_layout.addWidget(QLabel("Subtotals by layer"))
+        results_layout.addWidget(self.subtotals_view)
+        results_layout.setContentsMargins(2,2,2,2)
+        self.results_dock.setWidget(results_widget)
         self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.results_dock)
 
         # Tabify docks if desired
@@ -315,6 +425,10 @@ class MainWindow(QMainWindow):
             # Create new DB
             self.current_project_path = project_path
             self.project_manager.connect(self.current_project_path)
+            self.project_manager.start_writer()
+            source_type = 'pdf' if file_path.lower().endswith('.pdf') else 'image'
+            self.project_manager.add_sources([file_path], source_type)
+            self.sources = self.project_manager.load_sources()
 
             # Load the source file
             if not self.load_source_file(file_path):
@@ -326,8 +440,8 @@ class MainWindow(QMainWindow):
             # Initialize project data
             self.project_data = {
                 'name': os.path.basename(project_path).replace('.qst', ''),
-                'source_path': file_path,
-                'source_type': 'pdf' if file_path.lower().endswith('.pdf') else 'image',
+                'source_path': file_path, # The first source document
+                'source_type': source_type,
                 'current_page': 0,
                 'scale_p1': (None, None), 'scale_p2': (None, None),
                 'scale_real_dist': None, 'scale_unit': None, 'scale_factor': None
@@ -357,18 +471,24 @@ class MainWindow(QMainWindow):
                 try:
                     self.current_project_path = project_path
                     self.project_manager.connect(self.current_project_path)
+                    self.project_manager.start_writer()
                     self.project_data = self.project_manager.load_project_metadata()
+                    self.sources = self.project_manager.load_sources()
 
-                    if not self.project_data or not self.project_data.get('source_path'):
+                    if not self.project_data or not self.sources:
                         raise ValueError("Project file is missing essential data (like source path).")
 
-                    if not self.load_source_file(self.project_data['source_path']):
-                         raise ValueError(f"Failed to load the source file linked to the project:\n{self.project_data['source_path']}")
+                    # Layers first: displaying a page loads its items with their layer visibility
+                    self.load_layers_from_db()
+
+                    if not self.load_source_files([source['path'] for source in self.sources]):
+                         raise ValueError("Failed to load the source files linked to the project:\n"
+                                          + "\n".join(source['path'] for source in self.sources))
 
                     # Set current page if PDF
-                    if self.project_data['source_type'] == 'pdf' and self.pdf_images:
+                    if self.project_data['source_type'] == 'pdf' and self.page_source:
                         page_to_load = self.project_data.get('current_page', 0)
-                        if 0 <= page_to_load < len(self.pdf_images):
+                        if 0 <= page_to_load < self.page_count():
                              self.current_page_index = page_to_load
                              self.display_page(self.current_page_index)
                         else:
@@ -377,8 +497,8 @@ class MainWindow(QMainWindow):
                              self.display_page(self.current_page_index)
 
 
-                    self.load_layers_from_db()
-                    self.load_items_from_db() # Load measurements
+                    if self.project_data['source_type'] != 'pdf':
+                        self.load_items_from_db() # PDF pages load their own measurements
                     self.update_ui_from_project_data()
                     self.set_status(f"Project opened: {self.project_data.get('name', 'Unknown')}")
 
@@ -403,10 +523,22 @@ class MainWindow(QMainWindow):
         # Update project data before saving (e.g., current page)
         self.project_data['current_page'] = self.current_page_index
 
+        # Everything below is written in a single transaction (one commit); a failed write rolls it all back
+        try:
+            with self.project_manager.transaction():
+                self._save_project_contents()
+        except sqlite3.Error as e:
+            QMessageBox.critical(self, "Save Error", f"Failed to save the project; nothing was written:\n{e}")
+            return False
+
+        self.set_status(f"Project saved: {self.project_data.get('name', 'Unknown')}")
+        self.setWindowModified(False) # Mark window as not modified
+        return True
+
+    def _save_project_contents(self):
+        """Write the project; called inside a transaction, where a failed write raises sqlite3.Error."""
         # 1. Save Metadata
-        if not self.project_manager.save_project_metadata(self.project_data):
-             QMessageBox.critical(self, "Save Error", "Failed to save project metadata.")
-             return False
+        self.project_manager.save_project_metadata(self.project_data)
 
         # 2. Save Layers (Assume layer state is managed elsewhere and updated in DB)
         # Layer visibility, name changes etc should ideally update the DB immediately
@@ -416,27 +548,45 @@ class MainWindow(QMainWindow):
         # If items are only stored in memory (on scene), iterate and save them.
         # For simplicity, let's assume items are added/updated in DB when created/modified.
         # We might need to save modifications to existing items (e.g., moved items)
-        for item in self.scene.items():
-            # Check if it's one of our custom measurement items
-            if isinstance(item, (LinearMeasurementItem, )): # Add other item types
-                if hasattr(item, 'get_data_for_db') and hasattr(item, 'db_id'):
-                    item_data = item.get_data_for_db()
-                    if item.db_id is None: # Item was created but not saved yet
-                        new_id = self.project_manager.save_item(item_data)
-                        if new_id:
-                            item.db_id = new_id
-                            item.setData(Qt.ItemDataRole.UserRole + 1, new_id) # Update item data
-                        else:
-                             print(f"Warning: Failed to save new item {item}")
-                    else:
-                        # Check if item was modified (needs a 'dirty' flag or compare geometry)
-                        # For now, just update points as an example
-                        self.project_manager.update_item_points(item.db_id, item_data['points'])
-
+        self.save_page_items()
+
+    def save_page_items(self):
+        """Write the measurements changed since the last save to the database."""
+        self.flush_writes() # Measurements still being inserted must have their IDs first
+        new_records = []
+        points_updates = []
+        holes_updates = []
+        dirty = self.dirty_tracker.take()
+        for record in dirty:
+            if record not in self.measurement_store:
+                continue # Deleted since it was marked
+            self.sync_record(record)
+            if record.db_id is None: # Created but not saved yet
+                new_records.append(record)
+            else:
+                points_updates.append((record.db_id, record.points))
+                if record.holes:
+                    holes_updates.append((record.db_id, record.holes))
 
-        self.set_status(f"Project saved: {self.project_data.get('name', 'Unknown')}")
-        self.setWindowModified(False) # Mark window as not modified
-        return True
+        # Bulk writes: one executemany per kind instead of one statement per item
+        try:
+            if new_records:
+                new_ids = self.project_manager.save_items([self.item_data(record) for record in new_records])
+                if len(new_ids) != len(new_records):
+                    print(f"Warning: Failed to save {len(new_records)} new items")
+                for record, new_id in zip(new_records, new_ids):
+                    self.set_record_id(record, new_id)
+            if points_updates:
+                self.project_manager.update_items_points(points_updates)
+            if holes_updates:
+                self.project_manager.update_items_holes(holes_updates)
+        except sqlite3.Error:
+            # The enclosing transaction rolls back, so these changes are unsaved again
+            for record in new_records:
+                self.set_record_id(record, None)
+            for record in dirty:
+                self.dirty_tracker.mark(record)
+            raise
 
 
     def save_project_as(self):
@@ -444,76 +594,92 @@ class MainWindow(QMainWindow):
              QMessageBox.warning(self, "Save As Error", "No active project loaded to save.")
              return False
 
-         project_path, _ = QFileDialog.getSaveFileName(
-             self, "Save Project As", "", "QSTape Project (*.qst)"
-         )
+         project_path = self._ask_project_copy_path("Save Project As")
          if not project_path:
              return False # User cancelled
 
-         if not project_path.lower().endswith(".qst"):
-              project_path += ".qst"
-
-         # Get current data before potentially closing the old connection
-         current_metadata = self.project_data.copy()
-         current_layers = self.project_manager.load_layers()
-         current_items = self.project_manager.load_items()
+         # Stream the database into the new file; rows and IDs are copied unchanged
+         if not self._copy_project_with_progress(project_path):
+             QMessageBox.critical(self, "Save As Error", f"Failed to copy project to:\n{project_path}")
+             return False
 
-         # Close old connection
+         # Switch to the copy, then write the in-memory state (name, scene changes) into it
          self.project_manager.close()
-
-         # Connect to new DB file
          self.current_project_path = project_path
          self.project_manager.connect(self.current_project_path)
+         self.project_manager.start_writer()
+         if self.render_worker: # Rendered pages are cached next to the project file
+             self.render_worker.set_cache(self.open_render_cache())
+         self.project_data['name'] = os.path.basename(project_path).replace('.qst', '')
+         if not self.save_project():
+             return False
 
-         # Update metadata with new name if needed
-         current_metadata['name'] = os.path.basename(project_path).replace('.qst', '')
-         self.project_data = current_metadata # Update internal state
+         self.update_ui_from_project_data() # Update window title etc.
+         self.set_status(f"Project saved as: {self.project_data['name']}")
+         return True
 
-         # Save data to the new database
-         if not self.project_manager.save_project_metadata(current_metadata): return False # Abort on error
 
-         # Re-save layers and items to the new database
-         layer_id_map = {} # To map old layer IDs to new ones
-         for layer in current_layers:
-             old_id = layer['id']
-             # Don't save the ID from the old DB, let the new DB assign one
-             new_id = self.project_manager.add_layer(layer['name'], color=layer['color'])
-             if new_id:
-                 layer_id_map[old_id] = new_id
-                 self.project_manager.update_layer(new_id, visible=layer['visible']) # Save visibility too
-             else:
-                  print(f"Warning: Failed to re-save layer '{layer['name']}'")
+    def duplicate_project(self):
+         """Copy the saved project to a new file and keep working on the current one."""
+         if not self.project_manager.conn:
+             QMessageBox.warning(self, "Duplicate Error", "No active project loaded to duplicate.")
+             return False
 
-         for item in current_items:
-             old_layer_id = item['layer_id']
-             new_layer_id = layer_id_map.get(old_layer_id)
-             if new_layer_id is None:
-                  print(f"Warning: Could not find new layer ID for item {item.get('id', '?')}, skipping.")
-                  continue # Or assign to default layer?
+         project_path = self._ask_project_copy_path("Duplicate Project")
+         if not project_path:
+             return False
 
-             item['layer_id'] = new_layer_id
-             # Don't save the old item ID
-             item.pop('id', None)
-             # Re-save the item
-             new_item_id = self.project_manager.save_item(item)
-             if not new_item_id:
-                 print(f"Warning: Failed to re-save item (Type: {item.get('type','?')})")
+         if not self._copy_project_with_progress(project_path):
+             QMessageBox.critical(self, "Duplicate Error", f"Failed to copy project to:\n{project_path}")
+             return False
 
+         # Give the copy its own name
+         copy_manager = ProjectManager(project_path)
+         copy_data = copy_manager.load_project_metadata() or {}
+         copy_data['name'] = os.path.basename(project_path).replace('.qst', '')
+         copy_manager.save_project_metadata(copy_data)
+         copy_manager.close()
 
-         self.update_ui_from_project_data() # Update window title etc.
-         self.set_status(f"Project saved as: {self.project_data['name']}")
-         self.setWindowModified(False)
+         self.set_status(f"Project duplicated to: {project_path}")
          return True
 
 
+    def _ask_project_copy_path(self, title):
+         project_path, _ = QFileDialog.getSaveFileName(
+             self, title, "", "QSTape Project (*.qst)"
+         )
+         if project_path and not project_path.lower().endswith(".qst"):
+              project_path += ".qst"
+         return project_path
+
+
+    def _copy_project_with_progress(self, project_path):
+         progress_dialog = QProgressDialog("Copying project...", None, 0, 100, self)
+         progress_dialog.setWindowModality(Qt.WindowModality.WindowModal)
+         progress_dialog.setMinimumDuration(500) # Only shown for slow copies
+
+         def on_progress(status, remaining, total):
+             if total:
+                 progress_dialog.setValue(int(100 * (total - remaining) / total))
+             QApplication.processEvents()
+
+         copied = self.project_manager.copy_to(project_path, progress=on_progress)
+         progress_dialog.setValue(100)
+         return copied
+
+
     def close_project(self):
+        self.flush_writes() # Before the items the writes belong to are deleted
+        self.cancel_item_loading()
         # Clear scene
         self.scene.clear() # Removes all items, including background
         self.background_item = None
+        self.clear_measurements()
         # Clear data
-        self.pdf_images = []
+        self.close_page_source()
         self.current_page_index = 0
         self.project_data = {}
+        self.sources = []
         self.current_project_path = None
         self.layers = []
         self.active_layer_id = None
@@ -522,7 +688,7 @@ class MainWindow(QMainWindow):
         # Reset UI
         self.update_ui_from_project_data()
         self.layers_list_widget.clear()
-        self.results_list_widget.clear()
+        self.results_model.clear()
         self.set_status("Project closed. Ready.")
         self.setWindowModified(False)
 
@@ -544,7 +710,8 @@ class MainWindow(QMainWindow):
 
     def closeEvent(self, event):
         if self.check_unsaved_changes():
-            self.project_manager.close() # Ensure DB is closed properly
+            self.project_manager.close() # Finishes queued writes and closes the DB
+            self.close_page_source()
             event.accept() # Close the window
         else:
             event.ignore() # Don't close the window
@@ -553,10 +720,16 @@ class MainWindow(QMainWindow):
     # --- Source File Handling ---
 
     def load_source_file(self, file_path):
-        """Loads PDF or Image and displays the first page/image using PyMuPDF for PDFs."""
+        return self.load_source_files([file_path])
+
+    def load_source_files(self, file_paths):
+        """Loads the PDFs (their sheets in order) or an Image and displays the first page/image using PyMuPDF for PDFs."""
+        file_path = file_paths[0]
+        self.cancel_item_loading()
         self.scene.clear()
-        self.pdf_images = []
+        self.close_page_source()
         self.background_item = None
+        self.clear_measurements()
         file_path_lower = file_path.lower()
 
         try:
@@ -565,58 +738,21 @@ class MainWindow(QMainWindow):
                 print(f"Loading PDF using PyMuPDF: {file_path}")
 
                 try:
-                    doc = fitz.open(file_path)
-                    num_pages = doc.page_count
-                    if num_pages == 0:
-                        raise ValueError("PDF has no pages or could not be opened correctly.")
-
-                    print(f"Found {num_pages} pages.")
-
-                    for page_num in range(num_pages):
-                        page = doc.load_page(page_num)
-
-                        # Render page to a pixmap (image)
-                        # Adjust DPI as needed for quality vs. performance/memory
-                        dpi = 150
-                        zoom = dpi / 72  # Calculate zoom factor based on standard PDF DPI
-                        mat = fitz.Matrix(zoom, zoom)
-                        pix = page.get_pixmap(matrix=mat, alpha=False)  # alpha=False for RGB
-
-                        # Convert MuPDF pixmap to QImage
-                        # Format mapping might be needed for different PDF types,
-                        # but RGB888 is common for standard rendering.
-                        if pix.alpha:  # Check if pixmap has alpha channel (RGBA)
-                            qimage_format = QImage.Format.Format_RGBA8888
-                        else:  # Assume RGB
-                            qimage_format = QImage.Format.Format_RGB888
-
-                        # Create QImage directly from pix.samples byte buffer
-                        qimage = QImage(pix.samples, pix.width, pix.height, pix.stride, qimage_format)
-
-                        # Check if successful, maybe swap RGB<->BGR if needed (often not required with newer Qt/MuPDF)
-                        if qimage.isNull():
-                            print(f"Warning: Failed to create QImage for page {page_num}")
-                            continue  # Skip this page
-
-                        # Optional: If colors look swapped (Blue <-> Red), uncomment the next line
-                        # qimage = qimage.rgbSwapped()
-
-                        self.pdf_images.append(QPixmap.fromImage(qimage))
-                        print(f"  Loaded page {page_num + 1}")
-
-                    doc.close()  # Close the document when done
-
-                    if not self.pdf_images:
-                        raise ValueError("Failed to convert any PDF pages.")
-
+                    # Only the document metadata is read here; pages are rendered in display_page
+                    self.page_source = ProjectPageSource(file_paths, cache=self.open_render_cache())
+                    self.render_worker = RenderWorker(self.page_source, self)
+                    self.render_worker.image_rendered.connect(self.handle_image_rendered)
+                    self.render_worker.snap_index_ready.connect(self.handle_snap_index_ready)
+                    self.render_worker.raster_ready.connect(self.handle_raster_ready)
+                    self.render_worker.start()
                     self.current_page_index = 0
                     self.display_page(self.current_page_index)
 
                 except Exception as e:
-                    QMessageBox.critical(self, "PDF Load Error (PyMuPDF)", f"Failed to process PDF:\n{e}")
+                    QMessageBox.critical(self, "PDF Load Error (PyMuPDF)", f"Failed to process PDFs:\n{e}")
                     # Clean up state if loading fails
                     self.scene.clear()
-                    self.pdf_images = []
+                    self.close_page_source()
                     self._update_actions_state()
                     self.update_page_status()
                     return False  # Indicate failure
@@ -644,46 +780,302 @@ class MainWindow(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "Load Error", f"Failed to load file:\n{file_path}\nError: {e}")
             self.scene.clear()
-            self.pdf_images = []
+            self.close_page_source()
             self.background_item = None
             self._update_actions_state()
             self.update_page_status()
             return False  # Indicate failure
 
+    def add_source_documents(self):
+        """Add more PDF drawing sets to the project; their sheets are appended after the current ones."""
+        if self.project_data.get('source_type') != 'pdf' or not self.page_source:
+            return
+        file_paths, _ = QFileDialog.getOpenFileNames(self, "Add Source Documents", "", "PDF Files (*.pdf)")
+        known = {os.path.abspath(source['path']) for source in self.sources}
+        file_paths = [path for path in file_paths if os.path.abspath(path) not in known]
+        if not file_paths:
+            return
+        page_index = self.current_page_index
+        self.release_page_items() # Moves are written back before the page source is rebuilt
+        old_paths = [source['path'] for source in self.sources]
+        # Open the enlarged set first, so a broken file is refused before it becomes part of the project
+        if not self.load_source_files(old_paths + file_paths):
+            self.load_source_files(old_paths)
+            self.display_page(page_index)
+            return
+        if not self.project_manager.add_sources(file_paths, 'pdf'):
+            QMessageBox.critical(self, "Add Source Documents", "Failed to add the documents to the project database.")
+            self.load_source_files(old_paths)
+            self.display_page(page_index)
+            return
+        self.sources = self.project_manager.load_sources()
+        self.display_page(page_index)
+        self.set_status(f"Added {len(file_paths)} document(s); the project has {self.page_count()} sheets.")
+
+    def open_render_cache(self):
+        """Sidecar cache of rendered pages for the current project, if it has a path."""
+        if not self.current_project_path:
+            return None
+        limit_mb = QSettings().value("render/disk_cache_mb", DEFAULT_DISK_CACHE_MB, type=int)
+        try:
+            return DiskRenderCache(cache_dir_for_project(self.current_project_path), limit_mb * 1024 * 1024)
+        except Exception as e:
+            print(f"Warning: Render cache unavailable, rendering without it: {e}")
+            return None
+
+    def close_page_source(self):
+        if self.render_worker:
+            self.render_worker.stop() # Must finish before the document is closed
+            self.render_worker = None
+        self.cancel_symbol_search()
+        self.pixmap_cache.clear()
+        self.snap_indexes.clear()
+        self.page_rasters.clear()
+        self.raster_waiters.clear()
+        self.room_click = None
+        self.view.set_snap_index(None)
+        if self.page_source:
+            self.page_source.close()
+            if self.page_source.cache:
+                self.page_source.cache.close()
+            self.page_source = None
+
+    def page_count(self):
+        return self.page_source.page_count if self.page_source else 0
+
     def display_page(self, page_index):
-        if self.project_data.get('source_type') != 'pdf' or not self.pdf_images:
+        if self.project_data.get('source_type') != 'pdf' or not self.page_source:
             return
-        if 0 <= page_index < len(self.pdf_images):
+        if 0 <= page_index < self.page_count():
+            # Release the measurements of the page we are leaving (moves are written back first)
+            self.release_page_items()
             self.current_page_index = page_index
             if self.background_item:
                 self.scene.removeItem(self.background_item) # Remove previous page
 
-            pixmap = self.pdf_images[page_index]
-            self.background_item = self.scene.addPixmap(pixmap)
-            self.background_item.setZValue(-1)
+            # Cancel queued renders for pages we moved away from, prefetch the neighbours
+            self.render_worker.set_current_page(page_index)
+            self.show_snap_index(page_index)
+            if self.view.get_tool() == "detect_room":
+                self.with_page_raster(page_index, ROOM_DPI) # Ready before the first click
+
+            # Tiles are requested by the item for the visible area at the current zoom
+            self.background_item = TiledPageItem(self.page_source, page_index, self.render_worker, self.pixmap_cache)
+            if ('preview', page_index) not in self.pixmap_cache:
+                self.render_worker.request_preview(page_index)
+            self.scene.addItem(self.background_item)
             self.scene.setSceneRect(self.background_item.boundingRect())
             # Optionally preserve zoom/pan or reset view
             # self.zoom_to_fit() # Reset view for new page
             self.update_page_status()
             self._update_actions_state()
-            # Might need to reload/filter items specific to this page if implemented
-            print(f"Displayed page {page_index + 1}/{len(self.pdf_images)}")
+            self.load_items_from_db() # Only this page's measurements
+            print(f"Displayed page {page_index + 1}/{self.page_count()}")
         else:
              print(f"Error: Page index {page_index} out of bounds.")
 
 
+    def release_page_items(self):
+        """Remove the current page's measurements from the scene."""
+        self.flush_writes()
+        self.cancel_item_loading()
+        if not self.measurement_store:
+            return
+        if self.project_manager.conn and self.dirty_tracker:
+            try:
+                with self.project_manager.transaction():
+                    self.save_page_items()
+            except sqlite3.Error as e:
+                QMessageBox.warning(self, "Save Error",
+                                    f"Failed to save {len(self.dirty_tracker)} changed measurement(s) of this page:\n{e}")
+        for item in self.layer_registry.all_items():
+            self.release_item(item)
+        self.measurement_store.clear()
+        self.update_overview(set())
+
+    def clear_measurements(self):
+        """Forget the page's measurements without touching the scene (it was just cleared)."""
+        self.measurement_store.clear()
+        self.layer_registry.clear()
+        self.dirty_tracker.clear()
+        self.item_pool = {item_type: [] for item_type in ITEM_CLASSES}
+        self.overview_item = None # Deleted with the scene's items
+
+    # --- Viewport culling: items only for measurements near the visible area ---
+
+    def update_visible_items(self):
+        """Create items for measurements coming into view and release those far out of it."""
+        if not self.measurement_store and not self.layer_registry and self.overview_item is None:
+            return
+        visible = self.view.mapToScene(self.view.viewport().rect()).boundingRect()
+        margin_x, margin_y = visible.width() * CULL_MARGIN, visible.height() * CULL_MARGIN
+        wanted = self.measurement_store.records_in_rect(visible.left() - margin_x, visible.top() - margin_y,
+                                                        visible.right() + margin_x, visible.bottom() + margin_y)
+        # Measurements only a few pixels across on screen are drawn together as dots instead
+        pixel_size = 1 / self.view.transform().m11()
+        tiny = TINY_ITEM_PX * pixel_size
+        small = {r for r in wanted
+                 if r.bounds[2] - r.bounds[0] < tiny and r.bounds[3] - r.bounds[1] < tiny
+                 and (r.item is None or not r.item.isSelected())}
+        wanted -= small
+        self.update_overview(small, pixel_size)
+        for item in self.layer_registry.all_items():
+            if item.record not in wanted and not item.isSelected():
+                self.release_item(item)
+        layer_visibility = {layer['id']: layer['visible'] for layer in self.layers}
+        for record in wanted:
+            if record.item is None:
+                self.show_record(record, layer_visibility.get(record.layer_id, True))
+
+    def update_overview(self, records, pixel_size=1.0):
+        """Hand the measurements too small to draw one by one to the overview item."""
+        if self.overview_item is None:
+            if not records:
+                return
+            self.overview_item = MeasurementOverviewItem()
+            self.scene.addItem(self.overview_item)
+        colors = {layer['id']: layer['color'] for layer in self.layers if layer['visible']}
+        self.overview_item.set_records(records, colors, pixel_size)
+
+    def show_record(self, record, visible=True):
+        """Give a measurement a graphics item, reusing a released one when possible."""
+        pool = self.item_pool.get(record.item_type)
+        if pool is None:
+            return None # No item class for this type yet
+        if pool:
+            item = pool.pop()
+            item.bind(record)
+        else:
+            item = ITEM_CLASSES[record.item_type].from_record(record)
+        item.setVisible(visible)
+        self.add_page_item(item)
+        return item
+
+    def release_item(self, item):
+        """Take an item off the scene; its record keeps the (possibly moved) geometry."""
+        record = item.record
+        if record is not None:
+            self.sync_record(record)
+            record.item = None
+        item.record = None
+        item.setSelected(False)
+        self.layer_registry.remove(item)
+        if item.scene() is self.scene:
+            self.scene.removeItem(item)
+        pool = self.item_pool.get(item.item_type)
+        if pool is not None and len(pool) < ITEM_POOL_SIZE:
+            pool.append(item)
+
+    def sync_record(self, record):
+        """Copy a moved item's geometry back into its record."""
+        item = record.item
+        if item is not None and item.is_moved():
+            record.holes = item.scene_holes()
+            self.measurement_store.update_points(record, [(p.x(), p.y()) for p in item.scene_points()])
+            item.record = None # Rebinding resets the position without marking the record dirty
+            item.bind(record)
+
+    def set_record_id(self, record, db_id):
+        record.db_id = db_id
+        if record.item is not None:
+            record.item.set_db_id(db_id)
+
+    def add_page_item(self, item):
+        """Put a measurement item on the scene as part of the current page."""
+        item.tracker = self.dirty_tracker
+        layer = self.find_layer(item.layer_id)
+        if layer:
+            item.set_color(layer['color']) # Items are drawn in their layer's colour
+        self.scene.addItem(item)
+        self.layer_registry.add(item)
+
+    @pyqtSlot(object, object)
+    def handle_image_rendered(self, key, image):
+        """Receives finished renders from the worker thread."""
+        page_index = key[1]
+        if abs(page_index - self.current_page_index) > PREFETCH_RADIUS:
+            return # Finished after the user moved on
+        self.pixmap_cache.put(key, QPixmap.fromImage(image)) # QPixmap must be created on the GUI thread
+        if not (isinstance(self.background_item, TiledPageItem) and self.background_item.page_index == page_index):
+            return
+        if key[0] == 'preview':
+            self.background_item.preview_ready()
+        elif key[0] == 'tile':
+            self.background_item.tile_ready(key[2], key[3], key[4])
+
+    def show_snap_index(self, page_index):
+        """Snap to the page's geometry, building its index in the background if needed."""
+        snap_index = self.snap_indexes.get(page_index)
+        if snap_index is None:
+            self.render_worker.request_snap_index(page_index)
+        else:
+            self.snap_indexes.move_to_end(page_index)
+        self.view.set_snap_index(snap_index)
+
+    @pyqtSlot(int, object)
+    def handle_snap_index_ready(self, page_index, snap_index):
+        """Receives snap indexes built by the worker thread."""
+        self.snap_indexes[page_index] = snap_index
+        while len(self.snap_indexes) > SNAP_INDEX_PAGES:
+            self.snap_indexes.popitem(last=False)
+        if page_index == self.current_page_index and self.page_source:
+            self.view.set_snap_index(snap_index)
+            print(f"Snap index ready for page {page_index + 1}: {len(snap_index)} points")
+
+    def with_page_raster(self, page_index, dpi, callback=None):
+        """Call `callback(raster)` with a grayscale array of the page, rendering it in the background if needed."""
+        key = (page_index, dpi)
+        raster = self.page_rasters.get(key)
+        if raster is not None:
+            self.page_rasters.move_to_end(key)
+            if callback:
+                callback(raster)
+            return
+        if callback:
+            self.raster_waiters.setdefault(key, []).append(callback)
+        if self.render_worker:
+            self.render_worker.request_raster(page_index, dpi)
+
+    @pyqtSlot(object, object)
+    def handle_raster_ready(self, key, raster):
+        """Receives page rasters rendered by the worker thread."""
+        key = key[1:] # ('raster', page, dpi)
+        self.page_rasters[key] = raster
+        while len(self.page_rasters) > PAGE_RASTERS:
+            self.page_rasters.popitem(last=False)
+        for callback in self.raster_waiters.pop(key, []):
+            callback(raster)
+
+    def set_snap_enabled(self, enabled):
+        self.view.snap_enabled = enabled
+        self.view.set_snap_index(self.view.snap_index) # Clears a marker left on screen
+        QSettings().setValue("snap/enabled", enabled)
+        self.set_status("Snapping to geometry " + ("enabled" if enabled else "disabled"))
+
+    def configure_render_cache(self):
+        """Show render cache counters and let the user change the memory budget."""
+        stats = self.pixmap_cache.stats()
+        info = (f"In memory: {stats['entries']} images, {stats['used_mb']:.1f} MB\n"
+                f"Hits: {stats['hits']}  Misses: {stats['misses']}  Evictions: {stats['evictions']}\n\n"
+                f"Memory budget (MB):")
+        budget, ok = QInputDialog.getInt(self, "Render Memory Budget", info, int(stats['budget_mb']), 64, 65536)
+        if ok:
+            self.pixmap_cache.set_budget_mb(budget)
+            QSettings().setValue("render/memory_budget_mb", budget)
+            self.set_status(f"Render memory budget set to {budget} MB")
+
     def prev_page(self):
         if self.current_page_index > 0:
             self.display_page(self.current_page_index - 1)
 
     def next_page(self):
-        if self.pdf_images and self.current_page_index < len(self.pdf_images) - 1:
+        if self.page_source and self.current_page_index < self.page_count() - 1:
             self.display_page(self.current_page_index + 1)
 
     def goto_page(self):
-        if not self.pdf_images: return
+        if not self.page_source: return
         page, ok = QInputDialog.getInt(self, "Go To Page", "Enter page number:",
-                                       self.current_page_index + 1, 1, len(self.pdf_images))
+                                       self.current_page_index + 1, 1, self.page_count())
         if ok:
             self.display_page(page - 1)
 
@@ -728,8 +1120,11 @@ class MainWindow(QMainWindow):
 
 
     def update_page_status(self):
-        if self.pdf_images:
-            self.status_label_page.setText(f"Page: {self.current_page_index + 1}/{len(self.pdf_images)}")
+        if self.page_source and len(self.page_source.documents) > 1:
+            self.status_label_page.setText(f"Page: {self.current_page_index + 1}/{self.page_count()} "
+                                           f"({self.page_source.sheet_label(self.current_page_index)})")
+        elif self.page_source:
+            self.status_label_page.setText(f"Page: {self.current_page_index + 1}/{self.page_count()}")
         elif self.background_item:
             self.status_label_page.setText("Page: 1/1")
         else:
@@ -740,10 +1135,12 @@ class MainWindow(QMainWindow):
         has_project = bool(self.current_project_path)
         has_source = bool(self.background_item)
         has_scale = bool(self.project_data.get('scale_factor'))
-        is_pdf = self.project_data.get('source_type') == 'pdf' and len(self.pdf_images) > 1
+        is_pdf = self.project_data.get('source_type') == 'pdf' and self.page_count() > 1
 
         self.save_project_action.setEnabled(has_project)
         self.save_project_as_action.setEnabled(has_project)
+        self.duplicate_project_action.setEnabled(has_project)
+        self.add_sources_action.setEnabled(has_project and self.project_data.get('source_type') == 'pdf' and has_source)
         self.zoom_in_action.setEnabled(has_source)
         self.zoom_out_action.setEnabled(has_source)
         self.zoom_fit_action.setEnabled(has_source)
@@ -751,7 +1148,13 @@ class MainWindow(QMainWindow):
         self.set_scale_action.setEnabled(has_source)
         self.measure_linear_action.setEnabled(has_source and has_scale)
         self.measure_area_action.setEnabled(has_source and has_scale)
+        self.detect_room_action.setEnabled(has_source and has_scale and self.project_data.get('source_type') == 'pdf')
+        self.count_tool_action.setEnabled(has_project and has_source) # Counts do not depend on the scale
+        self.find_symbols_action.setEnabled(has_project and self.project_data.get('source_type') == 'pdf' and has_source)
         # Enable other measurement tools similarly
+        for action in (self.union_areas_action, self.intersect_areas_action, self.subtract_areas_action,
+                       self.deduct_layer_action, self.merge_areas_action):
+            action.setEnabled(has_project and has_scale)
 
         # Layer actions enabled if project exists
         self.add_layer_action.setEnabled(has_project)
@@ -768,7 +1171,7 @@ class MainWindow(QMainWindow):
 
         # PDF Nav
         self.prev_page_action.setEnabled(is_pdf and self.current_page_index > 0)
-        self.next_page_action.setEnabled(is_pdf and self.current_page_index < len(self.pdf_images) - 1)
+        self.next_page_action.setEnabled(is_pdf and self.current_page_index < self.page_count() - 1)
         self.goto_page_action.setEnabled(is_pdf)
 
 
@@ -809,6 +1212,14 @@ class MainWindow(QMainWindow):
             self.set_status("Measure Linear: Click start point.")
         elif tool_name == "measure_area":
             self.set_status("Measure Area: Click polygon vertices. Double-click or Esc to finish.")
+        elif tool_name == "detect_room":
+            self.set_status("Detect Room: Click inside a room to measure its area.")
+            if self.page_source:
+                self.with_page_raster(self.current_page_index, ROOM_DPI) # Ready before the first click
+        elif tool_name == "count":
+            self.set_status("Count: Click each item to count it.")
+        elif tool_name == "find_symbols":
+            self.set_status("Find Symbols: Drag a box around one symbol to count all of its copies.")
 
 
     # --- Event Handling ---
@@ -865,7 +1276,11 @@ class MainWindow(QMainWindow):
              if num_points > 0:
                  self.set_status(f"Measure Area: Added point {num_points}. Click next or Double-click/Esc to finish.")
 
-        # Add Count tool logic here: create count item on click
+        elif tool == "detect_room":
+             self.detect_room_at(scene_pos)
+
+        elif tool == "count":
+             self.create_count_measurement(scene_pos)
 
 
     @pyqtSlot(QPointF)
@@ -935,6 +1350,7 @@ class MainWindow(QMainWindow):
                 self._update_actions_state() # Enable measurement tools
                 self.set_status(f"Scale set: 1 pixel = {self.project_data['scale_factor']:.4f} {unit}")
                 self.setWindowModified(True) # Mark project as modified
+                self.rescale_measurements() # Existing quantities follow the new scale
 
                 # Optional: Draw the scale line permanently on scene
                 # Need a specific layer for scale visuals?
@@ -971,25 +1387,14 @@ class MainWindow(QMainWindow):
         real_dist = pixel_dist * self.project_data['scale_factor']
         unit = self.project_data.get('scale_unit', 'units')
 
-        # Create graphics item (Using placeholder class for now)
-        item = LinearMeasurementItem(p1, p2, layer_id=self.active_layer_id, value=real_dist, unit=unit)
-        self.scene.addItem(item)
-
-        # Save item to database
-        item_data = item.get_data_for_db()
-        new_id = self.project_manager.save_item(item_data)
-        if new_id:
-            item.db_id = new_id # Update item with its database ID
-            item.setData(Qt.ItemDataRole.UserRole + 1, new_id) # Make ID accessible
-            self.add_measurement_result(f"Linear ({item.db_id}): {real_dist:.2f} {unit}")
-            self.setWindowModified(True)
-            self.set_status(f"Measured: {real_dist:.2f} {unit}. Click start point for next line.")
-        else:
-            QMessageBox.warning(self, "Save Error", "Failed to save measurement to database.")
-            self.scene.removeItem(item) # Remove item if save failed
+        record = MeasurementRecord(None, self.active_layer_id, self.current_page_index, 'linear',
+                                   [(p1.x(), p1.y()), (p2.x(), p2.y())], real_dist, unit, self.new_item_style())
+        self.add_new_record(record)
+        self.setWindowModified(True)
+        self.set_status(f"Measured: {real_dist:.2f} {unit}. Click start point for next line.")
 
 
-    def create_area_measurement(self, points: list[QPointF]):
+    def create_area_measurement(self, points: list[QPointF], holes=None):
          """Creates a permanent area measurement item on the scene and saves it."""
          if not self.project_data.get('scale_factor'):
              QMessageBox.warning(self, "Measurement Error", "Scale not set.")
@@ -1014,97 +1419,490 @@ class MainWindow(QMainWindow):
              pixel_area += points[i].x() * points[j].y()
              pixel_area -= points[j].x() * points[i].y()
          pixel_area = abs(pixel_area) / 2.0
+         pixel_area -= sum(PolygonOps.ring_area(hole) for hole in holes or ()) # Openings cut out of the area
 
          scale_factor_sq = self.project_data['scale_factor'] ** 2
          real_area = pixel_area * scale_factor_sq
          unit = self.project_data.get('scale_unit', 'units')
          area_unit = f"sq {unit}"
 
-         # Create graphics item (Needs an AreaMeasurementItem class)
-         polygon = QPolygonF(points)
-         # Placeholder: Use basic QGraphicsPolygonItem
-         item = QGraphicsPolygonItem(polygon)
-         item.setPen(QPen(QColor("purple"), 2))
-         item.setBrush(Qt.BrushStyle.NoBrush) # No fill for measurement outline
-         item.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsSelectable)
-         item.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsMovable)
-         item.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsFocusable) # Needed for delete key?
-         self.scene.addItem(item)
-
-         # Prepare data for DB (Adapt for actual AreaMeasurementItem class)
-         item_data = {
-             'layer_id': self.active_layer_id,
-             'type': 'area',
-             'points': [(p.x(), p.y()) for p in points],
-             'value': real_area,
-             'unit': area_unit,
-             'style': {'color': "purple", 'width': 2, 'fill': None} # Example style
-         }
-
-         new_id = self.project_manager.save_item(item_data)
-         if new_id:
-             # Store db_id in the graphics item if possible (e.g., item.db_id = new_id or using setData)
-             item.setData(Qt.ItemDataRole.UserRole + 1, new_id)
-             self.add_measurement_result(f"Area ({new_id}): {real_area:.2f} {area_unit}")
-             self.setWindowModified(True)
-             self.set_status(f"Measured: {real_area:.2f} {area_unit}. Click vertices for next area.")
-         else:
-             QMessageBox.warning(self, "Save Error", "Failed to save area measurement.")
-             self.scene.removeItem(item)
+         style = self.new_item_style()
+         style['fill'] = None
+         record = MeasurementRecord(None, self.active_layer_id, self.current_page_index, 'area',
+                                    [(p.x(), p.y()) for p in points], real_area, area_unit, style, holes)
+         self.add_new_record(record)
+         self.setWindowModified(True)
+         self.set_status(f"Measured: {real_area:.2f} {area_unit}. Click vertices for next area.")
 
+    def detect_room_at(self, scene_pos: QPointF):
+        """Measure the area of the room around a point of the current page."""
+        if not self.page_source:
+            return
+        page_index = self.current_page_index
+        self.room_click = (page_index, scene_pos) # Clicks made while the page renders replace each other
+        self.set_status("Detect Room: Finding the room outline...")
+        self.with_page_raster(page_index, ROOM_DPI, lambda raster: self.create_room_measurement(page_index, raster))
+
+    def create_room_measurement(self, page_index, raster):
+        """Outline the room at the latest click on the page; earlier clicks' callbacks find it taken."""
+        if self.room_click is None or self.room_click[0] != page_index:
+            return # Already measured, or superseded by a click on another page
+        scene_pos = self.room_click[1]
+        self.room_click = None
+        if page_index != self.current_page_index or not self.page_source:
+            return # The user moved on while the page was rendered
+        to_raster = ROOM_DPI / self.page_source.base_dpi
+        try:
+            outline = detect_room(raster, scene_pos.x() * to_raster, scene_pos.y() * to_raster)
+        except ValueError as e:
+            self.set_status(f"Detect Room: {e}")
+            return
+        self.create_area_measurement([QPointF(x / to_raster, y / to_raster) for x, y in outline.tolist()])
 
-    def add_measurement_result(self, text):
-        """Add entry to the results list widget."""
-        self.results_list_widget.addItem(text)
-        self.results_list_widget.scrollToBottom()
+    def create_count_measurement(self, point: QPointF):
+        """Counts one item at the clicked point."""
+        layer_id = self.measurement_layer_id()
+        if layer_id is None:
+            QMessageBox.warning(self, "Measurement Error", "No active layer selected.")
+            return
+        record = MeasurementRecord(None, layer_id, self.current_page_index, 'count',
+                                   [(point.x(), point.y())], 1.0, "ea", self.new_item_style())
+        self.add_new_record(record)
+        self.setWindowModified(True)
+        self.set_status("Counted. Click the next item.")
+
+    def measurement_layer_id(self):
+        """Layer for new measurements: the active one, else the Default Layer (None if there is neither)."""
+        if self.active_layer_id is None:
+            default_layer = next((layer for layer in self.layers if layer['name'] == "Default Layer"), None)
+            if default_layer:
+                self.active_layer_id = default_layer['id']
+                print("Warning: No active layer, using Default Layer.")
+        return self.active_layer_id
+
+    # --- Area booleans: union, intersection and deductions (see PolygonOps) ---
+
+    def selected_area_records(self):
+        """Stored area measurements selected in the view, largest first."""
+        self.flush_writes() # New areas must have their IDs before they can be replaced
+        records = [item.record for item in self.scene.selectedItems()
+                   if getattr(item, 'item_type', None) == 'area' and item.record is not None and item.db_id is not None]
+        polygons = self.area_polygons(records)
+        return [record for _, record in sorted(zip((PolygonOps.polygon_area(*p) for p in polygons), records),
+                                               key=lambda pair: pair[0], reverse=True)]
+
+    def area_polygons(self, records):
+        """(outer, holes) of area records, including moves not saved yet."""
+        for record in records:
+            self.sync_record(record)
+        return [(record.points, record.holes) for record in records]
+
+    def union_selected_areas(self):
+        records = self.selected_area_records()
+        if len(records) < 2:
+            self.set_status("Union: Select two or more areas.")
+            return
+        polygons = PolygonOps.union(self.area_polygons(records))
+        if self.replace_area_records(records, polygons, records[0].layer_id) is not None:
+            self.set_status(f"Union: {len(records)} areas joined into {len(polygons)}.")
+
+    def intersect_selected_areas(self):
+        records = self.selected_area_records()
+        if len(records) < 2:
+            self.set_status("Intersect: Select two or more areas.")
+            return
+        polygons = PolygonOps.intersection(self.area_polygons(records))
+        if not polygons:
+            self.set_status("Intersect: The selected areas do not overlap.")
+            return
+        if self.replace_area_records(records, polygons, records[0].layer_id) is not None:
+            self.set_status(f"Intersect: {len(records)} areas replaced by their common area.")
+
+    def subtract_selected_areas(self):
+        """Cut the other selected areas out of the largest one, which may get holes or fall apart.
+
+        Cut-out areas on the largest one's layer are removed with it, or the
+        layer's total would still include them; those on other layers (an
+        openings layer, say) stay as measurements of their own.
+        """
+        records = self.selected_area_records()
+        if len(records) < 2:
+            self.set_status("Subtract: Select the area to cut from and the areas to cut out.")
+            return
+        subject, clips = self.area_polygons(records[:1])[0], self.area_polygons(records[1:])
+        polygons = PolygonOps.difference(subject, clips)
+        layer_id = records[0].layer_id
+        replaced = records[:1] + [record for record in records[1:] if record.layer_id == layer_id]
+        if self.replace_area_records(replaced, polygons, layer_id) is not None:
+            self.set_status(f"Subtract: {len(clips)} areas cut out.")
+
+    def deduct_layer_areas(self):
+        """Cut every area of another layer out of the overlapping areas of the active layer, on the current page."""
+        layer_id = self.measurement_layer_id()
+        others = [layer for layer in self.layers if layer['id'] != layer_id]
+        if layer_id is None or not others:
+            QMessageBox.information(self, "Deduct Layer", "Deducting needs an active layer and another layer to deduct.")
+            return
+        name, ok = QInputDialog.getItem(self, "Deduct Layer", "Cut out the areas of layer:",
+                                        [layer['name'] for layer in others], 0, False)
+        if not ok:
+            return
+        clip_layer_id = next(layer['id'] for layer in others if layer['name'] == name)
+        self.flush_writes()
+        subjects = [r for r in self.measurement_store.by_layer(layer_id) if r.item_type == 'area' and r.db_id is not None]
+        clips = [r for r in self.measurement_store.by_layer(clip_layer_id) if r.item_type == 'area']
+        QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
+        try:
+            cut = PolygonOps.deduct(self.area_polygons(subjects), self.area_polygons(clips))
+        finally:
+            QApplication.restoreOverrideCursor()
+        if not cut:
+            self.set_status(f"Deduct Layer: No area of '{name}' overlaps the active layer's areas on this page.")
+            return
+        replaced = sorted(cut)
+        polygons = [polygon for index in replaced for polygon in cut[index]]
+        if self.replace_area_records([subjects[index] for index in replaced], polygons, layer_id) is not None:
+            self.set_status(f"Deduct Layer: '{name}' cut out of {len(replaced)} areas.")
+
+    def merge_layer_areas(self):
+        """Join the overlapping or touching areas of the active layer on the current page."""
+        layer_id = self.measurement_layer_id()
+        if layer_id is None:
+            QMessageBox.warning(self, "Merge Areas", "No active layer selected.")
+            return
+        self.flush_writes()
+        records = [r for r in self.measurement_store.by_layer(layer_id) if r.item_type == 'area' and r.db_id is not None]
+        QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
+        try:
+            groups = PolygonOps.merge_overlapping(self.area_polygons(records))
+        finally:
+            QApplication.restoreOverrideCursor()
+        if not groups:
+            self.set_status("Merge Areas: No areas of the active layer overlap on this page.")
+            return
+        merged = [records[index] for members, _ in groups for index in members]
+        polygons = [polygon for _, group_polygons in groups for polygon in group_polygons]
+        if self.replace_area_records(merged, polygons, layer_id) is not None:
+            self.set_status(f"Merge Areas: {len(merged)} areas merged into {len(polygons)}.")
+
+    def replace_area_records(self, old_records, polygons, layer_id):
+        """Replace area measurements of the current page by the (outer, holes) polygons of a boolean operation.
+
+        The old rows are deleted and the new ones inserted in one
+        transaction, so a failure leaves the stored measurements as they
+        were. Returns the new records, or None on failure.
+        """
+        scale_factor = self.project_data['scale_factor']
+        area_unit = f"sq {self.project_data.get('scale_unit', 'units')}"
+        layer = self.find_layer(layer_id)
+        style = {'color': layer['color'] if layer else '#008000', 'width': 2, 'fill': None}
+        new_records = [MeasurementRecord(None, layer_id, self.current_page_index, 'area', outer,
+                                         PolygonOps.polygon_area(outer, holes) * scale_factor ** 2, area_unit,
+                                         dict(style), holes)
+                       for outer, holes in polygons]
+        new_ids = self.project_manager.replace_items([record.db_id for record in old_records],
+                                                     [self.item_data(record) for record in new_records])
+        if new_ids is None or len(new_ids) != len(new_records):
+            QMessageBox.warning(self, "Area Error", "Failed to store the changed areas in the database.")
+            return None
+
+        self.view.setUpdatesEnabled(False)
+        for record in old_records:
+            self.dirty_tracker.discard(record)
+            if record.item is not None:
+                self.release_item(record.item)
+            self.measurement_store.remove(record)
+        self.results_model.remove_ids([record.db_id for record in old_records])
+        for record, new_id in zip(new_records, new_ids):
+            record.db_id = new_id
+            self.measurement_store.add(record)
+        self.results_model.add_items(new_records)
+        self.view.setUpdatesEnabled(True)
+        self.visible_items_timer.start(0) # Items for the new areas come from the viewport culling
+        self.setWindowModified(True)
+        return new_records
+
+    # --- Symbol counting: template matching on a process pool ---
+
+    @pyqtSlot(QRectF)
+    def find_symbols(self, rect):
+        """Count every copy of the symbol boxed on the current page, on this page or all pages."""
+        if self.project_data.get('source_type') != 'pdf' or not self.page_source:
+            QMessageBox.information(self, "Find Symbols", "Symbols can only be found on PDF drawings.")
+            return
+        if self.symbol_search is not None:
+            QMessageBox.information(self, "Find Symbols", "A symbol search is already running.")
+            return
+        layer_id = self.measurement_layer_id()
+        if layer_id is None:
+            QMessageBox.warning(self, "Find Symbols", "No active layer selected.")
+            return
+        pages = [self.current_page_index]
+        if self.page_count() > 1:
+            scope, ok = QInputDialog.getItem(self, "Find Symbols", "Search:", ["This page", "All pages"], 0, False)
+            if not ok:
+                return
+            if scope == "All pages":
+                pages = list(range(self.page_count()))
+        # The template is cut from the page raster, rendered on the worker thread like all PyMuPDF work
+        box = (rect.left(), rect.top(), rect.right(), rect.bottom())
+        self.with_page_raster(self.current_page_index, MATCH_DPI,
+                              lambda raster: self.start_symbol_search(raster, box, pages, layer_id))
+
+    def start_symbol_search(self, raster, box, pages, layer_id):
+        if self.symbol_search is not None or not self.page_source:
+            return
+        try:
+            template = template_from_raster(raster, box, self.page_source.base_dpi)
+        except ValueError as e:
+            QMessageBox.warning(self, "Find Symbols", str(e))
+            return
 
+        self.symbol_search_layer_id = layer_id
+        self.symbol_search_found = 0
+        self.symbol_search_progress = QProgressDialog("Finding symbols...", "Cancel", 0, len(pages), self)
+        self.symbol_search_progress.setWindowTitle("Find Symbols")
+        self.symbol_search_progress.setMinimumDuration(500)
+        self.symbol_search_progress.canceled.connect(self.cancel_symbol_search)
+        threshold = QSettings().value("symbols/threshold", DEFAULT_THRESHOLD, type=float)
+        sheets = []
+        for sheet in pages: # The workers open the documents themselves
+            document, page = self.page_source.locate(sheet)
+            sheets.append((sheet, document.file_path, page))
+        self.symbol_search = SymbolSearch(sheets, template, self.page_source.base_dpi,
+                                          threshold, on_page_done=self.symbols_found.emit) # Queued to the GUI thread
+        self.set_status(f"Finding symbols on {len(pages)} page(s)...")
+
+    @pyqtSlot(object)
+    def handle_symbols_found(self, future):
+        """Turn the matches of one searched page into count measurements."""
+        search = self.symbol_search
+        if search is None or future not in search.futures:
+            return # Cancelled, or from an earlier search
+        if not future.cancelled():
+            if future.exception():
+                print(f"Error finding symbols: {future.exception()}")
+            else:
+                _, matches = future.result()
+                self.add_symbol_counts(search.sheets[future], matches)
+        finished = sum(f.done() for f in search.futures)
+        self.symbol_search_progress.setValue(finished)
+        if finished == search.page_count:
+            search.close()
+            self.symbol_search = None
+            self.set_status(f"Found {self.symbol_search_found} symbol(s) on {search.page_count} page(s).")
+
+    def add_symbol_counts(self, page_index, matches):
+        if not matches:
+            return
+        self.symbol_search_found += len(matches)
+        style = self.new_item_style()
+        records = [MeasurementRecord(None, self.symbol_search_layer_id, page_index, 'count', [(x, y)], 1.0, "ea", dict(style))
+                   for x, y, _ in matches]
+        if page_index == self.current_page_index:
+            self.add_new_records(records)
+        else:
+            # Other pages are only written; they show the counts when they are opened
+            self.project_manager.submit('save_items', [self.item_data(record) for record in records])
+        self.setWindowModified(True)
 
-    # --- Item Loading ---
-    def load_items_from_db(self):
-        if not self.project_manager.conn: return
-        items_data = self.project_manager.load_items()
-        self.results_list_widget.clear() # Clear old results display
+    def cancel_symbol_search(self):
+        """Stop a running symbol search; counts already found are kept."""
+        if self.symbol_search is None:
+            return
+        self.symbol_search.cancel()
+        self.symbol_search = None
+        if self.symbol_search_progress:
+            self.symbol_search_progress.close()
+            self.symbol_search_progress = None
+        self.set_status(f"Symbol search cancelled; {self.symbol_search_found} symbol(s) counted.")
+
+    def sheet_source(self, page_index):
+        """(source ID, page in that document) of a sheet of the project."""
+        if self.page_source:
+            document_index, page = self.page_source.split(page_index)
+            if document_index < len(self.sources):
+                return self.sources[document_index]['id'], page
+        return (self.sources[0]['id'] if self.sources else None), page_index
+
+    def item_data(self, record):
+        """A record as an items row; its sheet is stored as its source document and the page in it."""
+        data = record.get_data_for_db()
+        data['source_id'], data['page'] = self.sheet_source(record.page)
+        return data
+
+    def new_item_style(self):
+        layer = self.find_layer(self.active_layer_id)
+        return {'color': layer['color'] if layer else '#008000', 'width': 2}
+
+    def add_new_record(self, record):
+        """Show a new measurement and save it in the background; it gets its ID when the insert is committed."""
+        future = self.project_manager.submit('save_item', self.item_data(record))
+        self.measurement_store.add(record)
+        self.show_record(record)
+        self.pending_saves[record] = (future, None)
+        future.add_done_callback(lambda _: self.write_finished.emit()) # Queued to the GUI thread
+
+    def add_new_records(self, records):
+        """Save many new measurements of the current page with one background insert.
+
+        Their items are created by the viewport culling like those of loaded measurements.
+        """
+        future = self.project_manager.submit('save_items', [self.item_data(record) for record in records])
+        for index, record in enumerate(records):
+            self.measurement_store.add(record)
+            self.pending_saves[record] = (future, index)
+        future.add_done_callback(lambda _: self.write_finished.emit())
+        self.visible_items_timer.start(0)
+
+    @pyqtSlot()
+    def apply_finished_saves(self):
+        """Give new measurements the IDs of their completed inserts; drop the ones that failed."""
+        saved, failed = [], 0
+        for record, (future, index) in list(self.pending_saves.items()):
+            if not future.done():
+                continue
+            del self.pending_saves[record]
+            if record not in self.measurement_store:
+                continue # Page or project closed meanwhile
+            new_id = None if future.exception() else future.result()
+            if index is not None: # One of a bulk insert, which returns the list of new IDs
+                new_id = new_id[index] if new_id and index < len(new_id) else None
+            if new_id:
+                self.set_record_id(record, new_id)
+                saved.append(record)
+            else:
+                failed += 1
+                self.dirty_tracker.discard(record)
+                if record.item is not None:
+                    self.release_item(record.item)
+                self.measurement_store.remove(record)
+        if len(saved) == 1:
+            self.results_model.add_item(saved[0]) # Inserted at its sorted position
+        elif saved:
+            self.results_model.add_items(saved)
+        if failed:
+            self.visible_items_timer.start(0)
+            QMessageBox.warning(self, "Save Error", f"Failed to save {failed} measurement(s) to database.")
+
+    def flush_writes(self):
+        """Wait for the queued background writes and apply their results."""
+        self.project_manager.flush()
+        self.apply_finished_saves()
+
+
+    def rescale_measurements(self):
+        """Recompute every stored measurement for the current scale in one vectorized pass."""
+        if not self.project_manager.conn or not self.project_data.get('scale_factor'):
+            return
+        try:
+            with self.project_manager.transaction():
+                self.save_page_items() # Stored geometry must include unsaved moves
+        except sqlite3.Error as e:
+            QMessageBox.warning(self, "Rescale Error", f"Failed to save the changed measurements:\n{e}")
+            return
+        ids, types, blobs, holes = self.project_manager.load_item_geometry()
+        if not ids:
+            return
 
-        # Get current visibility state of layers
-        layer_visibility = {layer['id']: layer['visible'] for layer in self.layers}
+        unit = self.project_data.get('scale_unit', 'units')
+        units = {'linear': unit, 'area': f"sq {unit}"}
+        values = GeometryKernel.scaled_values(types, blobs, self.project_data['scale_factor'], holes)
+        updates = [(item_id, value, units[item_type])
+                   for item_id, item_type, value in zip(ids, types, values) if value is not None]
+        if not self.project_manager.update_item_values(updates):
+            QMessageBox.warning(self, "Rescale Error", "Failed to update measurements for the new scale.")
+            return
 
-        for data in items_data:
-            item = None
-            points_qpointf = [QPointF(p[0], p[1]) for p in data['points']]
-            layer_id = data['layer_id']
-            db_id = data['id']
-            value = data.get('value', 0)
-            unit = data.get('unit', '')
+        # Measurements of the current page and the results list show the new values
+        new_values = {item_id: (value, item_unit) for item_id, value, item_unit in updates}
+        for record in self.measurement_store:
+            if record.db_id in new_values:
+                record.value, record.unit = new_values[record.db_id]
+                if record.item is not None:
+                    record.item.value, record.item.unit = record.value, record.unit
+        self.results_model.update_values(new_values)
+        self.set_status(f"Scale set: {len(updates)} measurements recalculated.")
 
-            try:
-                if data['type'] == 'linear' and len(points_qpointf) == 2:
-                    item = LinearMeasurementItem(points_qpointf[0], points_qpointf[1], db_id, layer_id, value, unit)
-                    # Apply style from DB if needed
-                    # item.setPen(...)
-                    self.add_measurement_result(f"Linear ({db_id}): {value:.2f} {unit}")
-
-                elif data['type'] == 'area' and len(points_qpointf) >= 3:
-                    polygon = QPolygonF(points_qpointf)
-                    # Use basic polygon item for now
-                    item = QGraphicsPolygonItem(polygon)
-                    item.setPen(QPen(QColor("purple"), 2)) # Apply style from DB later
-                    item.setBrush(Qt.BrushStyle.NoBrush)
-                    item.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsSelectable)
-                    item.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsMovable)
-                    item.setData(Qt.ItemDataRole.UserRole + 1, db_id) # Store DB ID
-                    # item.layer_id = layer_id # Store layer ID if custom item class used
-                    self.add_measurement_result(f"Area ({db_id}): {value:.2f} {unit}")
-
-                # Add loading for other item types (Count, Text, Curve...)
-
-                if item:
-                    item.setVisible(layer_visibility.get(layer_id, True)) # Set visibility based on layer
-                    self.scene.addItem(item)
 
-            except Exception as e:
-                 print(f"Error loading item ID {db_id} from database: {e}")
-                 print(f"Problematic data: {data}")
+    # --- Item Loading ---
+    def load_items_from_db(self):
+        """Populate the scene with the measurements of the current page.
+
+        Rows are streamed from the database into the measurement store in
+        time slices across event-loop turns, so the window stays responsive
+        and the page fills in as it loads, starting with the measurements in
+        view. Graphics items are created only for measurements near the
+        view. The scene's BSP index is switched off meanwhile and rebuilt
+        once at the end.
+        """
+        if not self.project_manager.conn: return
+        self.release_page_items()
+        source_id, page = self.sheet_source(self.current_page_index)
+        total = self.project_manager.count_items(page=page, source_id=source_id)
+        self.results_model.clear()
+        if not total:
+            return
+        visible = self.view.mapToScene(self.view.viewport().rect()).boundingRect()
+        loader = self._page_item_rows(page, source_id,
+                                      (visible.left(), visible.top(), visible.right(), visible.bottom()))
+        self.item_loader = loader
+        self.scene.setItemIndexMethod(QGraphicsScene.ItemIndexMethod.NoIndex)
+        self.load_progress.setRange(0, total)
+        self.load_progress.setValue(0)
+        self.load_progress.show()
+        self._load_item_slice(loader)
+
+    def _page_item_rows(self, page, source_id, region):
+        """Rows of a page's items: those meeting `region` first (found in the spatial index), then the rest."""
+        in_view = set()
+        for data in self.project_manager.load_items(page=page, source_id=source_id, region=region):
+            in_view.add(data['id'])
+            yield data
+        for data in self.project_manager.load_items(page=page, source_id=source_id):
+            if data['id'] not in in_view:
+                yield data
+
+    def _load_item_slice(self, loader):
+        if self.item_loader is not loader:
+            return # Cancelled, or replaced by the load of another page
+        loaded = []
+        rows_read = 0
+        deadline = time.perf_counter() + LOAD_SLICE_SECONDS
+        finished = False
+        while time.perf_counter() < deadline:
+            chunk = list(islice(loader, LOAD_SLICE_ITEMS))
+            if not chunk:
+                finished = True
+                break
+            rows_read += len(chunk)
+            for data in chunk:
+                data['page'] = self.current_page_index # Records hold the sheet, rows the page of their document
+                try:
+                    record = MeasurementRecord.from_row(data)
+                except (ValueError, TypeError, KeyError) as e: # A damaged row must not stop the page loading
+                    print(f"Error loading item ID {data.get('id')} from database: {e}")
+                    print(f"Problematic data: {data}")
+                    continue
+                self.measurement_store.add(record)
+                loaded.append(record)
+        self.results_model.add_items(loaded)
+        self.load_progress.setValue(self.load_progress.value() + rows_read)
+        self.update_visible_items()
+        if finished:
+            self.cancel_item_loading()
+            self.set_status(f"Loaded {len(self.measurement_store)} measurements.")
+        else:
+            QTimer.singleShot(0, lambda: self._load_item_slice(loader))
 
+    def cancel_item_loading(self):
+        """Stop a page load in progress and restore scene indexing."""
+        if self.item_loader is None:
+            return
+        self.item_loader.close() # Closes its cursor
+        self.item_loader = None
+        self.load_progress.hide()
+        self.scene.setItemIndexMethod(QGraphicsScene.ItemIndexMethod.BspTreeIndex) # Rebuilds the index once
 
     # --- Layer Management ---
 
@@ -1122,6 +1920,7 @@ class MainWindow(QMainWindow):
 
 
     def update_layer_list_widget(self):
+        self.results_model.set_layer_names({layer['id']: layer['name'] for layer in self.layers})
         self.layers_list_widget.clear()
         active_item = None
         for layer in sorted(self.layers, key=lambda x: x.get('id', 0)): # Sort by ID or name?
@@ -1193,20 +1992,36 @@ class MainWindow(QMainWindow):
                  layer['visible'] = is_visible
                  break
 
-         # Update visibility of items on the scene
-         for scene_item in self.scene.items():
-             # Need a consistent way to get layer ID from items
-             item_layer_id = None
-             if isinstance(scene_item, (LinearMeasurementItem, )): # Add other custom types
-                  item_layer_id = scene_item.layer_id
-             # Or using setData: item_layer_id = scene_item.data(Qt.ItemDataRole.UserRole + 2) # If layer ID stored there
+         # Update visibility of the layer's items on the scene, repainting once
+         self.view.setUpdatesEnabled(False)
+         self.layer_registry.set_visible(layer_id, is_visible)
+         self.view.setUpdatesEnabled(True)
+         self.visible_items_timer.start(0) # Redraw the overview dots
+
+         self.setWindowModified(True)
 
-             if item_layer_id == layer_id:
-                 scene_item.setVisible(is_visible)
 
+    def change_layer_color(self, layer_id):
+         layer = self.find_layer(layer_id)
+         if not layer: return
+         color = QColorDialog.getColor(QColor(layer['color']), self, f"Colour for '{layer['name']}'")
+         if not color.isValid():
+             return # User cancelled
+         if not self.project_manager.update_layer(layer_id, color=color.name()):
+             QMessageBox.warning(self, "Layer Error", "Failed to update layer colour in database.")
+             return
+         layer['color'] = color.name()
+         self.view.setUpdatesEnabled(False)
+         self.layer_registry.set_color(layer_id, color.name())
+         self.view.setUpdatesEnabled(True)
+         self.visible_items_timer.start(0) # Redraw the overview dots
          self.setWindowModified(True)
 
 
+    def find_layer(self, layer_id):
+         return next((layer for layer in self.layers if layer['id'] == layer_id), None)
+
+
     def add_layer(self):
          if not self.project_manager.conn: return
          layer_name, ok = QInputDialog.getText(self, "Add Layer", "Enter new layer name:")
@@ -1242,19 +2057,17 @@ class MainWindow(QMainWindow):
                                       QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.Cancel)
 
          if reply == QMessageBox.StandardButton.Yes:
-             # Remove items from scene first
-             items_to_remove = []
-             for scene_item in self.scene.items():
-                 item_layer_id = None
-                 if isinstance(scene_item, (LinearMeasurementItem,)): # Add other types
-                      item_layer_id = scene_item.layer_id
-                 # Or item_layer_id = scene_item.data(Qt.ItemDataRole.UserRole + 2)
-
-                 if item_layer_id == layer_id:
-                     items_to_remove.append(scene_item)
-
-             for scene_item in items_to_remove:
-                  self.scene.removeItem(scene_item)
+             # Remove the layer's items from the scene first
+             self.view.setUpdatesEnabled(False)
+             for scene_item in list(self.layer_registry.items(layer_id)):
+                  self.release_item(scene_item)
+             removed_records = self.measurement_store.by_layer(layer_id)
+             for record in removed_records:
+                  self.dirty_tracker.discard(record)
+                  self.measurement_store.remove(record)
+             self.results_model.remove_ids([record.db_id for record in removed_records])
+             self.view.setUpdatesEnabled(True)
+             self.visible_items_timer.start(0) # Drop their overview dots
 
 
              # Remove from database (ProjectManager handles deleting items and layer)
@@ -1320,6 +2133,9 @@ class MainWindow(QMainWindow):
             set_active_action = menu.addAction("Set Active")
             set_active_action.triggered.connect(lambda: self.set_active_layer(layer_data['id']))
 
+            color_action = menu.addAction(QIcon.fromTheme("color-picker"), "Change Colour...")
+            color_action.triggered.connect(lambda: self.change_layer_color(layer_data['id']))
+
             rename_action = menu.addAction(QIcon.fromTheme("edit-rename"), "Rename Layer...")
             rename_action.triggered.connect(self.rename_layer)
             rename_action.setEnabled(not is_default)
@@ -0,0 +1,233 @@
+# PageSource.py (On-demand page rendering for PDF sources)
+import bisect
+import os
+
+import fitz # PyMuPDF
+from PyQt6.QtGui import QImage
+
+from DocumentPool import DocumentPool
+from RenderCache import file_fingerprint
+from SnapIndex import drawing_segments, build_features
+from SymbolMatcher import render_gray
+
+
+BASE_DPI = 150 # Scene units are pixels at this resolution (measurements are stored in them)
+
+
+class PdfPageSource:
+    """Renders pages of a PDF only when asked for.
+
+    Page count and page sizes come from the document metadata, so navigation
+    works before any page has been rasterized. With a DiskRenderCache the
+    metadata is read from the cache when this version of the file has been
+    seen before, and the PyMuPDF document is only opened once something
+    actually needs rendering. Otherwise only the page count is read up
+    front; the page sizes follow when a page is first needed. The document handle is borrowed from a
+    DocumentPool for each use, so many sources can share a bounded
+    number of open documents.
+    """
+    def __init__(self, file_path, base_dpi=BASE_DPI, cache=None, pool=None):
+        self.file_path = file_path
+        self.base_dpi = base_dpi
+        self.cache = cache
+        self.pool = pool if pool is not None else DocumentPool(max_open=1)
+        self.fingerprint = file_fingerprint(file_path)
+
+        self._page_rects = None # [(x0, y0, x1, y1), ...] in PDF points, see page_rects
+        if cache:
+            cache.invalidate_source(file_path, self.fingerprint)
+            self._page_rects = cache.get_page_rects(self.fingerprint)
+        if self._page_rects is not None:
+            self._page_count = len(self._page_rects)
+        else:
+            with self.pool.document(file_path) as doc:
+                self._page_count = doc.page_count # Loads no pages, unlike their rects
+        if not self._page_count:
+            self.close()
+            raise ValueError("PDF has no pages or could not be opened correctly.")
+        print(f"Opened PDF with {self.page_count} pages: {file_path}")
+
+    def set_cache(self, cache):
+        self.cache = cache
+        if cache and self._page_rects is not None:
+            cache.put_page_rects(self.fingerprint, self.file_path, self._page_rects)
+
+    def page_rects(self):
+        """Rects of all pages in PDF points, read from the document (and cached) the first time they are needed.
+
+        Reading them loads every page, which takes a while for large
+        sets, so a project of many documents only pays it for those
+        whose sheets are visited.
+        """
+        if self._page_rects is None:
+            with self.pool.document(self.file_path) as doc:
+                page_rects = [tuple(doc.load_page(i).rect) for i in range(doc.page_count)]
+            if self.cache:
+                self.cache.put_page_rects(self.fingerprint, self.file_path, page_rects)
+            self._page_rects = page_rects
+        return self._page_rects
+
+    @property
+    def page_count(self):
+        return self._page_count
+
+    def locate(self, page_index):
+        """The single-document source and page holding a page (see ProjectPageSource)."""
+        return self, page_index
+
+    def page_size(self, page_index):
+        """Size of a page in scene pixels (at base DPI) as (width, height)."""
+        x0, y0, x1, y1 = self.page_rects()[page_index]
+        zoom = self.base_dpi / 72
+        return (x1 - x0) * zoom, (y1 - y0) * zoom
+
+    def render_page(self, page_index, dpi=None):
+        """Render a single page to a QImage. Returns None on failure."""
+        if not (0 <= page_index < self.page_count):
+            return None
+        dpi = dpi or self.base_dpi
+        zoom = dpi / 72  # Calculate zoom factor based on standard PDF DPI
+        with self.pool.document(self.file_path) as doc:
+            pix = doc.load_page(page_index).get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)  # alpha=False for RGB
+        return pixmap_to_qimage(pix)
+
+    def render_clip(self, page_index, dpi, clip):
+        """Render part of a page to a QImage.
+
+        `clip` is a QRectF in scene pixels (base DPI); the result covers the
+        same area rendered at `dpi`.
+        """
+        if not (0 <= page_index < self.page_count):
+            return None
+        x0, y0, _, _ = self.page_rects()[page_index]
+        to_points = 72 / self.base_dpi # Scene pixels -> PDF points
+        pdf_clip = fitz.Rect(
+            x0 + clip.left() * to_points, y0 + clip.top() * to_points,
+            x0 + clip.right() * to_points, y0 + clip.bottom() * to_points
+        )
+        zoom = dpi / 72
+        with self.pool.document(self.file_path) as doc:
+            pix = doc.load_page(page_index).get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=pdf_clip, alpha=False)
+        return pixmap_to_qimage(pix)
+
+    def render_gray(self, page_index, dpi):
+        """Render a page as a grayscale float32 array (0 black .. 1 white) for image analysis."""
+        if not (0 <= page_index < self.page_count):
+            return None
+        with self.pool.document(self.file_path) as doc:
+            return render_gray(doc.load_page(page_index), dpi)
+
+    def snap_features(self, page_index):
+        """Snap features (x, y, kind) of a page's vector content in scene pixels, see SnapIndex."""
+        x0, y0, _, _ = self.page_rects()[page_index]
+        with self.pool.document(self.file_path) as doc:
+            drawings = doc.load_page(page_index).get_drawings()
+        segments, curve_ends = drawing_segments(drawings, (x0, y0), self.base_dpi / 72)
+        return build_features(segments, curve_ends)
+
+    def close(self):
+        self.pool.close(self.file_path)
+
+
+class ProjectPageSource:
+    """The pages of several PDF documents as one sequence of sheets.
+
+    A project can take off from many drawing sets (architectural,
+    structural, MEP); sheet indexes run through the documents in order.
+    The documents share one DocumentPool, so however many there are,
+    only a few are open at once. Each document keeps its own fingerprint
+    and cache entries, and reads its page sizes only once one of its
+    sheets is needed; use locate() to reach the document of a sheet.
+    """
+    def __init__(self, file_paths, base_dpi=BASE_DPI, cache=None, pool=None):
+        self.base_dpi = base_dpi
+        self.cache = cache
+        self.pool = pool if pool is not None else DocumentPool()
+        self.documents = []
+        try:
+            for file_path in file_paths:
+                self.documents.append(PdfPageSource(file_path, base_dpi, cache, self.pool))
+        except Exception:
+            self.close()
+            raise
+        if not self.documents:
+            raise ValueError("The project has no source documents.")
+        self._first_sheets = [] # Sheet index of each document's first page
+        sheet = 0
+        for document in self.documents:
+            self._first_sheets.append(sheet)
+            sheet += document.page_count
+        self._sheet_count = sheet
+
+    @property
+    def page_count(self):
+        return self._sheet_count
+
+    @property
+    def file_path(self):
+        return self.documents[0].file_path
+
+    def split(self, sheet):
+        """(index of the document, page in that document) of a sheet."""
+        index = bisect.bisect_right(self._first_sheets, sheet) - 1
+        return index, sheet - self._first_sheets[index]
+
+    def sheet(self, document_index, page_index):
+        return self._first_sheets[document_index] + page_index
+
+    def set_cache(self, cache):
+        self.cache = cache
+        for document in self.documents:
+            document.set_cache(cache)
+
+    def locate(self, sheet):
+        """(PdfPageSource, page in it) of a sheet."""
+        index, page_index = self.split(sheet)
+        return self.documents[index], page_index
+
+    def sheet_label(self, sheet):
+        """Document name and page of a sheet, e.g. 'S-201.pdf p. 2'."""
+        document, page_index = self.locate(sheet)
+        return f"{os.path.basename(document.file_path)} p. {page_index + 1}"
+
+    def page_size(self, sheet):
+        document, page_index = self.locate(sheet)
+        return document.page_size(page_index)
+
+    def render_page(self, sheet, dpi=None):
+        if not (0 <= sheet < self.page_count):
+            return None
+        document, page_index = self.locate(sheet)
+        return document.render_page(page_index, dpi)
+
+    def render_clip(self, sheet, dpi, clip):
+        if not (0 <= sheet < self.page_count):
+            return None
+        document, page_index = self.locate(sheet)
+        return document.render_clip(page_index, dpi, clip)
+
+    def render_gray(self, sheet, dpi):
+        if not (0 <= sheet < self.page_count):
+            return None
+        document, page_index = self.locate(sheet)
+        return document.render_gray(page_index, dpi)
+
+    def snap_features(self, sheet):
+        document, page_index = self.locate(sheet)
+        return document.snap_features(page_index)
+
+    def close(self):
+        self.pool.close()
+
+
+def pixmap_to_qimage(pix):
+    """Convert a MuPDF pixmap to a QImage that owns its pixel data."""
+    if pix.alpha:  # Check if pixmap has alpha channel (RGBA)
+        qimage_format = QImage.Format.Format_RGBA8888
+    else:  # Assume RGB
+        qimage_format = QImage.Format.Format_RGB888
+    qimage = QImage(pix.samples, pix.width, pix.height, pix.stride, qimage_format)
+    if qimage.isNull():
+        return None
+    # pix.samples is released with the pixmap, so detach the image from it
+    return qimage.copy()
@@ -0,0 +1,77 @@
+# PixmapCache.py (Memory-bounded LRU cache for rendered pages and tiles)
+from collections import OrderedDict
+
+
+DEFAULT_MEMORY_BUDGET_MB = 256
+
+
+def pixmap_cost(pixmap):
+    """Approximate memory used by a QPixmap in bytes."""
+    return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+
+class PixmapCache:
+    """Holds QPixmaps up to a memory budget, evicting the least recently used.
+
+    Evicted entries are simply gone; callers re-request the render when
+    they miss. Hit, miss and eviction counters are kept for diagnostics.
+    """
+    def __init__(self, budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+        self._entries = OrderedDict() # key -> (QPixmap, cost), oldest first
+        self.budget_bytes = budget_mb * 1024 * 1024
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, pixmap):
+        self.remove(key)
+        cost = pixmap_cost(pixmap)
+        self._entries[key] = (pixmap, cost)
+        self.used_bytes += cost
+        self._evict()
+
+    def remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.used_bytes -= entry[1]
+
+    def clear(self):
+        self._entries.clear()
+        self.used_bytes = 0
+
+    def set_budget_mb(self, budget_mb):
+        self.budget_bytes = budget_mb * 1024 * 1024
+        self._evict()
+
+    def _evict(self):
+        # Never evict the entry just added, even if it alone exceeds the budget
+        while self.used_bytes > self.budget_bytes and len(self._entries) > 1:
+            _, (_, cost) = self._entries.popitem(last=False)
+            self.used_bytes -= cost
+            self.evictions += 1
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'used_mb': self.used_bytes / (1024 * 1024),
+            'budget_mb': self.budget_bytes / (1024 * 1024),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
@@ -0,0 +1,197 @@
+# PolygonOps.py (Boolean operations on measured polygons with holes: union, difference, intersection)
+import numpy as np
+from PyQt6.QtCore import Qt, QPointF
+from PyQt6.QtGui import QPainterPath, QPolygonF
+
+from GeometryKernel import simplify
+
+
+MIN_RING_AREA = 0.01     # Square scene pixels; slivers left by the boolean operations are dropped
+COLLINEAR_TOLERANCE = 1e-6 # Scene pixels; vertices left on a straight edge where parts were joined are dropped
+
+# A polygon is (outer, holes): outer is a list of (x, y) in scene pixels, holes a list of such rings.
+
+
+def ring_area(ring):
+    """Absolute shoelace area of a ring of (x, y) points."""
+    if len(ring) < 3:
+        return 0.0
+    points = np.asarray(ring, dtype=np.float64)
+    x, y = points[:, 0], points[:, 1]
+    return abs(float(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))) / 2.0
+
+
+def polygon_area(outer, holes=()):
+    return ring_area(outer) - sum(ring_area(hole) for hole in holes)
+
+
+def polygon_bounds(outer):
+    xs = [x for x, _ in outer]
+    ys = [y for _, y in outer]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def to_path(outer, holes=()):
+    """QPainterPath of a polygon; holes are cut out by the odd-even fill rule."""
+    path = QPainterPath()
+    path.setFillRule(Qt.FillRule.OddEvenFill)
+    for ring in [outer, *holes]:
+        path.addPolygon(QPolygonF([QPointF(x, y) for x, y in ring]))
+        path.closeSubpath()
+    return path
+
+
+def from_path(path):
+    """Split the result of a boolean operation into polygons with holes.
+
+    Each ring of the path is classified by how many other rings contain
+    it: rings at an even depth are outlines, rings at an odd depth are
+    holes of the smallest outline around them (an island inside a hole
+    is an outline of its own).
+    """
+    rings = []
+    for polygon in path.simplified().toSubpathPolygons(): # simplified() also merges edges shared by touching parts
+        ring = [(p.x(), p.y()) for p in polygon]
+        if len(ring) > 1 and ring[0] == ring[-1]:
+            ring.pop() # Subpaths repeat their first point at the end
+        if len(ring) >= 3:
+            first = ring.index(min(ring)) # Start at a hull corner: simplify() always keeps the first vertex
+            ring = ring[first:] + ring[:first]
+            ring = [tuple(point) for point in simplify(ring, COLLINEAR_TOLERANCE, closed=True).tolist()]
+        area = ring_area(ring)
+        if len(ring) >= 3 and area >= MIN_RING_AREA:
+            rings.append((area, ring, polygon))
+    rings.sort(key=lambda r: r[0], reverse=True) # Containers before what they contain
+
+    containers = [] # For each ring: indexes of the (larger) rings containing it
+    for index, (_, ring, _) in enumerate(rings):
+        samples = [QPointF(x, y) for x, y in ring[:3]]
+        containers.append([other for other in range(index)
+                           if sum(rings[other][2].containsPoint(p, Qt.FillRule.OddEvenFill) for p in samples) >= 2])
+
+    polygons = {} # Outline ring index -> (outer, holes)
+    for index, (_, ring, _) in enumerate(rings):
+        depth = len(containers[index])
+        if depth % 2 == 0:
+            polygons[index] = (ring, [])
+        else:
+            # The smallest container at the depth just above is this hole's outline
+            owner = max(c for c in containers[index] if len(containers[c]) == depth - 1)
+            polygons[owner][1].append(ring)
+    return list(polygons.values())
+
+
+def union(polygons):
+    """Union of polygons, as a list of polygons (disjoint parts stay separate)."""
+    path = QPainterPath()
+    for outer, holes in polygons:
+        path = path.united(to_path(outer, holes))
+    return from_path(path)
+
+
+def intersection(polygons):
+    """Area common to all polygons, as a list of polygons."""
+    if not polygons:
+        return []
+    path = to_path(*polygons[0])
+    for outer, holes in polygons[1:]:
+        path = path.intersected(to_path(outer, holes))
+    return from_path(path)
+
+
+def difference(subject, clips):
+    """`subject` minus every polygon in `clips`, as a list of polygons (it may fall apart)."""
+    path = to_path(*subject)
+    for outer, holes in clips:
+        path = path.subtracted(to_path(outer, holes))
+    return from_path(path)
+
+
+def overlapping_pairs(bounds, other_bounds=None):
+    """Pairs of bounding boxes (x0, y0, x1, y1) that overlap or touch, by a sweep over x.
+
+    Boxes are sorted by their left edge; each box is tested only against
+    the boxes starting before its right edge (found by binary search),
+    and the y overlap of those candidates is checked in one vectorized
+    step. With `other_bounds`, returns pairs (i, j) of a box of `bounds`
+    and a box of `other_bounds`; otherwise pairs i < j within `bounds`.
+    """
+    first = np.asarray(bounds, dtype=np.float64).reshape(-1, 4)
+    second = first if other_bounds is None else np.asarray(other_bounds, dtype=np.float64).reshape(-1, 4)
+    boxes = np.concatenate((first, second)) if other_bounds is not None else first
+    sets = np.concatenate((np.zeros(len(first), dtype=np.int8), np.ones(len(second), dtype=np.int8))) \
+        if other_bounds is not None else np.zeros(len(first), dtype=np.int8)
+    order = np.argsort(boxes[:, 0], kind='stable')
+    boxes, sets = boxes[order], sets[order]
+    lefts = boxes[:, 0]
+    ends = np.searchsorted(lefts, boxes[:, 2], 'right') # Boxes [i + 1, ends[i]) start before box i ends
+
+    pairs = []
+    for i in range(len(boxes)):
+        candidates = np.arange(i + 1, ends[i])
+        if not len(candidates):
+            continue
+        hit = (boxes[candidates, 1] <= boxes[i, 3]) & (boxes[candidates, 3] >= boxes[i, 1])
+        if other_bounds is not None:
+            hit &= sets[candidates] != sets[i]
+        for j in candidates[hit].tolist():
+            a, b = int(order[i]), int(order[j])
+            if other_bounds is not None:
+                if a >= len(first): # Report (index in bounds, index in other_bounds)
+                    a, b = b, a
+                b -= len(first)
+            elif a > b:
+                a, b = b, a
+            pairs.append((a, b))
+    return pairs
+
+
+def deduct(subjects, clips):
+    """Subtract the clips overlapping each subject from it.
+
+    Returns {subject index: list of resulting polygons} for the subjects
+    that overlap at least one clip; the others are unchanged.
+    """
+    pairs = overlapping_pairs([polygon_bounds(outer) for outer, _ in subjects],
+                              [polygon_bounds(outer) for outer, _ in clips])
+    clips_of = {}
+    for subject, clip in pairs:
+        clips_of.setdefault(subject, []).append(clip)
+    results = {}
+    for subject, clip_indexes in clips_of.items():
+        pieces = difference(subjects[subject], [clips[c] for c in clip_indexes])
+        if len(pieces) != 1 or abs(polygon_area(*pieces[0]) - polygon_area(*subjects[subject])) > MIN_RING_AREA:
+            results[subject] = pieces # Only boxes overlapped; leave subjects the clips did not cut
+    return results
+
+
+def merge_overlapping(polygons):
+    """Merge polygons that overlap or touch into their unions.
+
+    Returns a list of (indexes of the merged polygons, resulting polygons)
+    for each group of two or more; candidate pairs come from the bounding
+    box sweep and are confirmed by intersecting them.
+    """
+    parent = list(range(len(polygons)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    paths = {}
+    def path_of(i):
+        if i not in paths:
+            paths[i] = to_path(*polygons[i])
+        return paths[i]
+
+    for a, b in overlapping_pairs([polygon_bounds(outer) for outer, _ in polygons]):
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b and path_of(a).intersects(path_of(b)):
+            parent[root_b] = root_a
+
+    groups = {}
+    for i in range(len(polygons)):
+        groups.setdefault(find(i), []).append(i)
+    return [(members, union([polygons[i] for i in members])) for members in groups.values() if len(members) > 1]
@@ -2,77 +2,336 @@
 import sqlite3
 import json
 import os
+import sys
+from array import array
+from pathlib import Path
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+
+ITEM_FETCH_SIZE = 500 # Rows per fetchmany when streaming items
+
+
+# --- Point geometry encoding ---
+# Item points are stored as a BLOB of little-endian float64 values x0, y0, x1, y1, ...
+
+def pack_points(points):
+    """Encode a sequence of (x, y) pairs as a float64 BLOB."""
+    values = array('d', [coord for point in points for coord in point])
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values.tobytes()
+
+def unpack_points(value):
+    """Decode stored points to a list of (x, y) tuples. Accepts legacy JSON text too."""
+    if value is None:
+        return []
+    if isinstance(value, str): # Not yet migrated
+        return [tuple(point) for point in json.loads(value)]
+    if sys.byteorder == 'little':
+        values = memoryview(value).cast('d') # Read in place, no copy of the BLOB
+    else:
+        values = array('d')
+        values.frombytes(value)
+        values.byteswap()
+    return list(zip(values[0::2], values[1::2]))
+
+# Holes of an area are stored as one float64 BLOB: the ring count k, the k point counts, then all the x, y pairs
+
+def pack_rings(rings):
+    """Encode a list of rings (lists of (x, y)) as a float64 BLOB; no rings is NULL."""
+    if not rings:
+        return None
+    values = array('d', [len(rings)] + [len(ring) for ring in rings])
+    values.extend(coord for ring in rings for point in ring for coord in point)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values.tobytes()
+
+def unpack_rings(blob):
+    """Decode a rings BLOB to a list of rings of (x, y) tuples."""
+    if not blob:
+        return []
+    values = array('d')
+    values.frombytes(blob)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    count = int(values[0])
+    rings, position = [], 1 + count
+    for length in values[1:1 + count]:
+        end = position + 2 * int(length)
+        rings.append(list(zip(values[position:end:2], values[position + 1:end:2])))
+        position = end
+    return rings
+
+
+# --- Spatial index ---
+# items_rtree is an R*Tree of item bounding boxes (scene pixels) over x, y and page, keyed by item ID.
+# The item write methods below keep it in step with the items table.
+
+def points_bounds(points):
+    """(min_x, max_x, min_y, max_y) of a sequence of (x, y) pairs, in R*Tree column order; None if empty."""
+    xs = [x for x, _ in points]
+    ys = [y for _, y in points]
+    if not xs:
+        return None
+    return min(xs), max(xs), min(ys), max(ys)
+
+def _points_in_region(blob, x0, y0, x1, y1):
+    """SQL function for region queries on files without the R*Tree: does the item's bounding box meet the region?"""
+    bounds = points_bounds(unpack_points(blob))
+    return bounds is not None and bounds[1] >= x0 and bounds[0] <= x1 and bounds[3] >= y0 and bounds[2] <= y1
+
 
 class ProjectManager:
-    def __init__(self, db_path=None):
+    def __init__(self, db_path=None, read_only=False):
         self.db_path = db_path
         self.conn = None
         self.cursor = None
+        self.writer = None # DatabaseWriter, see start_writer
+        self.has_rtree = False # Whether the file has the items_rtree spatial index
+        self._transaction_depth = 0
         if db_path:
-            self.connect(db_path)
+            self.connect(db_path, read_only)
 
-    def connect(self, db_path):
+    def connect(self, db_path, read_only=False):
+        """Open a project file. Read-only connections never create or migrate the file."""
         self.db_path = db_path
-        new_db = not os.path.exists(db_path)
-        self.conn = sqlite3.connect(db_path)
-        self.cursor = self.conn.cursor()
-        if new_db:
-            self.create_tables()
+        if read_only:
+            self.conn = sqlite3.connect(Path(db_path).absolute().as_uri() + "?mode=ro", uri=True)
+            self.cursor = self.conn.cursor()
+        else:
+            self.conn = sqlite3.connect(db_path)
+            self.cursor = self.conn.cursor()
+            # WAL: writers do not block readers, and a commit appends to the log instead of rewriting pages
+            self.cursor.execute("PRAGMA journal_mode=WAL")
+            if self.cursor.fetchone()[0].lower() != 'wal':
+                print(f"Warning: WAL journaling not available for {db_path}, using the default journal.")
+            self.cursor.execute("PRAGMA synchronous=NORMAL") # Safe with WAL; syncs on checkpoints only
+            self.migrate() # Creates the tables for a new file, upgrades older files in place
+        self.conn.create_function("points_in_region", 5, _points_in_region, deterministic=True)
+        self.has_rtree = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'items_rtree'").fetchone() is not None
         print(f"Connected to database: {db_path}")
 
-    def create_tables(self):
-        if not self.cursor: return
+    def start_writer(self):
+        """Run writes passed to submit() on a background thread with its own connection."""
+        from DatabaseWriter import DatabaseWriter
+        if self.writer is None and self.db_path:
+            db_path = self.db_path
+            self.writer = DatabaseWriter(lambda: ProjectManager(db_path))
+
+    def submit(self, method, *args):
+        """Call a write method on the writer thread. Returns a Future of its result.
+
+        Without a writer the call runs right away and the Future is already done.
+        """
+        if self.writer:
+            return self.writer.submit(method, *args)
+        future = Future()
+        future.set_result(getattr(self, method)(*args))
+        return future
+
+    def flush(self):
+        """Wait until the writer thread has committed everything submitted so far."""
+        if self.writer:
+            self.writer.flush()
+
+    @contextmanager
+    def transaction(self):
+        """Group many writes into a single commit.
+
+        Write methods called inside the block skip their own commit and
+        raise sqlite3.Error instead of returning a failure value; the
+        outermost block commits on success and rolls back on an exception.
+        Blocks can be nested: an inner block is a savepoint, so an error
+        caught inside the outer block undoes only the inner one. Queued
+        background writes are flushed first, so they are never waiting on
+        the lock this block holds.
+
+            with project_manager.transaction():
+                for item in items:
+                    project_manager.update_item_points(item['id'], item['points'])
+        """
+        depth = self._transaction_depth
+        if depth == 0 and not self.conn.in_transaction:
+            self.flush()
+            self.conn.execute("BEGIN") # Explicit, so schema changes are covered too
+        savepoint = f"nested_{depth}"
+        if depth:
+            self.conn.execute(f"SAVEPOINT {savepoint}")
+        self._transaction_depth += 1
         try:
-            # Project Metadata
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS project (
-                    id INTEGER PRIMARY KEY,
-                    name TEXT,
-                    source_path TEXT, -- Path to PDF/Image
-                    source_type TEXT, -- 'pdf' or 'image'
-                    current_page INTEGER DEFAULT 0,
-                    scale_p1_x REAL, scale_p1_y REAL,
-                    scale_p2_x REAL, scale_p2_y REAL,
-                    scale_real_dist REAL,
-                    scale_unit TEXT,
-                    scale_factor REAL -- Calculated: real_dist / pixel_dist
-                )
-            ''')
-            # Layers
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS layers (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    project_id INTEGER,
-                    name TEXT UNIQUE,
-                    visible INTEGER DEFAULT 1,
-                    color TEXT DEFAULT '#FF0000', -- Default Red
-                    FOREIGN KEY (project_id) REFERENCES project(id)
-                )
-            ''')
-             # Add a default layer
-            self.cursor.execute("INSERT OR IGNORE INTO layers (project_id, name) VALUES (?, ?)", (1, "Default Layer"))
-
-            # Measurement Items
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS items (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    project_id INTEGER,
-                    layer_id INTEGER,
-                    type TEXT, -- 'linear', 'area', 'count', 'text', 'curve'
-                    points TEXT, -- JSON list of [x, y] pixel coordinates
-                    value REAL, -- Calculated real-world value (length, area)
-                    unit TEXT,
-                    text_content TEXT, -- For annotations
-                    style TEXT, -- JSON for color, line width etc.
-                    FOREIGN KEY (project_id) REFERENCES project(id),
-                    FOREIGN KEY (layer_id) REFERENCES layers(id)
-                )
-            ''')
+            yield self
+        except Exception:
+            self._transaction_depth -= 1
+            if self.conn:
+                if depth:
+                    self.conn.execute(f"ROLLBACK TO {savepoint}")
+                    self.conn.execute(f"RELEASE {savepoint}")
+                else:
+                    self.conn.rollback()
+            raise
+        self._transaction_depth -= 1
+        if self.conn:
+            if depth:
+                self.conn.execute(f"RELEASE {savepoint}")
+            else:
+                self.conn.commit()
+
+    def _commit(self):
+        """Commit unless a transaction() block is open."""
+        if self._transaction_depth == 0:
             self.conn.commit()
-            print("Database tables created or verified.")
-        except sqlite3.Error as e:
-            print(f"Database error during table creation: {e}")
 
+    def _write_failed(self, message, error):
+        """Report a failed write; inside a transaction() block it is raised again, so the whole block rolls back."""
+        if self._transaction_depth:
+            raise error
+        print(f"{message}: {error}")
+
+    def _inserted_ids(self, table, previous_max_id):
+        """IDs assigned by a bulk insert, in insertion order (AUTOINCREMENT keeps them ascending)."""
+        self.cursor.execute(f"SELECT id FROM {table} WHERE id > ? ORDER BY id", (previous_max_id,))
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def _max_id(self, table):
+        self.cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+        return self.cursor.fetchone()[0]
+
+    # --- Schema Migrations ---
+    # PRAGMA user_version holds the number of migrations applied to a file.
+    # Each migration runs in its own transaction together with the version bump,
+    # so a failure leaves the file at the last complete version.
+
+    def schema_version(self):
+        self.cursor.execute("PRAGMA user_version")
+        return self.cursor.fetchone()[0]
+
+    def migrate(self):
+        if not self.cursor: return False
+        version = self.schema_version()
+        if version > SCHEMA_VERSION:
+            print(f"Warning: {self.db_path} has schema version {version}, newer than this QSTape ({SCHEMA_VERSION}).")
+            return True
+        for target_version in range(version + 1, SCHEMA_VERSION + 1):
+            migration = MIGRATIONS[target_version - 1]
+            try:
+                with self.transaction():
+                    migration(self)
+                    self.cursor.execute(f"PRAGMA user_version = {target_version}")
+                print(f"Applied schema migration {target_version}: {migration.__doc__}")
+            except (sqlite3.Error, ValueError) as e:
+                print(f"Error applying schema migration {target_version}: {e}")
+                return False
+        return True
+
+    def create_tables(self):
+        """Base schema (tables of the original .qst format)."""
+        # Project Metadata
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS project (
+                id INTEGER PRIMARY KEY,
+                name TEXT,
+                source_path TEXT, -- Path to PDF/Image
+                source_type TEXT, -- 'pdf' or 'image'
+                current_page INTEGER DEFAULT 0,
+                scale_p1_x REAL, scale_p1_y REAL,
+                scale_p2_x REAL, scale_p2_y REAL,
+                scale_real_dist REAL,
+                scale_unit TEXT,
+                scale_factor REAL -- Calculated: real_dist / pixel_dist
+            )
+        ''')
+        # Layers
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS layers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                project_id INTEGER,
+                name TEXT UNIQUE,
+                visible INTEGER DEFAULT 1,
+                color TEXT DEFAULT '#FF0000', -- Default Red
+                FOREIGN KEY (project_id) REFERENCES project(id)
+            )
+        ''')
+         # Add a default layer
+        self.cursor.execute("INSERT OR IGNORE INTO layers (project_id, name) VALUES (?, ?)", (1, "Default Layer"))
+
+        # Measurement Items
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS items (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                project_id INTEGER,
+                layer_id INTEGER,
+                type TEXT, -- 'linear', 'area', 'count', 'text', 'curve'
+                points BLOB, -- float64 x, y pairs in pixel coordinates (see pack_points)
+                value REAL, -- Calculated real-world value (length, area)
+                unit TEXT,
+                text_content TEXT, -- For annotations
+                style TEXT, -- JSON for color, line width etc.
+                FOREIGN KEY (project_id) REFERENCES project(id),
+                FOREIGN KEY (layer_id) REFERENCES layers(id)
+            )
+        ''')
+
+    def migrate_points_to_binary(self):
+        """Convert item points stored as JSON text to the binary format."""
+        self.cursor.execute("SELECT id, points FROM items WHERE typeof(points) = 'text'")
+        rows = self.cursor.fetchall()
+        if rows:
+            self.cursor.executemany("UPDATE items SET points = ? WHERE id = ?",
+                                    [(pack_points(json.loads(points)), item_id) for item_id, points in rows])
+            print(f"Converted points of {len(rows)} items to binary format.")
+
+    def create_indexes(self):
+        """Indexes for the per-project, per-layer and per-type item queries."""
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_items_project_layer ON items(project_id, layer_id)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_items_project_type ON items(project_id, type)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_items_layer ON items(layer_id)") # delete_layer
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_layers_project ON layers(project_id)")
+
+    def add_item_pages(self):
+        """Page column on items, so each sheet's measurements can be loaded on their own."""
+        # Items from files without pages were all drawn over the first sheet
+        self.cursor.execute("ALTER TABLE items ADD COLUMN page INTEGER NOT NULL DEFAULT 0")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_items_project_page ON items(project_id, page)")
+
+    def add_item_holes(self):
+        """Holes column on items, for areas with openings cut out."""
+        self.cursor.execute("ALTER TABLE items ADD COLUMN holes BLOB") # pack_rings; NULL for no holes
+
+    def create_item_rtree(self):
+        """R*Tree spatial index of item bounding boxes, for region and point queries."""
+        try:
+            self.cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS items_rtree "
+                                "USING rtree(id, min_x, max_x, min_y, max_y, min_page, max_page)")
+        except sqlite3.OperationalError as e: # SQLite built without the R*Tree module
+            print(f"Warning: No spatial index ({e}); region queries will scan the items.")
+            return
+        self.cursor.execute("SELECT id, page, points FROM items")
+        self.cursor.executemany(self._INDEX_ITEM_SQL,
+                                [(item_id, *bounds, page, page) for item_id, page, points in self.cursor.fetchall()
+                                 if (bounds := points_bounds(unpack_points(points)))])
+
+    def add_sources_table(self):
+        """Sources table and a source column on items, so a project can take off from many documents."""
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sources (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                project_id INTEGER,
+                path TEXT NOT NULL, -- Path to PDF/Image
+                source_type TEXT, -- 'pdf' or 'image'
+                position INTEGER DEFAULT 0, -- Order of the documents' sheets in the project
+                FOREIGN KEY (project_id) REFERENCES project(id)
+            )
+        ''')
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_sources_project ON sources(project_id)")
+        # The project's single source becomes its first document; every existing item was measured on it
+        self.cursor.execute("INSERT INTO sources (project_id, path, source_type) "
+                            "SELECT id, source_path, source_type FROM project WHERE source_path IS NOT NULL")
+        self.cursor.execute("ALTER TABLE items ADD COLUMN source_id INTEGER REFERENCES sources(id)") # items.page is a page of this document
+        self.cursor.execute("UPDATE items SET source_id = (SELECT MIN(id) FROM sources WHERE sources.project_id = items.project_id)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_items_source_page ON items(source_id, page)")
 
     def save_project_metadata(self, project_data):
         if not self.cursor: return False
@@ -93,10 +352,10 @@ class ProjectManager:
                 project_data.get('scale_unit'),
                 project_data.get('scale_factor')
             ))
-            self.conn.commit()
+            self._commit()
             return True
         except sqlite3.Error as e:
-            print(f"Error saving project metadata: {e}")
+            self._write_failed("Error saving project metadata", e)
             return False
 
     def load_project_metadata(self):
@@ -116,69 +375,328 @@ class ProjectManager:
             print(f"Error loading project metadata: {e}")
             return None
 
+    _INSERT_ITEM_SQL = '''
+        INSERT INTO items (project_id, layer_id, source_id, page, type, points, value, unit, text_content, style, holes)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+    _INDEX_ITEM_SQL = "INSERT OR REPLACE INTO items_rtree VALUES (?, ?, ?, ?, ?, ?, ?)"
+
+    def _item_row(self, item_data):
+        return (
+            1, # Assuming project_id is always 1 for simplicity
+            item_data['layer_id'],
+            item_data.get('source_id'),
+            item_data.get('page', 0),
+            item_data['type'],
+            pack_points(item_data['points']),
+            item_data.get('value'),
+            item_data.get('unit'),
+            item_data.get('text_content'),
+            json.dumps(item_data.get('style', {})),
+            pack_rings(item_data.get('holes'))
+        )
+
+    def _index_items(self, item_ids, items_data):
+        """Add the bounding boxes of newly inserted items to the spatial index."""
+        if not self.has_rtree: return
+        rows = []
+        for item_id, item_data in zip(item_ids, items_data):
+            bounds = points_bounds(item_data['points'])
+            if bounds:
+                page = item_data.get('page', 0)
+                rows.append((item_id, *bounds, page, page))
+        self.cursor.executemany(self._INDEX_ITEM_SQL, rows)
+
+    def _reindex_points(self, points_by_id):
+        """Move the indexed bounding boxes of items whose points changed."""
+        if not self.has_rtree: return
+        self.cursor.executemany("UPDATE items_rtree SET min_x = ?, max_x = ?, min_y = ?, max_y = ? WHERE id = ?",
+                                [(*bounds, item_id) for item_id, points in points_by_id
+                                 if (bounds := points_bounds(points))])
+
+    def _unindex_items(self, item_ids):
+        if not self.has_rtree: return
+        self.cursor.executemany("DELETE FROM items_rtree WHERE id = ?", [(item_id,) for item_id in item_ids])
+
     def save_item(self, item_data):
         if not self.cursor: return None
         try:
-            self.cursor.execute('''
-                INSERT INTO items (project_id, layer_id, type, points, value, unit, text_content, style)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                1, # Assuming project_id is always 1 for simplicity
-                item_data['layer_id'],
-                item_data['type'],
-                json.dumps(item_data['points']),
-                item_data.get('value'),
-                item_data.get('unit'),
-                item_data.get('text_content'),
-                json.dumps(item_data.get('style', {}))
-            ))
-            self.conn.commit()
-            return self.cursor.lastrowid # Return the ID of the newly inserted item
+            with self.transaction():
+                self.cursor.execute(self._INSERT_ITEM_SQL, self._item_row(item_data))
+                item_id = self.cursor.lastrowid # The ID of the newly inserted item
+                self._index_items([item_id], [item_data])
+            return item_id
         except sqlite3.Error as e:
-            print(f"Error saving item: {e}")
+            self._write_failed("Error saving item", e)
             return None
 
-    def load_items(self, project_id=1):
+    def save_items(self, items_data):
+        """Insert many items with one executemany and one commit. Returns their new IDs in order."""
         if not self.cursor: return []
+        rows = [self._item_row(item_data) for item_data in items_data]
+        if not rows: return []
         try:
-            self.cursor.execute("SELECT id, layer_id, type, points, value, unit, text_content, style FROM items WHERE project_id = ?", (project_id,))
-            items = []
-            for row in self.cursor.fetchall():
-                 items.append({
-                    'id': row[0], 'layer_id': row[1], 'type': row[2],
-                    'points': json.loads(row[3]), # Deserialize points
-                    'value': row[4], 'unit': row[5], 'text_content': row[6],
-                    'style': json.loads(row[7]) # Deserialize style
-                 })
-            return items
+            with self.transaction():
+                previous_max_id = self._max_id("items")
+                self.cursor.executemany(self._INSERT_ITEM_SQL, rows)
+                item_ids = self._inserted_ids("items", previous_max_id)
+                self._index_items(item_ids, items_data)
+                return item_ids
+        except sqlite3.Error as e:
+            self._write_failed("Error saving items", e)
+            return []
+
+    def replace_items(self, item_ids, items_data):
+        """Delete items and insert others in their place in one transaction, e.g. the result of a boolean operation.
+
+        Returns the new IDs in order, or None if nothing was changed.
+        """
+        if not self.cursor: return None
+        rows = [self._item_row(item_data) for item_data in items_data]
+        try:
+            with self.transaction():
+                self.cursor.executemany("DELETE FROM items WHERE id = ?", [(item_id,) for item_id in item_ids])
+                self._unindex_items(item_ids)
+                previous_max_id = self._max_id("items")
+                self.cursor.executemany(self._INSERT_ITEM_SQL, rows)
+                new_ids = self._inserted_ids("items", previous_max_id)
+                self._index_items(new_ids, items_data)
+                return new_ids
+        except sqlite3.Error as e:
+            self._write_failed("Error replacing items", e)
+            return None
+
+    def _item_filter(self, project_id, page, region=None, source_id=None):
+        sql = " WHERE project_id = ?"
+        params = [project_id]
+        if source_id is not None:
+            sql += " AND source_id = ?"
+            params.append(source_id)
+        if page is not None:
+            sql += " AND page = ?" # Uses idx_items_project_page
+            params.append(page)
+        if region is not None:
+            x0, y0, x1, y1 = region
+            if self.has_rtree: # Bounding boxes meeting the region, found in the R*Tree
+                sql += " AND id IN (SELECT id FROM items_rtree WHERE max_x >= ? AND min_x <= ? AND max_y >= ? AND min_y <= ?"
+                params += [x0, x1, y0, y1]
+                if page is not None:
+                    sql += " AND min_page <= ? AND max_page >= ?"
+                    params += [page, page]
+                sql += ")"
+            else: # Older read-only files: test each item's points
+                sql += " AND points_in_region(points, ?, ?, ?, ?)"
+                params += [x0, y0, x1, y1]
+        return sql, params
+
+    def load_items(self, project_id=1, page=None, chunk_size=ITEM_FETCH_SIZE, region=None, source_id=None):
+        """Yield the items of a project, or only those on one page if `page` is given.
+
+        `source_id` limits them to one source document; its `page` numbers
+        are then that document's pages.
+        With `region` (x0, y0, x1, y1 in scene pixels) only the items whose
+        bounding box meets it are loaded, found in the spatial index.
+        A generator: rows are fetched `chunk_size` at a time on a cursor of
+        their own, so the caller can consume them gradually (with other
+        queries in between) and the whole result is never held in memory.
+        """
+        if not self.conn: return
+        where, params = self._item_filter(project_id, page, region, source_id)
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("SELECT id, layer_id, page, type, points, value, unit, text_content, style, holes, source_id FROM items"
+                           + where, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    try:
+                        style = json.loads(row[8]) if row[8] else {} # Deserialize style
+                    except json.JSONDecodeError as e:
+                        print(f"Error decoding style of item {row[0]}: {e}")
+                        style = {} # Keep the measurement, lose only its style
+                    yield {
+                        'id': row[0], 'layer_id': row[1], 'page': row[2], 'type': row[3],
+                        'points': unpack_points(row[4]), # Decode binary points
+                        'value': row[5], 'unit': row[6], 'text_content': row[7],
+                        'style': style,
+                        'holes': unpack_rings(row[9]),
+                        'source_id': row[10]
+                    }
         except sqlite3.Error as e:
             print(f"Error loading items: {e}")
+        finally:
+            cursor.close()
+
+    def count_items(self, project_id=1, page=None, region=None, source_id=None):
+        if not self.cursor: return 0
+        where, params = self._item_filter(project_id, page, region, source_id)
+        try:
+            self.cursor.execute("SELECT COUNT(*) FROM items" + where, params)
+            return self.cursor.fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Error counting items: {e}")
+            return 0
+
+    @staticmethod
+    def _check_page_source(page, source_id):
+        # Page numbers restart in every source document; a page alone would mix the sheets of all of them
+        if page is not None and source_id is None:
+            raise ValueError("A page filter needs the source_id of its document.")
+
+    def item_ids_in_region(self, x0, y0, x1, y1, page=None, project_id=1, source_id=None):
+        """IDs of the items whose bounding box meets the rectangle (scene pixels), on one page or all.
+
+        `page` is a page of the document `source_id`, which is then
+        required; without both the whole project is searched.
+        """
+        self._check_page_source(page, source_id)
+        if not self.cursor: return []
+        where, params = self._item_filter(project_id, page, (x0, y0, x1, y1), source_id)
+        try:
+            self.cursor.execute("SELECT id FROM items" + where, params)
+            return [row[0] for row in self.cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"Error querying items in region: {e}")
             return []
-        except json.JSONDecodeError as e:
-            print(f"Error decoding JSON from database: {e}")
-            # Decide how to handle corrupted data - skip item, return empty, etc.
-            return [] # Return empty list on decode error for safety
+
+    def item_ids_at_point(self, x, y, page=None, tolerance=0.0, project_id=1, source_id=None):
+        """IDs of the items whose bounding box is within `tolerance` scene pixels of the point (see item_ids_in_region)."""
+        return self.item_ids_in_region(x - tolerance, y - tolerance, x + tolerance, y + tolerance, page, project_id,
+                                       source_id)
 
     def update_item_points(self, item_id, points):
         if not self.cursor: return False
         try:
-            self.cursor.execute("UPDATE items SET points = ? WHERE id = ?", (json.dumps(points), item_id))
-            self.conn.commit()
+            with self.transaction():
+                self.cursor.execute("UPDATE items SET points = ? WHERE id = ?", (pack_points(points), item_id))
+                self._reindex_points([(item_id, points)])
+            return True
+        except sqlite3.Error as e:
+            self._write_failed("Error updating item points", e)
+            return False
+
+    def update_items_points(self, points_by_id):
+        """Update the points of many items in one transaction. `points_by_id` is an iterable of (item_id, points)."""
+        if not self.cursor: return False
+        points_by_id = list(points_by_id)
+        try:
+            with self.transaction():
+                self.cursor.executemany("UPDATE items SET points = ? WHERE id = ?",
+                                        [(pack_points(points), item_id) for item_id, points in points_by_id])
+                self._reindex_points(points_by_id)
+            return True
+        except sqlite3.Error as e:
+            self._write_failed("Error updating item points", e)
+            return False
+
+    def update_items_holes(self, holes_by_id):
+        """Replace the holes of many items in one transaction. `holes_by_id` is an iterable of (item_id, rings)."""
+        if not self.cursor: return False
+        try:
+            with self.transaction():
+                self.cursor.executemany("UPDATE items SET holes = ? WHERE id = ?",
+                                        [(pack_rings(rings), item_id) for item_id, rings in holes_by_id])
             return True
         except sqlite3.Error as e:
-            print(f"Error updating item points: {e}")
+            self._write_failed("Error updating item holes", e)
             return False
 
     def delete_item(self, item_id):
         if not self.cursor: return False
         try:
-            self.cursor.execute("DELETE FROM items WHERE id = ?", (item_id,))
-            self.conn.commit()
+            with self.transaction():
+                self.cursor.execute("DELETE FROM items WHERE id = ?", (item_id,))
+                self._unindex_items([item_id])
+            return True
+        except sqlite3.Error as e:
+            self._write_failed("Error deleting item", e)
+            return False
+
+    def delete_items(self, item_ids):
+        if not self.cursor: return False
+        item_ids = list(item_ids)
+        try:
+            with self.transaction():
+                self.cursor.executemany("DELETE FROM items WHERE id = ?", [(item_id,) for item_id in item_ids])
+                self._unindex_items(item_ids)
+            return True
+        except sqlite3.Error as e:
+            self._write_failed("Error deleting items", e)
+            return False
+
+    def load_item_totals(self, project_id=1, page=None, region=None, source_id=None):
+        """Item count and summed value per (layer_id, type, unit), aggregated in SQLite.
+
+        `source_id`, `page` and `region` (x0, y0, x1, y1 in scene pixels)
+        limit the totals to part of the project, as in load_items; a page
+        needs its source_id.
+        """
+        self._check_page_source(page, source_id)
+        if not self.cursor: return []
+        where, params = self._item_filter(project_id, page, region, source_id)
+        try:
+            self.cursor.execute("SELECT layer_id, type, unit, COUNT(*), COALESCE(SUM(value), 0) FROM items"
+                                + where + " GROUP BY layer_id, type, unit", params)
+            return [{'layer_id': r[0], 'type': r[1], 'unit': r[2], 'count': r[3], 'total': r[4]}
+                    for r in self.cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"Error loading item totals: {e}")
+            return []
+
+    def load_item_geometry(self, project_id=1):
+        """IDs, types, raw packed points and raw packed holes of all items, for bulk geometry work (see GeometryKernel)."""
+        if not self.cursor: return [], [], [], []
+        try:
+            self.cursor.execute("SELECT id, type, points, holes FROM items WHERE project_id = ?", (project_id,))
+            rows = self.cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Error loading item geometry: {e}")
+            return [], [], [], []
+        if not rows: return [], [], [], []
+        ids, types, blobs, holes = zip(*rows)
+        return list(ids), list(types), list(blobs), list(holes)
+
+    def update_item_values(self, values):
+        """Set value and unit of many items in one transaction. `values` is an iterable of (item_id, value, unit)."""
+        if not self.cursor: return False
+        try:
+            with self.transaction():
+                self.cursor.executemany("UPDATE items SET value = ?, unit = ? WHERE id = ?",
+                                        [(value, unit, item_id) for item_id, value, unit in values])
             return True
         except sqlite3.Error as e:
-            print(f"Error deleting item: {e}")
+            self._write_failed("Error updating item values", e)
             return False
 
+    # --- Source Document Methods ---
+    def load_sources(self, project_id=1):
+        """The project's source documents in sheet order, as dicts {'id', 'path', 'source_type'}."""
+        if not self.cursor: return []
+        try:
+            self.cursor.execute("SELECT id, path, source_type FROM sources WHERE project_id = ? ORDER BY position, id",
+                                (project_id,))
+            return [{'id': r[0], 'path': r[1], 'source_type': r[2]} for r in self.cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"Error loading sources: {e}")
+            return []
+
+    def add_sources(self, paths, source_type='pdf', project_id=1):
+        """Append documents to the project; their sheets follow the existing ones. Returns their new IDs in order."""
+        if not self.cursor: return []
+        try:
+            with self.transaction():
+                self.cursor.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM sources WHERE project_id = ?", (project_id,))
+                position = self.cursor.fetchone()[0]
+                previous_max_id = self._max_id("sources")
+                self.cursor.executemany("INSERT INTO sources (project_id, path, source_type, position) VALUES (?, ?, ?, ?)",
+                                        [(project_id, path, source_type, position + i) for i, path in enumerate(paths)])
+                return self._inserted_ids("sources", previous_max_id)
+        except sqlite3.Error as e:
+            self._write_failed("Error adding sources", e)
+            return []
+
     # --- Layer Methods ---
     def load_layers(self, project_id=1):
         if not self.cursor: return []
@@ -193,15 +711,33 @@ class ProjectManager:
          if not self.cursor: return None
          try:
              self.cursor.execute("INSERT INTO layers (project_id, name, color) VALUES (?, ?, ?)", (project_id, name, color))
-             self.conn.commit()
+             self._commit()
              return self.cursor.lastrowid
-         except sqlite3.IntegrityError:
-             print(f"Layer '{name}' already exists.")
+         except sqlite3.IntegrityError as e:
+             self._write_failed(f"Layer '{name}' already exists", e)
              return None # Indicate failure due to uniqueness constraint
          except sqlite3.Error as e:
-             print(f"Error adding layer: {e}")
+             self._write_failed("Error adding layer", e)
              return None
 
+    def add_layers(self, layers, project_id=1):
+        """Insert many layer dicts ({'name', 'color', 'visible'}) in one transaction. Returns their new IDs in order."""
+        if not self.cursor: return []
+        rows = [(project_id, layer['name'], layer.get('color', '#FF0000'), 1 if layer.get('visible', True) else 0)
+                for layer in layers]
+        if not rows: return []
+        try:
+            with self.transaction():
+                previous_max_id = self._max_id("layers")
+                self.cursor.executemany("INSERT INTO layers (project_id, name, color, visible) VALUES (?, ?, ?, ?)", rows)
+                return self._inserted_ids("layers", previous_max_id)
+        except sqlite3.IntegrityError as e:
+            self._write_failed("Error adding layers, a name already exists", e)
+            return []
+        except sqlite3.Error as e:
+            self._write_failed("Error adding layers", e)
+            return []
+
 
     def update_layer(self, layer_id, name=None, visible=None, color=None):
         if not self.cursor: return False
@@ -224,30 +760,74 @@ class ProjectManager:
 
         try:
             self.cursor.execute(sql, tuple(params))
-            self.conn.commit()
+            self._commit()
             return True
         except sqlite3.Error as e:
-            print(f"Error updating layer {layer_id}: {e}")
+            self._write_failed(f"Error updating layer {layer_id}", e)
             return False
 
     def delete_layer(self, layer_id):
          if not self.cursor: return False
+         self.flush() # Items queued for this layer must be stored before they are deleted
          try:
              # Optional: Decide what to do with items on this layer.
              # Delete them? Move to default? Prevent deletion if not empty?
              # Here, we'll just delete the layer for simplicity.
-             self.cursor.execute("DELETE FROM items WHERE layer_id = ?", (layer_id,)) # Delete associated items first
-             self.cursor.execute("DELETE FROM layers WHERE id = ?", (layer_id,))
-             self.conn.commit()
+             with self.transaction():
+                 if self.has_rtree:
+                     self.cursor.execute("DELETE FROM items_rtree WHERE id IN (SELECT id FROM items WHERE layer_id = ?)", (layer_id,))
+                 self.cursor.execute("DELETE FROM items WHERE layer_id = ?", (layer_id,)) # Delete associated items first
+                 self.cursor.execute("DELETE FROM layers WHERE id = ?", (layer_id,))
              return True
          except sqlite3.Error as e:
-             print(f"Error deleting layer {layer_id}: {e}")
+             self._write_failed(f"Error deleting layer {layer_id}", e)
              return False
 
+    def copy_to(self, dest_path, progress=None, pages=256):
+        """Copy the whole database to `dest_path` with SQLite's online backup API.
+
+        The copy streams `pages` database pages at a time and keeps every
+        row and ID as is. `progress(status, remaining, total)` is called
+        after each step. Uncommitted writes are not part of the copy.
+        """
+        if not self.conn: return False
+        if os.path.abspath(dest_path) == os.path.abspath(self.db_path):
+            print("Error copying project: destination is the open project.")
+            return False
+        self.flush() # Queued writes are part of the copy
+        dest = None
+        try:
+            dest = sqlite3.connect(dest_path)
+            self.conn.backup(dest, pages=pages, progress=progress)
+            return True
+        except sqlite3.Error as e:
+            print(f"Error copying project to {dest_path}: {e}")
+            return False
+        finally:
+            if dest:
+                dest.close()
+
     def close(self):
+        if self.writer:
+            self.writer.close() # Finishes the queued writes
+            self.writer = None
         if self.conn:
             self.conn.commit() # Ensure final commit
             self.conn.close()
             self.conn = None
             self.cursor = None
-            print("Database connection closed.")
\ No newline at end of file
+            print("Database connection closed.")
+
+
+# Ordered schema migrations; migration N upgrades a file from user_version N-1 to N.
+# Append new ones to the end, never reorder or edit the ones already released.
+MIGRATIONS = [
+    ProjectManager.create_tables,
+    ProjectManager.migrate_points_to_binary,
+    ProjectManager.create_indexes,
+    ProjectManager.add_item_pages,
+    ProjectManager.add_item_holes,
+    ProjectManager.create_item_rtree,
+    ProjectManager.add_sources_table,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
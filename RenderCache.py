@@ -0,0 +1,183 @@
+# RenderCache.py (Persistent on-disk cache of rendered pages and tiles)
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from PyQt6.QtGui import QImage
+
+
+DEFAULT_DISK_CACHE_MB = 1024
+FINGERPRINT_CHUNK = 1024 * 1024 # Bytes hashed from the start and the end of the file
+
+
+def file_fingerprint(path):
+    """Identify a file's contents cheaply: size, mtime and a hash of its head and tail."""
+    stat = os.stat(path)
+    digest = hashlib.sha1(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(FINGERPRINT_CHUNK))
+        if stat.st_size > FINGERPRINT_CHUNK:
+            f.seek(max(FINGERPRINT_CHUNK, stat.st_size - FINGERPRINT_CHUNK))
+            digest.update(f.read(FINGERPRINT_CHUNK))
+    return digest.hexdigest()
+
+
+def cache_dir_for_project(project_path):
+    """Sidecar cache directory stored next to the .qst file."""
+    return project_path + ".cache"
+
+
+class DiskRenderCache:
+    """Rendered images stored as PNG files, indexed by a small SQLite table.
+
+    Entries are keyed by source fingerprint, page, DPI and tile, so a changed
+    source file never hits stale images; its old entries are purged when the
+    new version is opened. The total size is kept under `max_bytes` by
+    evicting the least recently used files. Used from both the GUI thread
+    and the render worker, hence the lock.
+    """
+    def __init__(self, cache_dir, max_bytes=DEFAULT_DISK_CACHE_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(cache_dir, "index.db"), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                source_path TEXT,
+                fingerprint TEXT,
+                file_name TEXT,
+                size INTEGER,
+                last_access REAL
+            )
+        ''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries(last_access)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_source ON entries(source_path, fingerprint)")
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS documents (
+                fingerprint TEXT PRIMARY KEY,
+                source_path TEXT,
+                page_sizes TEXT -- JSON list of [x0, y0, x1, y1] page rects in PDF points
+            )
+        ''')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS snap_features (
+                fingerprint TEXT,
+                page INTEGER,
+                source_path TEXT,
+                features BLOB, -- float64 (x, y, kind) triples, see SnapIndex
+                PRIMARY KEY (fingerprint, page)
+            )
+        ''')
+        self.conn.commit()
+        self._total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    @staticmethod
+    def make_key(fingerprint, job_key, dpi):
+        """Build the cache key for a RenderWorker job key rendered at `dpi`."""
+        return f"{fingerprint}/{dpi:g}/" + "/".join(str(part) for part in job_key)
+
+    def invalidate_source(self, source_path, fingerprint):
+        """Drop everything cached for older versions of `source_path`."""
+        with self._lock:
+            stale = self.conn.execute(
+                "SELECT key, file_name, size FROM entries WHERE source_path = ? AND fingerprint != ?",
+                (source_path, fingerprint)).fetchall()
+            for key, file_name, size in stale:
+                self._remove_file(file_name)
+                self._total_bytes -= size
+            self.conn.execute("DELETE FROM entries WHERE source_path = ? AND fingerprint != ?", (source_path, fingerprint))
+            self.conn.execute("DELETE FROM documents WHERE source_path = ? AND fingerprint != ?", (source_path, fingerprint))
+            self.conn.execute("DELETE FROM snap_features WHERE source_path = ? AND fingerprint != ?", (source_path, fingerprint))
+            self.conn.commit()
+        if stale:
+            print(f"Render cache: dropped {len(stale)} stale entries for {source_path}")
+
+    def get(self, key):
+        with self._lock:
+            row = self.conn.execute("SELECT file_name, size FROM entries WHERE key = ?", (key,)).fetchone()
+            if not row:
+                return None
+            image = QImage(os.path.join(self.cache_dir, row[0]))
+            if image.isNull(): # File removed or damaged behind our back
+                self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._total_bytes -= row[1]
+            else:
+                self.conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            return None if image.isNull() else image
+
+    def put(self, key, image, source_path, fingerprint):
+        file_name = hashlib.sha1(key.encode()).hexdigest() + ".png"
+        file_path = os.path.join(self.cache_dir, file_name)
+        if not image.save(file_path, "PNG", 80): # Low compression, favour write speed
+            print(f"Render cache: failed to write {file_path}")
+            return
+        size = os.path.getsize(file_path)
+        with self._lock:
+            old = self.conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if old:
+                self._total_bytes -= old[0]
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries (key, source_path, fingerprint, file_name, size, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, source_path, fingerprint, file_name, size, time.time()))
+            self._total_bytes += size
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        """Remove least recently used entries until under 90% of the limit. Caller holds the lock."""
+        if self._total_bytes <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        evicted = []
+        for key, file_name, size in self.conn.execute("SELECT key, file_name, size FROM entries ORDER BY last_access"):
+            if self._total_bytes <= target:
+                break
+            self._remove_file(file_name)
+            self._total_bytes -= size
+            evicted.append((key,))
+        self.conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
+
+    def _remove_file(self, file_name):
+        try:
+            os.remove(os.path.join(self.cache_dir, file_name))
+        except OSError:
+            pass
+
+    # --- Document metadata (lets a cached source open without PyMuPDF) ---
+    def get_page_rects(self, fingerprint):
+        with self._lock:
+            row = self.conn.execute("SELECT page_sizes FROM documents WHERE fingerprint = ?", (fingerprint,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_page_rects(self, fingerprint, source_path, page_rects):
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO documents (fingerprint, source_path, page_sizes) VALUES (?, ?, ?)",
+                              (fingerprint, source_path, json.dumps(page_rects)))
+            self.conn.commit()
+
+    # --- Snap features (vector geometry extracted from a page) ---
+    def get_snap_features(self, fingerprint, page_index):
+        with self._lock:
+            row = self.conn.execute("SELECT features FROM snap_features WHERE fingerprint = ? AND page = ?",
+                                    (fingerprint, page_index)).fetchone()
+        return np.frombuffer(row[0], dtype='<f8').reshape(-1, 3) if row else None
+
+    def put_snap_features(self, fingerprint, page_index, source_path, features):
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO snap_features (fingerprint, page, source_path, features) VALUES (?, ?, ?, ?)",
+                              (fingerprint, page_index, source_path, np.ascontiguousarray(features, dtype='<f8').tobytes()))
+            self.conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self.conn:
+                self.conn.close()
+                self.conn = None
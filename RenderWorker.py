@@ -0,0 +1,184 @@
+# RenderWorker.py (Background PDF rendering thread)
+import itertools
+import queue
+import threading
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from SnapIndex import SnapIndex
+
+
+PREFETCH_RADIUS = 2 # Pages on each side of the current page to prefetch
+PREVIEW_DPI = 75    # Whole-page previews, shown until sharper tiles arrive
+
+# Priorities (lower runs first)
+PRIORITY_PREVIEW = 0
+PRIORITY_TILE = 1
+PRIORITY_SNAP = 2
+PRIORITY_PREFETCH = 3
+
+
+class RenderJob:
+    __slots__ = ('key', 'page_index', 'dpi', 'clip')
+
+    def __init__(self, key, page_index, dpi, clip=None):
+        self.key = key # ('preview', page), ('tile', page, level, col, row), ('snap', page) or ('raster', page, dpi)
+        self.page_index = page_index
+        self.dpi = dpi
+        self.clip = clip # QRectF in scene pixels, None for the whole page
+
+
+class RenderWorker(QThread):
+    """Renders pages and tiles off the GUI thread.
+
+    PyMuPDF must not be used from several threads at once, so every render
+    for a document goes through this single worker. Jobs are served by
+    priority and looked up in the source's disk cache (if any) before
+    rendering; jobs for pages that are no longer wanted (the user jumped
+    elsewhere) or tiles from a zoom level no longer shown are dropped
+    without rendering. Snap indexes of pages' vector content and grayscale
+    rasters for image analysis are made here too, as they also go
+    through PyMuPDF.
+    """
+    image_rendered = pyqtSignal(object, object) # job key, QImage
+    snap_index_ready = pyqtSignal(int, object) # page index, SnapIndex
+    raster_ready = pyqtSignal(object, object) # job key, grayscale NumPy array
+
+    def __init__(self, page_source, parent=None):
+        super().__init__(parent)
+        self.page_source = page_source
+        self._queue = queue.PriorityQueue()
+        self._counter = itertools.count() # Keeps FIFO order within a priority
+        self._lock = threading.Lock()
+        self._pending = set()     # Keys queued or in progress, to avoid duplicate jobs
+        self._wanted_pages = None # None = everything is wanted
+        self._tile_level = None
+        self._stopping = False
+        self._cache_switch = None # (cache,) to replace the source's disk cache, see set_cache
+
+    # --- Requests (GUI thread) ---
+    def request_preview(self, page_index, priority=PRIORITY_PREVIEW):
+        self._submit(RenderJob(('preview', page_index), page_index, PREVIEW_DPI), priority)
+
+    def request_tile(self, page_index, level, col, row, dpi, clip, priority=PRIORITY_TILE):
+        self._submit(RenderJob(('tile', page_index, level, col, row), page_index, dpi, clip), priority)
+
+    def request_snap_index(self, page_index, priority=PRIORITY_SNAP):
+        self._submit(RenderJob(('snap', page_index), page_index, None), priority)
+
+    def request_raster(self, page_index, dpi, priority=PRIORITY_TILE):
+        """Grayscale array of a whole page, e.g. for room detection."""
+        self._submit(RenderJob(('raster', page_index, dpi), page_index, dpi), priority)
+
+    def _submit(self, job, priority):
+        with self._lock:
+            if job.key in self._pending or self._stopping:
+                return
+            self._pending.add(job.key)
+        self._queue.put((priority, next(self._counter), job))
+
+    def set_current_page(self, page_index):
+        """Focus on a page and its neighbours; queued jobs for other pages are cancelled."""
+        page_count = self.page_source.page_count
+        first = max(0, page_index - PREFETCH_RADIUS)
+        last = min(page_count - 1, page_index + PREFETCH_RADIUS)
+        with self._lock:
+            self._wanted_pages = set(range(first, last + 1))
+        for neighbour in range(first, last + 1):
+            if neighbour != page_index:
+                self.request_preview(neighbour, PRIORITY_PREFETCH)
+
+    def set_tile_level(self, level):
+        """Queued tiles from other zoom levels are cancelled."""
+        with self._lock:
+            self._tile_level = level
+
+    def set_cache(self, cache):
+        """Move the source to another disk cache (the project was saved elsewhere).
+
+        The cache is in use on the worker thread, so the switch happens
+        between jobs and the old cache is closed there.
+        """
+        with self._lock:
+            pending, self._cache_switch = self._cache_switch, (cache,)
+        if pending and pending[0]:
+            pending[0].close() # Replaced before it was ever used
+
+    def stop(self):
+        with self._lock:
+            self._stopping = True
+        self._queue.put((-1, next(self._counter), None)) # Wake the thread up
+        self.wait()
+        self._switch_cache() # The thread is gone; a switch still pending is made here
+
+    def _switch_cache(self):
+        with self._lock:
+            switch, self._cache_switch = self._cache_switch, None
+        if switch is None:
+            return
+        old = self.page_source.cache
+        self.page_source.set_cache(switch[0])
+        if old:
+            old.close()
+
+    # --- Worker thread ---
+    def _is_stale(self, job):
+        with self._lock:
+            if self._stopping:
+                return True
+            if self._wanted_pages is not None and job.page_index not in self._wanted_pages:
+                return True
+            if job.key[0] == 'tile' and self._tile_level is not None and job.key[2] != self._tile_level:
+                return True
+            return False
+
+    def _render(self, job):
+        # Cache entries belong to the document the page is in, under its page number there
+        source, page_index = self.page_source.locate(job.page_index)
+        cache_key = None
+        if source.cache:
+            cache_key = source.cache.make_key(source.fingerprint, (job.key[0], page_index) + job.key[2:], job.dpi)
+            image = source.cache.get(cache_key)
+            if image is not None:
+                return image
+        if job.clip is None:
+            image = source.render_page(page_index, job.dpi)
+        else:
+            image = source.render_clip(page_index, job.dpi, job.clip)
+        if image is not None and cache_key:
+            source.cache.put(cache_key, image, source.file_path, source.fingerprint)
+        return image
+
+    def _build_snap_index(self, job):
+        source, page_index = self.page_source.locate(job.page_index)
+        features = source.cache.get_snap_features(source.fingerprint, page_index) if source.cache else None
+        if features is None:
+            features = source.snap_features(page_index)
+            if source.cache:
+                source.cache.put_snap_features(source.fingerprint, page_index, source.file_path, features)
+        return SnapIndex(features)
+
+    def run(self):
+        while True:
+            _, _, job = self._queue.get()
+            self._switch_cache()
+            if job is None:
+                break
+            try:
+                if self._is_stale(job):
+                    continue
+                if job.key[0] == 'snap':
+                    self.snap_index_ready.emit(job.page_index, self._build_snap_index(job))
+                    continue
+                if job.key[0] == 'raster':
+                    raster = self.page_source.render_gray(job.page_index, job.dpi)
+                    if raster is not None:
+                        self.raster_ready.emit(job.key, raster)
+                    continue
+                image = self._render(job)
+                if image is not None:
+                    self.image_rendered.emit(job.key, image)
+            except Exception as e:
+                print(f"Error rendering {job.key}: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard(job.key)
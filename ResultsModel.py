@@ -0,0 +1,248 @@
+# ResultsModel.py (Table models for the measurements dock)
+import bisect
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, pyqtSignal
+
+
+# Row fields, in column order
+COL_ID, COL_TYPE, COL_LAYER, COL_VALUE, COL_UNIT = range(5)
+HEADERS = ["ID", "Type", "Layer", "Value", "Unit"]
+
+
+class ResultsModel(QAbstractTableModel):
+    """Measurements of the current page as table rows, for a QTableView.
+
+    Rows are plain lists [db_id, type, layer_id, value, unit]; no widget
+    or string is created per measurement, the view asks only for the
+    visible cells. Sorting is done here on the Python list (a sort proxy
+    would call data() for every comparison), and rows added later are
+    inserted at their sorted position. Rows are added and removed
+    incrementally and per-layer subtotals are kept up to date as they change.
+    """
+    subtotals_changed = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []
+        self._row_of_id = {} # db_id -> row index
+        self._layer_names = {} # layer_id -> name
+        self._subtotals = {} # (layer_id, unit) -> [count, total]
+        self._sort_column = None
+        self._sort_descending = False
+
+    # --- QAbstractTableModel ---
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self._rows[index.row()]
+        column = index.column()
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == COL_LAYER:
+                return self._layer_names.get(row[COL_LAYER], f"Layer {row[COL_LAYER]}")
+            if column == COL_TYPE:
+                return row[COL_TYPE].title()
+            if column == COL_VALUE:
+                return f"{row[COL_VALUE] or 0.0:.2f}"
+            return row[column]
+
+        if role == Qt.ItemDataRole.TextAlignmentRole and column in (COL_ID, COL_VALUE):
+            return int(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+        return None
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        self._sort_column = column
+        self._sort_descending = order == Qt.SortOrder.DescendingOrder
+        self.layoutAboutToBeChanged.emit()
+        # Persistent indexes (selection, current cell) follow their row's ID to its new position
+        persistent = self.persistentIndexList()
+        ids = [self._rows[index.row()][COL_ID] for index in persistent]
+        self._sort_rows()
+        self.changePersistentIndexList(persistent, [self.index(self._row_of_id[db_id], index.column())
+                                                    for db_id, index in zip(ids, persistent)])
+        self.layoutChanged.emit()
+
+    def _sort_key(self, row):
+        column = self._sort_column
+        if column == COL_LAYER:
+            return self._layer_names.get(row[COL_LAYER], "")
+        if column == COL_VALUE:
+            return row[COL_VALUE] or 0.0
+        if column == COL_ID:
+            return row[COL_ID]
+        return row[column] or ""
+
+    def _sort_rows(self):
+        if self._sort_column is not None:
+            self._rows.sort(key=self._sort_key, reverse=self._sort_descending)
+        self._reindex()
+
+    # --- Updates ---
+    def set_items(self, items):
+        """Replace all rows with the given measurement items (one model reset)."""
+        self.beginResetModel()
+        self._rows = [self._row(item) for item in items if item.db_id is not None]
+        self._sort_rows()
+        self._subtotals = {}
+        for row in self._rows:
+            self._add_to_subtotals(row, 1)
+        self.endResetModel()
+        self.subtotals_changed.emit()
+
+    def add_item(self, item):
+        if item.db_id is None or item.db_id in self._row_of_id:
+            return
+        row = self._row(item)
+        position = len(self._rows)
+        if self._sort_column is not None:
+            key = self._sort_key(row)
+            if self._sort_descending: # bisect needs ascending keys; find the end of the run of keys >= key
+                position = self._descending_position(key)
+            else:
+                position = bisect.bisect_right(self._rows, key, key=self._sort_key)
+        self.beginInsertRows(QModelIndex(), position, position)
+        self._rows.insert(position, row)
+        if position == len(self._rows) - 1:
+            self._row_of_id[row[COL_ID]] = position
+        else:
+            self._reindex()
+        self.endInsertRows()
+        self._add_to_subtotals(row, 1)
+        self.subtotals_changed.emit()
+
+    def add_items(self, items):
+        """Append many items at once, e.g. a chunk of a page being loaded."""
+        rows = [self._row(item) for item in items if item.db_id is not None and item.db_id not in self._row_of_id]
+        if not rows:
+            return
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self._rows.extend(rows)
+        for position, row in enumerate(rows, first):
+            self._row_of_id[row[COL_ID]] = position
+            self._add_to_subtotals(row, 1)
+        self.endInsertRows()
+        if self._sort_column is not None:
+            self.sort(self._sort_column, Qt.SortOrder.DescendingOrder if self._sort_descending else Qt.SortOrder.AscendingOrder)
+        self.subtotals_changed.emit()
+
+    def _descending_position(self, key):
+        low, high = 0, len(self._rows)
+        while low < high:
+            middle = (low + high) // 2
+            if self._sort_key(self._rows[middle]) >= key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def remove_ids(self, db_ids):
+        positions = sorted((self._row_of_id[i] for i in db_ids if i in self._row_of_id), reverse=True)
+        if not positions:
+            return
+        # Remove contiguous runs with one notification each
+        run_end = run_start = positions[0]
+        for position in positions[1:] + [None]:
+            if position is not None and position == run_start - 1:
+                run_start = position
+                continue
+            self.beginRemoveRows(QModelIndex(), run_start, run_end)
+            for row in self._rows[run_start:run_end + 1]:
+                self._add_to_subtotals(row, -1)
+            del self._rows[run_start:run_end + 1]
+            self.endRemoveRows()
+            run_end = run_start = position
+        self._reindex()
+        self.subtotals_changed.emit()
+
+    def update_values(self, values_by_id):
+        """Set new (value, unit) pairs for rows by ID, e.g. after the scale changed."""
+        changed = []
+        for db_id, (value, unit) in values_by_id.items():
+            position = self._row_of_id.get(db_id)
+            if position is None:
+                continue
+            row = self._rows[position]
+            self._add_to_subtotals(row, -1)
+            row[COL_VALUE], row[COL_UNIT] = value, unit
+            self._add_to_subtotals(row, 1)
+            changed.append(position)
+        if changed:
+            self.dataChanged.emit(self.index(min(changed), COL_VALUE), self.index(max(changed), COL_UNIT))
+            self.subtotals_changed.emit()
+
+    def set_layer_names(self, layer_names):
+        self._layer_names = dict(layer_names)
+        if self._sort_column == COL_LAYER:
+            self.sort(self._sort_column, Qt.SortOrder.DescendingOrder if self._sort_descending else Qt.SortOrder.AscendingOrder)
+        elif self._rows:
+            self.dataChanged.emit(self.index(0, COL_LAYER), self.index(len(self._rows) - 1, COL_LAYER))
+        self.subtotals_changed.emit()
+
+    def clear(self):
+        self.set_items([])
+
+    # --- Subtotals ---
+    def subtotals(self):
+        """Per-layer subtotals as a sorted list of (layer name, unit, count, total)."""
+        rows = [(self._layer_names.get(layer_id, f"Layer {layer_id}"), unit, count, total)
+                for (layer_id, unit), (count, total) in self._subtotals.items() if count]
+        return sorted(rows, key=lambda r: (r[0], r[1] or ''))
+
+    def _add_to_subtotals(self, row, sign):
+        entry = self._subtotals.setdefault((row[COL_LAYER], row[COL_UNIT]), [0, 0.0])
+        entry[0] += sign
+        entry[1] += sign * (row[COL_VALUE] or 0.0)
+
+    @staticmethod
+    def _row(item):
+        return [item.db_id, item.item_type, item.layer_id, item.value, item.unit]
+
+    def _reindex(self):
+        self._row_of_id = {row[COL_ID]: position for position, row in enumerate(self._rows)}
+
+
+class SubtotalsModel(QAbstractTableModel):
+    """Per-layer subtotals of a ResultsModel (a handful of rows, rebuilt when they change)."""
+    HEADERS = ["Layer", "Unit", "Count", "Total"]
+
+    def __init__(self, results_model, parent=None):
+        super().__init__(parent)
+        self._results_model = results_model
+        self._rows = []
+        results_model.subtotals_changed.connect(self.refresh)
+
+    def refresh(self):
+        self.beginResetModel()
+        self._rows = self._results_model.subtotals()
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        value = self._rows[index.row()][index.column()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return f"{value:.2f}" if index.column() == 3 else value
+        if role == Qt.ItemDataRole.TextAlignmentRole and index.column() >= 2:
+            return int(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+        return None
@@ -0,0 +1,182 @@
+# RoomDetector.py (One-click area takeoff: the enclosed region around a point of a page raster)
+import numpy as np
+
+from GeometryKernel import simplify
+
+
+ROOM_DPI = 75            # Pages are analysed at this resolution
+INK_THRESHOLD = 0.8      # Pixels darker than this (0 black .. 1 white) belong to the drawing
+GAP_CLOSE_PX = 2         # Lines are thickened by this much while filling, so dashes and small gaps do not leak
+MAX_ROOM_FRACTION = 0.5  # A region covering more of the page than this has leaked out of the room
+SIMPLIFY_PX = 1.0        # Douglas-Peucker tolerance for the outline, in raster pixels
+
+
+def dilate(mask, radius):
+    """Grow the True pixels of a boolean array by `radius` (square neighbourhood, separable)."""
+    grown = mask.copy()
+    for _ in range(radius):
+        grown[1:, :] |= mask[:-1, :]
+        grown[:-1, :] |= mask[1:, :]
+        mask = grown.copy()
+    for _ in range(radius):
+        grown[:, 1:] |= mask[:, :-1]
+        grown[:, :-1] |= mask[:, 1:]
+        mask = grown.copy()
+    return grown
+
+
+class Runs:
+    """Horizontal runs of True pixels of a boolean array, found with one vectorized pass.
+
+    Runs are ordered by row, then column; `ends` are exclusive. A flood
+    fill then walks from run to overlapping run instead of pixel to
+    pixel, so its cost follows the number of runs in the region, not its
+    area.
+    """
+    def __init__(self, mask):
+        self.height, self.width = mask.shape
+        padded = np.zeros((self.height, self.width + 2), dtype=np.int8)
+        padded[:, 1:-1] = mask
+        changes = np.diff(padded, axis=1)
+        start_rows, starts = np.nonzero(changes == 1)
+        _, ends = np.nonzero(changes == -1)
+        self.rows, self.starts, self.ends = start_rows, starts, ends
+        self.row_first = np.searchsorted(start_rows, np.arange(self.height + 1)) # Runs of row r: row_first[r]:row_first[r + 1]
+
+    def run_at(self, row, col):
+        """Index of the run containing the pixel, or None."""
+        first, last = self.row_first[row], self.row_first[row + 1]
+        index = first + int(np.searchsorted(self.starts[first:last], col, 'right')) - 1
+        if index >= first and self.ends[index] > col:
+            return index
+        return None
+
+    def flood_fill(self, row, col):
+        """Indexes of the runs 4-connected to the pixel's run (empty if the pixel is not set)."""
+        seed = self.run_at(row, col)
+        if seed is None:
+            return np.empty(0, dtype=np.int64)
+        visited = np.zeros(len(self.starts), dtype=bool)
+        visited[seed] = True
+        stack = [seed]
+        rows, starts, ends, row_first = self.rows, self.starts, self.ends, self.row_first
+        while stack:
+            index = stack.pop()
+            row, start, end = rows[index], starts[index], ends[index]
+            for neighbour in (row - 1, row + 1):
+                if not 0 <= neighbour < self.height:
+                    continue
+                first, last = row_first[neighbour], row_first[neighbour + 1]
+                # Overlapping runs: ending after our start and starting before our end
+                low = first + int(np.searchsorted(ends[first:last], start, 'right'))
+                high = first + int(np.searchsorted(starts[first:last], end, 'left'))
+                for other in range(low, high):
+                    if not visited[other]:
+                        visited[other] = True
+                        stack.append(other)
+        return np.flatnonzero(visited)
+
+    def to_mask(self, indexes, bounds):
+        """Boolean mask of the given runs, cropped to bounds (row0, col0, row1, col1), exclusive ends."""
+        row0, col0, row1, col1 = bounds
+        marks = np.zeros((row1 - row0, col1 - col0 + 1), dtype=np.int32)
+        rows = self.rows[indexes] - row0
+        np.add.at(marks, (rows, self.starts[indexes] - col0), 1)
+        np.add.at(marks, (rows, self.ends[indexes] - col0), -1)
+        return np.cumsum(marks, axis=1)[:, :-1] > 0
+
+
+def fill_holes(region):
+    """The region plus everything it encloses (text, symbols, furniture inside a room)."""
+    padded = np.zeros((region.shape[0] + 2, region.shape[1] + 2), dtype=bool)
+    padded[1:-1, 1:-1] = region
+    outside = Runs(~padded)
+    reached = outside.flood_fill(0, 0)
+    outside_mask = outside.to_mask(reached, (0, 0, padded.shape[0], padded.shape[1]))
+    return ~outside_mask[1:-1, 1:-1]
+
+
+def trace_outline(region):
+    """Outer boundary of a hole-free region as a closed list of pixel-corner points (x, y).
+
+    The boundary is the chain of pixel edges between region and
+    background, oriented with the region on the same side; when a
+    region touches itself at a corner the chain splits and the longest
+    loop is returned.
+    """
+    padded = np.zeros((region.shape[0] + 2, region.shape[1] + 2), dtype=bool)
+    padded[1:-1, 1:-1] = region
+    inner = padded[1:-1, 1:-1]
+    edges = {}
+    # Top, right, bottom and left edges of region pixels facing the background, going clockwise
+    for neighbour, (sx, sy, ex, ey) in (
+            (padded[:-2, 1:-1], (0, 0, 1, 0)),
+            (padded[1:-1, 2:], (1, 0, 1, 1)),
+            (padded[2:, 1:-1], (1, 1, 0, 1)),
+            (padded[1:-1, :-2], (0, 1, 0, 0))):
+        ys, xs = np.nonzero(inner & ~neighbour)
+        for x, y in zip(xs.tolist(), ys.tolist()):
+            edges.setdefault((x + sx, y + sy), []).append((x + ex, y + ey))
+
+    best = []
+    while edges:
+        start = next(iter(edges))
+        loop = [start]
+        point = start
+        while True:
+            targets = edges.get(point)
+            if not targets:
+                break
+            following = targets.pop()
+            if not targets:
+                del edges[point]
+            if following == start:
+                break
+            loop.append(following)
+            point = following
+        if len(loop) > len(best):
+            best = loop
+    return best
+
+
+def detect_room(raster, x, y):
+    """Outline of the enclosed region around raster pixel (x, y) as an (N, 2) array in raster pixels.
+
+    `raster` is a grayscale page (0 black .. 1 white). The drawing is
+    thresholded and its lines thickened by GAP_CLOSE_PX, the free space
+    around the point is flood-filled, grown back to the line faces, its
+    holes are filled and the boundary is traced and simplified. Raises
+    ValueError when the point is on a line or the region is not closed.
+    """
+    height, width = raster.shape
+    col, row = int(x), int(y)
+    if not (0 <= row < height and 0 <= col < width):
+        raise ValueError("The point is outside the page.")
+    ink = raster < INK_THRESHOLD
+    free = Runs(~dilate(ink, GAP_CLOSE_PX))
+    indexes = free.flood_fill(row, col)
+    if not len(indexes):
+        raise ValueError("Click inside a room, not on a line.")
+
+    rows = free.rows[indexes]
+    row0, row1 = int(rows.min()), int(rows.max()) + 1
+    col0, col1 = int(free.starts[indexes].min()), int(free.ends[indexes].max())
+    if row0 == 0 or col0 == 0 or row1 == height or col1 == width:
+        raise ValueError("The region around the point is not closed (it reaches the page edge).")
+    pixel_count = int((free.ends[indexes] - free.starts[indexes]).sum())
+    if pixel_count > MAX_ROOM_FRACTION * height * width:
+        raise ValueError("The region around the point is not closed (check for open doors or gaps).")
+
+    # Grow the fill back to the faces of the lines it was kept away from
+    pad = GAP_CLOSE_PX
+    row0, col0 = max(row0 - pad, 0), max(col0 - pad, 0)
+    row1, col1 = min(row1 + pad, height), min(col1 + pad, width)
+    region = free.to_mask(indexes, (row0, col0, row1, col1))
+    region = dilate(region, pad) & ~ink[row0:row1, col0:col1]
+    region = fill_holes(region)
+
+    outline = np.array(trace_outline(region), dtype=np.float64).reshape(-1, 2)
+    if len(outline) < 3:
+        raise ValueError("No room outline found around the point.")
+    outline += (col0, row0)
+    return simplify(outline, SIMPLIFY_PX, closed=True)
@@ -0,0 +1,188 @@
+# SnapIndex.py (Snap points from the vector content of PDF pages)
+import numpy as np
+
+
+# Feature kinds, in order of preference when several coincide
+SNAP_ENDPOINT = 0
+SNAP_INTERSECTION = 1
+SNAP_MIDPOINT = 2
+SNAP_KIND_NAMES = {SNAP_ENDPOINT: "Endpoint", SNAP_INTERSECTION: "Intersection", SNAP_MIDPOINT: "Midpoint"}
+
+CELL_SIZE = 32.0          # Grid cell edge in scene pixels, for both lookups and intersection search
+MERGE_DISTANCE = 0.5      # Features closer than this (scene pixels) are merged
+MAX_PAIRS_PER_BATCH = 2_000_000 # Bounds the memory used by the intersection search
+
+
+def drawing_segments(drawings, origin=(0.0, 0.0), zoom=1.0):
+    """Straight segments of PyMuPDF `page.get_drawings()` output, in scene pixels.
+
+    Returns (segments, curve_ends): segments is an (N, 4) array of
+    x1, y1, x2, y2 from lines, rectangles and quads; curve_ends is an
+    (M, 2) array of Bezier curve end points, which are snappable although
+    the curves themselves are not intersected.
+    """
+    segments, curve_ends = [], []
+    for path in drawings:
+        for item in path['items']:
+            op = item[0]
+            if op == 'l':
+                segments.append((item[1].x, item[1].y, item[2].x, item[2].y))
+            elif op == 'c':
+                curve_ends.append((item[1].x, item[1].y))
+                curve_ends.append((item[4].x, item[4].y))
+            elif op == 're':
+                r = item[1]
+                corners = [(r.x0, r.y0), (r.x1, r.y0), (r.x1, r.y1), (r.x0, r.y1)]
+                segments.extend(corners[i] + corners[(i + 1) % 4] for i in range(4))
+            elif op == 'qu':
+                q = item[1]
+                corners = [(q.ul.x, q.ul.y), (q.ur.x, q.ur.y), (q.lr.x, q.lr.y), (q.ll.x, q.ll.y)]
+                segments.extend(corners[i] + corners[(i + 1) % 4] for i in range(4))
+    ox, oy = origin
+    segments = (np.array(segments, dtype=np.float64).reshape(-1, 4) - (ox, oy, ox, oy)) * zoom
+    curve_ends = (np.array(curve_ends, dtype=np.float64).reshape(-1, 2) - (ox, oy)) * zoom
+    return segments, curve_ends
+
+
+def segment_intersections(segments, cell_size=CELL_SIZE):
+    """Crossing points of segments, found by testing only segments that share a grid cell.
+
+    Each segment is entered in every cell its bounding box covers; a
+    crossing is kept only by the cell that contains it, so pairs seen in
+    several cells are not reported twice. Returns an (K, 2) array.
+    """
+    if len(segments) < 2:
+        return np.empty((0, 2))
+    x_min = np.minimum(segments[:, 0], segments[:, 2])
+    x_max = np.maximum(segments[:, 0], segments[:, 2])
+    y_min = np.minimum(segments[:, 1], segments[:, 3])
+    y_max = np.maximum(segments[:, 1], segments[:, 3])
+    cx0, cx1 = np.floor(x_min / cell_size).astype(np.int64), np.floor(x_max / cell_size).astype(np.int64)
+    cy0, cy1 = np.floor(y_min / cell_size).astype(np.int64), np.floor(y_max / cell_size).astype(np.int64)
+    widths = cx1 - cx0 + 1
+    cell_counts = widths * (cy1 - cy0 + 1)
+
+    # Expand every segment into the cells of its bounding box
+    seg_ids = np.repeat(np.arange(len(segments)), cell_counts)
+    first = np.repeat(np.cumsum(cell_counts) - cell_counts, cell_counts)
+    offsets = np.arange(len(seg_ids)) - first
+    cell_x = cx0[seg_ids] + offsets % widths[seg_ids]
+    cell_y = cy0[seg_ids] + offsets // widths[seg_ids]
+    order = np.lexsort((cell_x, cell_y))
+    seg_ids, cell_x, cell_y = seg_ids[order], cell_x[order], cell_y[order]
+
+    # Runs of equal cells; only cells holding two or more segments can contain a crossing
+    boundaries = np.flatnonzero((np.diff(cell_x) != 0) | (np.diff(cell_y) != 0)) + 1
+    starts = np.concatenate(([0], boundaries))
+    sizes = np.diff(np.concatenate((starts, [len(seg_ids)])))
+
+    found = []
+    pairs_a, pairs_b, pair_cells, pending = [], [], [], 0
+    pair_cache = {}
+    for start, size in zip(starts[sizes > 1], sizes[sizes > 1]):
+        if size not in pair_cache:
+            pair_cache[size] = np.triu_indices(size, 1)
+        i, j = pair_cache[size]
+        pairs_a.append(seg_ids[start + i])
+        pairs_b.append(seg_ids[start + j])
+        pair_cells.append(np.full(len(i), start))
+        pending += len(i)
+        if pending >= MAX_PAIRS_PER_BATCH:
+            found.append(_crossings(segments, pairs_a, pairs_b, pair_cells, cell_x, cell_y, cell_size))
+            pairs_a, pairs_b, pair_cells, pending = [], [], [], 0
+    if pending:
+        found.append(_crossings(segments, pairs_a, pairs_b, pair_cells, cell_x, cell_y, cell_size))
+    return np.concatenate(found) if found else np.empty((0, 2))
+
+
+def _crossings(segments, pairs_a, pairs_b, pair_cells, cell_x, cell_y, cell_size):
+    a, b = segments[np.concatenate(pairs_a)], segments[np.concatenate(pairs_b)]
+    cells = np.concatenate(pair_cells)
+    rx, ry = a[:, 2] - a[:, 0], a[:, 3] - a[:, 1]
+    sx, sy = b[:, 2] - b[:, 0], b[:, 3] - b[:, 1]
+    qx, qy = b[:, 0] - a[:, 0], b[:, 1] - a[:, 1]
+    denom = rx * sy - ry * sx
+    parallel = np.abs(denom) < 1e-12
+    denom[parallel] = 1.0
+    t = (qx * sy - qy * sx) / denom
+    u = (qx * ry - qy * rx) / denom
+    hit = ~parallel & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+    x = a[hit, 0] + t[hit] * rx[hit]
+    y = a[hit, 1] + t[hit] * ry[hit]
+    cells = cells[hit]
+    # Keep each crossing in the one cell that contains it
+    own = (np.floor(x / cell_size) == cell_x[cells]) & (np.floor(y / cell_size) == cell_y[cells])
+    return np.column_stack((x[own], y[own]))
+
+
+def build_features(segments, curve_ends=None):
+    """Snap features (x, y, kind) of a page as an (N, 3) float64 array.
+
+    Endpoints, midpoints and crossings of the segments plus the curve end
+    points; coincident features are merged, keeping the preferred kind.
+    """
+    parts = [
+        np.column_stack((segments[:, 0:2], np.full(len(segments), SNAP_ENDPOINT))),
+        np.column_stack((segments[:, 2:4], np.full(len(segments), SNAP_ENDPOINT))),
+        np.column_stack(((segments[:, 0:2] + segments[:, 2:4]) / 2, np.full(len(segments), SNAP_MIDPOINT))),
+    ]
+    if curve_ends is not None and len(curve_ends):
+        parts.append(np.column_stack((curve_ends, np.full(len(curve_ends), SNAP_ENDPOINT))))
+    crossings = segment_intersections(segments)
+    parts.append(np.column_stack((crossings, np.full(len(crossings), SNAP_INTERSECTION))))
+    features = np.concatenate(parts)
+
+    # Sort by kind first so the merge keeps the preferred kind of each spot
+    features = features[np.argsort(features[:, 2], kind='stable')]
+    spots = np.round(features[:, :2] / MERGE_DISTANCE).astype(np.int64)
+    _, keep = np.unique(spots, axis=0, return_index=True)
+    return features[np.sort(keep)]
+
+
+class SnapIndex:
+    """Uniform grid over a page's snap features for nearest-feature lookups.
+
+    Features are sorted by grid cell (row-major), so the cells of one grid
+    row inside the search box form a contiguous slice found by binary
+    search. A lookup costs a couple of searches per row plus a distance
+    check over the few candidates, well under a millisecond.
+    """
+    def __init__(self, features, cell_size=CELL_SIZE):
+        features = np.asarray(features, dtype=np.float64).reshape(-1, 3)
+        self.cell_size = cell_size
+        cells_x = np.floor(features[:, 0] / cell_size).astype(np.int64)
+        cells_y = np.floor(features[:, 1] / cell_size).astype(np.int64)
+        self._x_origin = int(cells_x.min()) if len(features) else 0
+        self._columns = int(cells_x.max()) - self._x_origin + 1 if len(features) else 1
+        keys = cells_y * self._columns + (cells_x - self._x_origin)
+        order = np.argsort(keys, kind='stable')
+        self._keys = keys[order]
+        self.features = features[order]
+        self._xs = self.features[:, 0].copy()
+        self._ys = self.features[:, 1].copy()
+
+    def __len__(self):
+        return len(self.features)
+
+    def nearest(self, x, y, tolerance):
+        """Closest feature within `tolerance` scene pixels as (x, y, kind), or None."""
+        if not len(self.features):
+            return None
+        size = self.cell_size
+        col0 = max(int(np.floor((x - tolerance) / size)) - self._x_origin, 0)
+        col1 = min(int(np.floor((x + tolerance) / size)) - self._x_origin, self._columns - 1)
+        if col0 > col1:
+            return None
+        rows = np.arange(int(np.floor((y - tolerance) / size)), int(np.floor((y + tolerance) / size)) + 1)
+        lo = np.searchsorted(self._keys, rows * self._columns + col0, 'left')
+        hi = np.searchsorted(self._keys, rows * self._columns + col1, 'right')
+        spans = [(a, b) for a, b in zip(lo.tolist(), hi.tolist()) if b > a]
+        if not spans:
+            return None
+        candidates = np.concatenate([np.arange(a, b) for a, b in spans]) if len(spans) > 1 else np.arange(*spans[0])
+        d2 = (self._xs[candidates] - x) ** 2 + (self._ys[candidates] - y) ** 2
+        best = int(np.argmin(d2))
+        if d2[best] > tolerance * tolerance:
+            return None
+        fx, fy, kind = self.features[candidates[best]]
+        return float(fx), float(fy), int(kind)
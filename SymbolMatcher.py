@@ -0,0 +1,184 @@
+# SymbolMatcher.py (Finding every copy of a symbol on PDF pages by template matching)
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz # PyMuPDF
+import numpy as np
+
+from DocumentPool import DocumentPool
+
+
+MATCH_DPI = 75               # Pages are matched at this resolution (half the scene resolution)
+DEFAULT_THRESHOLD = 0.7      # Correlation needed to count as a match (exact copies of thin lines score ~0.75+)
+FFT_SIZE = 1024              # Edge of the FFT blocks the page is correlated in
+MIN_TEMPLATE_PX = 4          # Smallest template edge, in pixels at the match resolution
+MIN_WINDOW_STD = 0.01        # Windows flatter than this (blank paper) never match
+MAX_CANDIDATES = 100_000     # Bounds memory when a template matches almost everywhere
+
+
+def render_gray(page, dpi, clip=None):
+    """Render a PyMuPDF page (or the `clip` rect of it, in PDF points) as a float32 array in 0..1."""
+    zoom = dpi / 72
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, clip=clip, alpha=False)
+    samples = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+    return samples.astype(np.float32) / 255.0
+
+
+def template_from_raster(raster, rect, base_dpi, dpi=MATCH_DPI):
+    """Grayscale template of the symbol inside `rect` (x0, y0, x1, y1 in scene pixels) of a page raster.
+
+    `raster` is the page rendered by render_gray at `dpi`. Raises
+    ValueError when the box is too small or holds no drawing.
+    """
+    to_raster = dpi / base_dpi
+    height, width = raster.shape
+    x0, x1 = (min(max(int(round(v * to_raster)), 0), width) for v in (rect[0], rect[2]))
+    y0, y1 = (min(max(int(round(v * to_raster)), 0), height) for v in (rect[1], rect[3]))
+    if x1 <= x0 or y1 <= y0:
+        raise ValueError("The box is outside the page.")
+    template = raster[y0:y1, x0:x1].copy()
+    if min(template.shape) < MIN_TEMPLATE_PX:
+        raise ValueError("The box is too small to match; draw it around the whole symbol.")
+    if template.std() < MIN_WINDOW_STD:
+        raise ValueError("The box holds no drawing to match.")
+    return template
+
+
+def normalized_cross_correlation(image, template, fft_size=FFT_SIZE):
+    """Normalized cross-correlation of `template` at every position it fits in `image`.
+
+    The correlation is computed with real FFTs over overlapping blocks of
+    `fft_size` (the template spectrum is computed once), and each window's
+    mean and energy come from integral images of the block, so the cost is
+    O(N log B) for an N-pixel page. Returns a float32 array of shape
+    (H - h + 1, W - w + 1) with scores in -1..1; windows flatter than
+    MIN_WINDOW_STD score 0.
+    """
+    h, w = template.shape
+    height, width = image.shape
+    if h > height or w > width:
+        return np.zeros((0, 0), dtype=np.float32)
+    fft_size = max(fft_size, 1 << int(np.ceil(np.log2(2 * max(h, w)))))
+    n = h * w
+    centred = template.astype(np.float64) - template.mean()
+    template_norm = np.sqrt((centred ** 2).sum())
+    # Correlation is convolution with the flipped template; wrap-around only reaches the first h-1 rows/w-1 columns
+    template_spectrum = np.fft.rfft2(centred[::-1, ::-1], s=(fft_size, fft_size))
+    step_y, step_x = fft_size - h + 1, fft_size - w + 1
+    scores = np.zeros((height - h + 1, width - w + 1), dtype=np.float32)
+    min_energy = n * MIN_WINDOW_STD ** 2
+
+    for y in range(0, height - h + 1, step_y):
+        for x in range(0, width - w + 1, step_x):
+            block = image[y:y + fft_size, x:x + fft_size].astype(np.float64)
+            out_h, out_w = min(step_y, height - h + 1 - y), min(step_x, width - w + 1 - x)
+            products = np.fft.irfft2(np.fft.rfft2(block, s=(fft_size, fft_size)) * template_spectrum,
+                                     s=(fft_size, fft_size))[h - 1:h - 1 + out_h, w - 1:w - 1 + out_w]
+            # Window sums of the block and of its squares from integral images
+            sums = _window_sums(block, h, w)[:out_h, :out_w]
+            squares = _window_sums(block * block, h, w)[:out_h, :out_w]
+            energy = squares - sums * sums / n # n * variance of each window
+            flat = energy < min_energy
+            energy[flat] = 1.0
+            block_scores = products / (np.sqrt(energy) * template_norm)
+            block_scores[flat] = 0.0
+            scores[y:y + out_h, x:x + out_w] = block_scores
+    return scores
+
+
+def _window_sums(values, h, w):
+    """Sums of every h x w window of `values`."""
+    integral = np.zeros((values.shape[0] + 1, values.shape[1] + 1))
+    np.cumsum(np.cumsum(values, axis=0), axis=1, out=integral[1:, 1:])
+    return integral[h:, w:] - integral[:-h, w:] - integral[h:, :-w] + integral[:-h, :-w]
+
+
+def find_peaks(scores, threshold, template_shape):
+    """Best-scoring positions at least half a template apart, as [(row, col, score)].
+
+    Candidates above `threshold` are taken best first and kept unless an
+    already kept match lies within half the template size; kept matches
+    are filed in a grid of template-sized cells, so each test looks at
+    nine cells only.
+    """
+    rows, cols = np.nonzero(scores >= threshold)
+    if not len(rows):
+        return []
+    values = scores[rows, cols]
+    if len(values) > MAX_CANDIDATES:
+        best = np.argpartition(values, -MAX_CANDIDATES)[-MAX_CANDIDATES:]
+        rows, cols, values = rows[best], cols[best], values[best]
+    order = np.argsort(values)[::-1]
+    h, w = template_shape
+    min_dy, min_dx = h / 2, w / 2
+    cells = {}
+    peaks = []
+    for row, col, score in zip(rows[order].tolist(), cols[order].tolist(), values[order].tolist()):
+        cell_y, cell_x = row // h, col // w
+        near = False
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                for other_row, other_col in cells.get((cell_y + dy, cell_x + dx), ()):
+                    if abs(other_row - row) < min_dy and abs(other_col - col) < min_dx:
+                        near = True
+                        break
+                if near:
+                    break
+            if near:
+                break
+        if not near:
+            cells.setdefault((cell_y, cell_x), []).append((row, col))
+            peaks.append((row, col, score))
+    return peaks
+
+
+_documents = DocumentPool() # Per worker process: documents reused by the tasks of a search
+
+def find_matches_on_page(pdf_path, page_index, template, threshold, base_dpi, dpi=MATCH_DPI):
+    """Matches of `template` on one page, as (page_index, [(x, y, score)]) with symbol centres in scene pixels.
+
+    Runs in a worker process; the page is rendered there, so only the
+    template and the match list cross the process boundary.
+    """
+    with _documents.document(pdf_path) as doc:
+        image = render_gray(doc.load_page(page_index), dpi)
+    scores = normalized_cross_correlation(image, template)
+    h, w = template.shape
+    to_scene = base_dpi / dpi
+    matches = [((col + w / 2) * to_scene, (row + h / 2) * to_scene, score)
+               for row, col, score in find_peaks(scores, threshold, template.shape)]
+    return page_index, matches
+
+
+class SymbolSearch:
+    """Template matching over a set of pages on a process pool, one page per task.
+
+    `pages` are (sheet, pdf_path, page_index) triples, so a search can run
+    across the documents of a project; `sheets` maps each future back to
+    its sheet. Worker processes are spawned (not forked, the GUI process
+    has threads running). `on_page_done(future)` is called from a pool
+    thread as each page finishes; the future's result is
+    find_matches_on_page's.
+    """
+    def __init__(self, pages, template, base_dpi, threshold=DEFAULT_THRESHOLD, on_page_done=None, workers=None):
+        self.page_count = len(pages)
+        self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        self.futures = []
+        self.sheets = {} # Future -> sheet
+        # Pages of the same document next to each other, so workers reuse their open documents
+        for sheet, pdf_path, page_index in sorted(pages, key=lambda page: (page[1], page[2])):
+            future = self._executor.submit(find_matches_on_page, pdf_path, page_index, template, threshold, base_dpi)
+            self.sheets[future] = sheet
+            if on_page_done:
+                future.add_done_callback(on_page_done)
+            self.futures.append(future)
+
+    def done(self):
+        return all(future.done() for future in self.futures)
+
+    def cancel(self):
+        """Drop the pages not started yet; pages in progress finish in the background."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
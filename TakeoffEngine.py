@@ -0,0 +1,100 @@
+# TakeoffEngine.py (GUI-free quantity takeoff over .qst project files)
+import contextlib
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from ProjectManager import ProjectManager
+
+
+REPORT_FIELDS = ['project', 'name', 'group', 'key', 'unit', 'count', 'total', 'error']
+
+
+def find_projects(paths):
+    """Expand files and directories (searched recursively) into a sorted list of .qst files."""
+    projects = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                projects.extend(os.path.join(root, f) for f in files if f.lower().endswith('.qst'))
+        else:
+            projects.append(path)
+    return sorted(projects)
+
+
+def compute_project_totals(project_path):
+    """Per-layer and per-type totals of one project.
+
+    Returns a dict with the project name and two lists of totals
+    ({'key', 'unit', 'count', 'total'}); 'error' is set instead if the
+    file could not be read. The file is opened read-only.
+    """
+    result = {'project': project_path, 'name': None, 'by_layer': [], 'by_type': [], 'error': None}
+    # ProjectManager reports on stdout, which may be carrying the report itself
+    with contextlib.redirect_stdout(sys.stderr):
+        project_manager = None
+        try:
+            project_manager = ProjectManager(project_path, read_only=True)
+            metadata = project_manager.load_project_metadata() or {}
+            result['name'] = metadata.get('name') or os.path.splitext(os.path.basename(project_path))[0]
+            layer_names = {layer['id']: layer['name'] for layer in project_manager.load_layers()}
+            totals = project_manager.load_item_totals()
+        except Exception as e:
+            result['error'] = str(e)
+            return result
+        finally:
+            if project_manager:
+                project_manager.close()
+
+    by_layer, by_type = {}, {}
+    for row in totals:
+        layer_key = (layer_names.get(row['layer_id'], f"Layer {row['layer_id']}"), row['unit'])
+        for groups, key in ((by_layer, layer_key), (by_type, (row['type'], row['unit']))):
+            group = groups.setdefault(key, {'key': key[0], 'unit': key[1], 'count': 0, 'total': 0.0})
+            group['count'] += row['count']
+            group['total'] += row['total']
+    result['by_layer'] = sorted(by_layer.values(), key=lambda g: (g['key'], g['unit'] or ''))
+    result['by_type'] = sorted(by_type.values(), key=lambda g: (g['key'] or '', g['unit'] or ''))
+    return result
+
+
+def report_rows(result):
+    """Flatten a compute_project_totals result into report rows (one per total)."""
+    if result['error']:
+        yield {'project': result['project'], 'name': result['name'], 'error': result['error']}
+        return
+    for group_name in ('by_layer', 'by_type'):
+        for total in result[group_name]:
+            yield {'project': result['project'], 'name': result['name'], 'group': group_name[3:],
+                   'key': total['key'], 'unit': total['unit'], 'count': total['count'], 'total': total['total']}
+
+
+def iter_totals(project_paths, workers=None):
+    """Compute totals for many projects across processes, yielding results as they finish."""
+    if workers == 1 or len(project_paths) <= 1:
+        for path in project_paths:
+            yield compute_project_totals(path)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(compute_project_totals, path) for path in project_paths]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def write_report(results, out, fmt='csv'):
+    """Stream results to `out` as CSV rows or JSON lines (one object per project). Returns the project count."""
+    count = 0
+    writer = None
+    if fmt == 'csv':
+        writer = csv.DictWriter(out, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+    for result in results:
+        if writer:
+            writer.writerows(report_rows(result))
+        else:
+            out.write(json.dumps(result) + "\n")
+        out.flush() # Make partial reports usable while the batch runs
+        count += 1
+    return count
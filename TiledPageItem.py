@@ -0,0 +1,103 @@
+# TiledPageItem.py (Zoom-dependent tiled background for PDF pages)
+import math
+from PyQt6.QtWidgets import QGraphicsItem, QStyleOptionGraphicsItem
+from PyQt6.QtGui import QPainter
+from PyQt6.QtCore import Qt, QRectF
+
+
+TILE_SIZE = 512 # Tile edge in device pixels
+MIN_LEVEL = -3  # Level L renders at base_dpi * 2**L, so -3 is 1/8 of base DPI
+MAX_LEVEL = 3   # ...and 3 is 8x base DPI (1200 DPI for a 150 DPI scene)
+
+
+def level_for_scale(scale):
+    """Pick the pyramid level whose resolution is at least the on-screen scale."""
+    if scale <= 0:
+        return 0
+    level = math.ceil(math.log2(scale) - 1e-6)
+    return max(MIN_LEVEL, min(MAX_LEVEL, level))
+
+
+class TiledPageItem(QGraphicsItem):
+    """Background item that draws a PDF page as a pyramid of tiles.
+
+    Only the tiles intersecting the exposed area are requested, at the level
+    that matches the current view transform. Tiles are rendered by the
+    RenderWorker and kept in the shared PixmapCache; tile_ready repaints
+    their area. Until a tile is available the whole-page preview is
+    drawn scaled up, and requested again if it has been evicted from the
+    cache; preview_ready repaints the item. The item covers the page in scene
+    pixels at the source's base DPI, so measurement coordinates do not
+    depend on the zoom.
+    """
+    def __init__(self, page_source, page_index, renderer, cache, parent=None):
+        super().__init__(parent)
+        self.page_source = page_source
+        self.page_index = page_index
+        self.renderer = renderer
+        self.cache = cache # PixmapCache with ('tile', page, level, col, row) and ('preview', page) keys
+        width, height = page_source.page_size(page_index)
+        self._rect = QRectF(0, 0, width, height)
+        self._level = None
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemUsesExtendedStyleOption) # Needed for exposedRect
+        self.setZValue(-1)
+        # The tiles are already cached pixmaps; an item cache would only hold a second copy of them
+        self.setCacheMode(QGraphicsItem.CacheMode.NoCache)
+
+    def boundingRect(self):
+        return self._rect
+
+    def tile_rect(self, level, col, row):
+        """Scene rect covered by a tile, clipped to the page."""
+        size = TILE_SIZE / (2 ** level)
+        return QRectF(col * size, row * size, size, size).intersected(self._rect)
+
+    def visible_tiles(self, level, rect):
+        """Yield (col, row) for the tiles of `level` that intersect `rect`."""
+        rect = rect.intersected(self._rect)
+        if rect.isEmpty():
+            return
+        size = TILE_SIZE / (2 ** level)
+        first_col, last_col = int(rect.left() // size), int(math.ceil(rect.right() / size))
+        first_row, last_row = int(rect.top() // size), int(math.ceil(rect.bottom() / size))
+        for row in range(first_row, last_row):
+            for col in range(first_col, last_col):
+                yield col, row
+
+    def preview_ready(self):
+        self.update()
+
+    def tile_ready(self, level, col, row):
+        if level == self._level: # Otherwise it arrived after a zoom change
+            self.update(self.tile_rect(level, col, row))
+
+    def _draw_preview(self, painter, target):
+        preview = self.cache.get(('preview', self.page_index))
+        if preview is None:
+            # Evicted (or not rendered yet); the worker drops the request if one is already queued
+            self.renderer.request_preview(self.page_index)
+            return
+        sx = preview.width() / self._rect.width()
+        sy = preview.height() / self._rect.height()
+        source = QRectF(target.left() * sx, target.top() * sy, target.width() * sx, target.height() * sy)
+        painter.drawPixmap(target, preview, source)
+
+    def paint(self, painter: QPainter, option: QStyleOptionGraphicsItem, widget=None):
+        scale = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        level = level_for_scale(scale)
+        if level != self._level:
+            # Tiles from other levels stay in the cache until evicted
+            self._level = level
+            self.renderer.set_tile_level(level)
+
+        exposed = option.exposedRect.intersected(self._rect)
+        painter.fillRect(exposed, Qt.GlobalColor.white)
+        dpi = self.page_source.base_dpi * (2 ** level)
+        for col, row in self.visible_tiles(level, exposed):
+            target = self.tile_rect(level, col, row)
+            pixmap = self.cache.get(('tile', self.page_index, level, col, row))
+            if pixmap is not None:
+                painter.drawPixmap(target, pixmap, QRectF(pixmap.rect()))
+            else:
+                self._draw_preview(painter, target)
+                self.renderer.request_tile(self.page_index, level, col, row, dpi, target)
@@ -0,0 +1,488 @@
+# items.py (Measurement graphics items)
+from PyQt6.QtWidgets import QGraphicsLineItem, QGraphicsPolygonItem, QGraphicsEllipseItem, QGraphicsItem, QStyle
+from PyQt6.QtGui import QPen, QColor, QPolygonF, QBrush, QPainter
+from PyQt6.QtCore import Qt, QPointF, QRectF
+from GeometryKernel import simplify
+
+
+STORE_CELL_SIZE = 512 # Grid cell edge (scene pixels) of MeasurementStore's viewport queries
+
+# Level of detail; the level is the painter's zoom in screen pixels per scene pixel
+ANTIALIAS_MIN_LOD = 0.5 # Measurements are drawn without antialiasing below this level
+SIMPLIFY_TOLERANCES = (1.0, 2.0, 4.0, 8.0, 16.0) # Scene pixels; one simplified outline is kept per tolerance
+SIMPLIFY_MIN_POINTS = 16 # Outlines with fewer vertices are always drawn in full
+SIMPLIFY_SCREEN_PX = 0.5 # Largest on-screen error allowed for a simplified outline
+
+COUNT_MARKER_RADIUS = 8 # Scene pixels
+MIN_POINTS = {'linear': 2, 'area': 3, 'count': 1} # Points a stored measurement of each type needs to be shown
+
+
+class MeasurementRecord:
+    """Compact description of one stored measurement; the source of truth for it.
+
+    A graphics item exists only while the measurement is near the visible
+    area (`item` is None otherwise). Points are scene coordinates; an
+    area's `holes` are rings of scene points cut out of it.
+    """
+    __slots__ = ('db_id', 'layer_id', 'page', 'item_type', 'points', 'value', 'unit', 'style', 'holes', 'bounds', 'item')
+
+    def __init__(self, db_id, layer_id, page, item_type, points, value, unit, style=None, holes=None):
+        self.db_id = db_id
+        self.layer_id = layer_id
+        self.page = page
+        self.item_type = item_type
+        self.value = value
+        self.unit = unit
+        self.style = style or {}
+        self.holes = [[(float(x), float(y)) for x, y in ring] for ring in holes or ()]
+        self.item = None
+        self.set_points(points)
+
+    @classmethod
+    def from_row(cls, data):
+        """Build a record from a ProjectManager.load_items row.
+
+        Raises ValueError for a row that cannot be shown: an unknown type
+        or too few points for its type.
+        """
+        if data['type'] not in MIN_POINTS:
+            raise ValueError(f"unknown measurement type {data['type']!r}")
+        if len(data['points']) < MIN_POINTS[data['type']]:
+            raise ValueError(f"{data['type']} measurement with {len(data['points'])} point(s)")
+        return cls(data['id'], data['layer_id'], data['page'], data['type'], data['points'],
+                   data.get('value', 0), data.get('unit', ''), data.get('style'), data.get('holes'))
+
+    def set_points(self, points):
+        self.points = [(float(x), float(y)) for x, y in points]
+        xs = [x for x, _ in self.points] or [0.0]
+        ys = [y for _, y in self.points] or [0.0]
+        pad = COUNT_MARKER_RADIUS if self.item_type == 'count' else 0.0 # A count's marker is drawn around its point
+        self.bounds = (min(xs) - pad, min(ys) - pad, max(xs) + pad, max(ys) + pad)
+
+    def get_data_for_db(self):
+        return {
+            'id': self.db_id,
+            'layer_id': self.layer_id,
+            'page': self.page,
+            'type': self.item_type,
+            'points': self.points,
+            'value': self.value,
+            'unit': self.unit,
+            'style': self.style,
+            'holes': self.holes,
+        }
+
+
+class MeasurementStore:
+    """Records of the current page, with a uniform grid for viewport queries.
+
+    Each record is entered in the grid cells its bounding box covers, so
+    finding the measurements near the visible area touches only a few
+    cells whatever the number of records.
+    """
+    def __init__(self, cell_size=STORE_CELL_SIZE):
+        self.cell_size = cell_size
+        self._records = set()
+        self._cells = {} # (col, row) -> set of records
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(list(self._records))
+
+    def __contains__(self, record):
+        return record in self._records
+
+    def _cell_keys(self, bounds):
+        size = self.cell_size
+        x0, y0, x1, y1 = bounds
+        return [(col, row)
+                for col in range(int(x0 // size), int(x1 // size) + 1)
+                for row in range(int(y0 // size), int(y1 // size) + 1)]
+
+    def add(self, record):
+        self._records.add(record)
+        for key in self._cell_keys(record.bounds):
+            self._cells.setdefault(key, set()).add(record)
+
+    def remove(self, record):
+        self._records.discard(record)
+        for key in self._cell_keys(record.bounds):
+            cell = self._cells.get(key)
+            if cell:
+                cell.discard(record)
+                if not cell:
+                    del self._cells[key]
+
+    def update_points(self, record, points):
+        """Change a record's geometry and re-file it in the grid."""
+        in_store = record in self._records
+        if in_store:
+            self.remove(record)
+        record.set_points(points)
+        if in_store:
+            self.add(record)
+
+    def records_in_rect(self, x0, y0, x1, y1):
+        """Records whose bounding box intersects the rectangle."""
+        found = set()
+        for key in self._cell_keys((x0, y0, x1, y1)):
+            cell = self._cells.get(key)
+            if cell:
+                found.update(cell)
+        return {r for r in found if r.bounds[0] <= x1 and r.bounds[2] >= x0 and r.bounds[1] <= y1 and r.bounds[3] >= y0}
+
+    def by_layer(self, layer_id):
+        return [record for record in self._records if record.layer_id == layer_id]
+
+    def clear(self):
+        self._records = set()
+        self._cells = {}
+
+
+class DirtyTracker:
+    """Collects measurements (records) whose geometry changed since they were last saved."""
+    def __init__(self, on_change=None):
+        self._items = set()
+        self.on_change = on_change # Called when an item becomes dirty (e.g. to mark the window modified)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def mark(self, item):
+        if item not in self._items:
+            self._items.add(item)
+            if self.on_change:
+                self.on_change(item)
+
+    def discard(self, item):
+        self._items.discard(item)
+
+    def take(self):
+        """Return the dirty items and start tracking afresh."""
+        items, self._items = self._items, set()
+        return items
+
+    def clear(self):
+        self._items = set()
+
+
+class LayerRegistry:
+    """Maps each layer ID to the measurement items of that layer on the scene.
+
+    Only measurements near the visible area have items; the others are
+    given their layer's state when their item is created.
+
+    Layer operations (show/hide, recolour, delete) touch only the items
+    of the layer instead of scanning the whole scene.
+    """
+    def __init__(self):
+        self._items_by_layer = {} # layer_id -> set of items
+
+    def __len__(self):
+        return sum(len(items) for items in self._items_by_layer.values())
+
+    def add(self, item):
+        self._items_by_layer.setdefault(item.layer_id, set()).add(item)
+
+    def remove(self, item):
+        items = self._items_by_layer.get(item.layer_id)
+        if items:
+            items.discard(item)
+
+    def items(self, layer_id):
+        return self._items_by_layer.get(layer_id, set())
+
+    def all_items(self):
+        return [item for items in self._items_by_layer.values() for item in items]
+
+    def pop_layer(self, layer_id):
+        """Forget a layer and return its items."""
+        return self._items_by_layer.pop(layer_id, set())
+
+    def set_visible(self, layer_id, visible):
+        for item in self.items(layer_id):
+            item.setVisible(visible)
+
+    def set_color(self, layer_id, color):
+        for item in self.items(layer_id):
+            item.set_color(color)
+
+    def clear(self):
+        self._items_by_layer = {}
+
+
+class MeasurementItemMixin:
+    """Shared behaviour of measurement items: database identity and change tracking.
+
+    Geometry is kept in item coordinates and the item is moved with setPos,
+    so the points written to the database are always mapped to the scene.
+    An item shows a MeasurementRecord and can be rebound to another record
+    of the same type when it is recycled. Item classes provide
+    _init_args, _set_points and scene_points.
+    """
+    tracker = None # DirtyTracker, assigned when the item is put on the scene
+    record = None  # MeasurementRecord shown by this item
+
+    def _init_measurement(self, db_id, layer_id, value, unit, page, item_type):
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsSelectable)
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsMovable) # Basic move
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemSendsGeometryChanges) # Needed for itemChange on moves
+        self.db_id = db_id
+        self.layer_id = layer_id
+        self.value = value
+        self.unit = unit
+        self.page = page
+        self.item_type = item_type
+        self.setData(Qt.ItemDataRole.UserRole + 1, self.db_id) # Store db_id for easy retrieval
+
+    def set_db_id(self, db_id):
+        self.db_id = db_id
+        self.setData(Qt.ItemDataRole.UserRole + 1, db_id)
+
+    def set_color(self, color):
+        pen = self.pen()
+        pen.setColor(QColor(color))
+        self.setPen(pen)
+
+    def mark_dirty(self):
+        if self.tracker is not None and self.record is not None:
+            self.tracker.mark(self.record)
+
+    @classmethod
+    def from_record(cls, record):
+        item = cls(*cls._init_args(record))
+        item.record = record
+        record.item = item
+        return item
+
+    def bind(self, record):
+        """Show another record (of the same type) with this item."""
+        self.record = None # Not dirty: the position is reset below, not moved by the user
+        self.setPos(0, 0)
+        self._set_points([QPointF(x, y) for x, y in record.points])
+        self._set_holes(record.holes)
+        self.set_db_id(record.db_id)
+        self.layer_id, self.value, self.unit, self.page = record.layer_id, record.value, record.unit, record.page
+        self.record = record
+        record.item = self
+
+    def _set_holes(self, rings):
+        pass # Only areas have holes
+
+    def scene_holes(self):
+        return []
+
+    def is_moved(self):
+        return not self.pos().isNull()
+
+    @staticmethod
+    def _level_of_detail(painter, option):
+        """The painter's zoom; antialiasing is switched off when zoomed far out."""
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        if lod < ANTIALIAS_MIN_LOD:
+            painter.setRenderHint(QPainter.RenderHint.Antialiasing, False)
+        return lod
+
+    def itemChange(self, change, value):
+        if change == QGraphicsItem.GraphicsItemChange.ItemPositionHasChanged:
+            self.mark_dirty()
+        return super().itemChange(change, value)
+
+    def get_data_for_db(self):
+        return {
+            'id': self.db_id,
+            'layer_id': self.layer_id,
+            'page': self.page,
+            'type': self.item_type,
+            'points': [(p.x(), p.y()) for p in self.scene_points()],
+            'value': self.value,
+            'unit': self.unit,
+            'style': {'color': self.pen().color().name(), 'width': self.pen().width()}
+        }
+
+
+class LinearMeasurementItem(MeasurementItemMixin, QGraphicsLineItem):
+    def __init__(self, p1, p2, db_id=None, layer_id=None, value=0, unit="", page=0, parent=None):
+        super().__init__(p1.x(), p1.y(), p2.x(), p2.y(), parent)
+        self.setPen(QPen(QColor("green"), 2, Qt.PenStyle.SolidLine)) # Example style
+        self._init_measurement(db_id, layer_id, value, unit, page, "linear")
+
+    @staticmethod
+    def _init_args(record):
+        (x1, y1), (x2, y2) = record.points[:2]
+        return QPointF(x1, y1), QPointF(x2, y2), record.db_id, record.layer_id, record.value, record.unit, record.page
+
+    def _set_points(self, points):
+        self.setLine(points[0].x(), points[0].y(), points[1].x(), points[1].y())
+
+    def paint(self, painter, option, widget=None):
+        self._level_of_detail(painter, option)
+        super().paint(painter, option, widget)
+
+    def scene_points(self):
+        line = self.line()
+        return [self.mapToScene(line.p1()), self.mapToScene(line.p2())]
+
+
+class AreaMeasurementItem(MeasurementItemMixin, QGraphicsPolygonItem):
+    """An area outline, with the outlines of its holes (openings, deductions) drawn inside it."""
+    def __init__(self, points, db_id=None, layer_id=None, value=0, unit="", page=0, holes=None, parent=None):
+        super().__init__(QPolygonF(points), parent)
+        self.setPen(QPen(QColor("purple"), 2))
+        self.setBrush(QBrush(Qt.BrushStyle.NoBrush)) # No fill for measurement outline
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsFocusable) # Needed for delete key?
+        self._init_measurement(db_id, layer_id, value, unit, page, "area")
+        self._update_lod_polygons()
+        self._set_holes(holes)
+
+    @staticmethod
+    def _init_args(record):
+        return ([QPointF(x, y) for x, y in record.points], record.db_id, record.layer_id, record.value, record.unit,
+                record.page, record.holes)
+
+    def _set_holes(self, rings):
+        """Hole rings given in scene points; the item is at its origin when they are set."""
+        self._holes = [QPolygonF([QPointF(x, y) for x, y in ring]) for ring in rings or ()]
+        self.update()
+
+    def _set_points(self, points):
+        self.setPolygon(QPolygonF(points))
+        self._update_lod_polygons()
+
+    def _update_lod_polygons(self):
+        """Precompute the simplified outlines drawn when zoomed out, coarsest last."""
+        self._lod_polygons = [] # (tolerance, QPolygonF)
+        polygon = self.polygon()
+        if polygon.count() < SIMPLIFY_MIN_POINTS:
+            return
+        points = [(p.x(), p.y()) for p in polygon]
+        vertex_count = len(points)
+        for tolerance in SIMPLIFY_TOLERANCES:
+            simplified = simplify(points, tolerance, closed=True)
+            if len(simplified) < vertex_count: # Skip levels that drop nothing more
+                vertex_count = len(simplified)
+                self._lod_polygons.append((tolerance, QPolygonF([QPointF(x, y) for x, y in simplified.tolist()])))
+
+    def paint(self, painter, option, widget=None):
+        lod = self._level_of_detail(painter, option)
+        polygon = None
+        for tolerance, simplified in self._lod_polygons:
+            if tolerance * lod > SIMPLIFY_SCREEN_PX:
+                break
+            polygon = simplified
+        if polygon is None:
+            super().paint(painter, option, widget)
+        else:
+            painter.setPen(self.pen())
+            painter.setBrush(self.brush())
+            painter.drawPolygon(polygon)
+            if option.state & QStyle.StateFlag.State_Selected:
+                painter.setPen(QPen(option.palette.windowText(), 0, Qt.PenStyle.DashLine))
+                painter.setBrush(Qt.BrushStyle.NoBrush)
+                painter.drawRect(self.boundingRect())
+        if self._holes:
+            painter.setPen(self.pen())
+            painter.setBrush(Qt.BrushStyle.NoBrush)
+            for hole in self._holes:
+                painter.drawPolygon(hole)
+
+    def scene_points(self):
+        return [self.mapToScene(point) for point in self.polygon()]
+
+    def scene_holes(self):
+        return [[(p.x(), p.y()) for p in (self.mapToScene(point) for point in hole)] for hole in self._holes]
+
+    def get_data_for_db(self):
+        data = super().get_data_for_db()
+        data['style']['fill'] = None
+        data['holes'] = self.scene_holes()
+        return data
+
+
+class CountMeasurementItem(MeasurementItemMixin, QGraphicsEllipseItem):
+    """One counted object (value 1), drawn as a circle around its point."""
+    def __init__(self, point, db_id=None, layer_id=None, value=1, unit="ea", page=0, parent=None):
+        super().__init__(parent)
+        self._set_points([point])
+        self.setPen(QPen(QColor("blue"), 2))
+        self.setBrush(QBrush(Qt.BrushStyle.NoBrush))
+        self._init_measurement(db_id, layer_id, value, unit, page, "count")
+
+    @staticmethod
+    def _init_args(record):
+        (x, y), = record.points[:1]
+        return QPointF(x, y), record.db_id, record.layer_id, record.value, record.unit, record.page
+
+    def _set_points(self, points):
+        r = COUNT_MARKER_RADIUS
+        self.setRect(points[0].x() - r, points[0].y() - r, 2 * r, 2 * r)
+
+    def paint(self, painter, option, widget=None):
+        self._level_of_detail(painter, option)
+        super().paint(painter, option, widget)
+
+    def scene_points(self):
+        return [self.mapToScene(self.rect().center())]
+
+
+class MeasurementOverviewItem(QGraphicsItem):
+    """Draws measurements too small to see individually, as dots in one item.
+
+    Zoomed far out, thousands of measurements cover a pixel or two each;
+    one batch of points per layer colour replaces thousands of items. The
+    drawing is cached in device coordinates, so panning reuses it.
+    """
+    DOT_PX = 2 # Screen size of a dot
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._key = None
+        self._dots = [] # (colour, QPolygonF of centres)
+        self._rect = QRectF()
+        self.setZValue(-0.5) # Above the page, below the measurement items
+        self.setAcceptedMouseButtons(Qt.MouseButton.NoButton)
+        self.setCacheMode(QGraphicsItem.CacheMode.DeviceCoordinateCache)
+
+    def set_records(self, records, colors, pixel_size):
+        """Show `records` as dots coloured by layer; `colors` maps the visible layer IDs to colours.
+
+        `pixel_size` is the scene size of a screen pixel, for the margin of the dots.
+        """
+        key = (frozenset(records), tuple(sorted(colors.items())), pixel_size)
+        if key == self._key:
+            return
+        self._key = key
+        centres = {}
+        x0 = y0 = float('inf')
+        x1 = y1 = float('-inf')
+        for record in records:
+            color = colors.get(record.layer_id)
+            if color is None:
+                continue # Hidden layer
+            bx0, by0, bx1, by1 = record.bounds
+            centres.setdefault(color, []).append(QPointF((bx0 + bx1) / 2, (by0 + by1) / 2))
+            x0, y0, x1, y1 = min(x0, bx0), min(y0, by0), max(x1, bx1), max(y1, by1)
+        self.prepareGeometryChange()
+        self._dots = [(QColor(color), QPolygonF(points)) for color, points in centres.items()]
+        margin = self.DOT_PX * pixel_size
+        self._rect = QRectF(x0, y0, x1 - x0, y1 - y0).adjusted(-margin, -margin, margin, margin) if centres else QRectF()
+        self.update()
+
+    def boundingRect(self):
+        return self._rect
+
+    def paint(self, painter, option, widget=None):
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing, False)
+        for color, points in self._dots:
+            pen = QPen(color, self.DOT_PX)
+            pen.setCosmetic(True)
+            painter.setPen(pen)
+            painter.drawPoints(points)
+
+
+ITEM_CLASSES = {'linear': LinearMeasurementItem, 'area': AreaMeasurementItem, 'count': CountMeasurementItem}
@@ -0,0 +1,34 @@
+# takeoff.py (Command-line batch quantity takeoff, no GUI required)
+import argparse
+import sys
+
+from TakeoffEngine import find_projects, iter_totals, write_report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute per-layer and per-type takeoff totals for QSTape projects.")
+    parser.add_argument('paths', nargs='+', help=".qst files or directories to search for them")
+    parser.add_argument('-f', '--format', choices=['csv', 'json'], default='csv',
+                        help="csv rows, or JSON lines with one object per project (default: csv)")
+    parser.add_argument('-o', '--output', help="Report file (default: standard output)")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help="Worker processes (default: one per CPU core)")
+    args = parser.parse_args(argv)
+
+    projects = find_projects(args.paths)
+    if not projects:
+        print("No .qst projects found.", file=sys.stderr)
+        return 1
+
+    out = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    try:
+        count = write_report(iter_totals(projects, args.workers), out, args.format)
+    finally:
+        if args.output:
+            out.close()
+    print(f"Processed {count} projects.", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+# test_PolygonOps.py (Polygon booleans and the holes BLOB format; run with python -m unittest)
+import unittest
+
+import GeometryKernel
+import PolygonOps
+from ProjectManager import pack_points, pack_rings, unpack_rings
+
+
+def square(x, y, size):
+    return [(x, y), (x + size, y), (x + size, y + size), (x, y + size)]
+
+
+class BooleanTest(unittest.TestCase):
+    def test_union_of_overlapping_squares(self):
+        polygons = PolygonOps.union([(square(0, 0, 10), []), (square(5, 0, 10), [])])
+        self.assertEqual(len(polygons), 1)
+        outer, holes = polygons[0]
+        self.assertAlmostEqual(PolygonOps.polygon_area(outer, holes), 150.0)
+        self.assertEqual(len(outer), 4) # Vertices on the joined edges are dropped
+
+    def test_union_of_squares_sharing_an_edge_is_one_rectangle(self):
+        polygons = PolygonOps.union([(square(0, 0, 10), []), (square(10, 0, 10), [])])
+        self.assertEqual([len(outer) for outer, _ in polygons], [4])
+
+    def test_union_of_disjoint_squares_stays_apart(self):
+        polygons = PolygonOps.union([(square(0, 0, 10), []), (square(50, 0, 10), [])])
+        self.assertEqual(sorted(PolygonOps.polygon_area(*p) for p in polygons), [100.0, 100.0])
+
+    def test_intersection(self):
+        polygons = PolygonOps.intersection([(square(0, 0, 10), []), (square(5, 5, 10), [])])
+        self.assertEqual(len(polygons), 1)
+        self.assertAlmostEqual(PolygonOps.polygon_area(*polygons[0]), 25.0)
+        self.assertEqual(PolygonOps.intersection([(square(0, 0, 10), []), (square(50, 0, 10), [])]), [])
+
+    def test_difference_inside_makes_a_hole(self):
+        polygons = PolygonOps.difference((square(0, 0, 100), []), [(square(40, 40, 20), [])])
+        self.assertEqual(len(polygons), 1)
+        outer, holes = polygons[0]
+        self.assertAlmostEqual(PolygonOps.ring_area(outer), 10000.0)
+        self.assertEqual(len(holes), 1)
+        self.assertAlmostEqual(PolygonOps.ring_area(holes[0]), 400.0)
+
+    def test_difference_across_splits_the_subject(self):
+        polygons = PolygonOps.difference((square(0, 0, 30), []), [([(10, -5), (20, -5), (20, 35), (10, 35)], [])])
+        self.assertEqual(sorted(PolygonOps.polygon_area(*p) for p in polygons), [300.0, 300.0])
+
+    def test_island_inside_a_hole_is_an_outline_of_its_own(self):
+        path = PolygonOps.to_path(square(0, 0, 100), [square(20, 20, 60)])
+        path = path.united(PolygonOps.to_path(square(40, 40, 20)))
+        polygons = sorted(PolygonOps.from_path(path), key=lambda p: PolygonOps.ring_area(p[0]))
+        self.assertEqual([(PolygonOps.ring_area(outer), len(holes)) for outer, holes in polygons],
+                         [(400.0, 0), (10000.0, 1)])
+        self.assertAlmostEqual(PolygonOps.ring_area(polygons[1][1][0]), 3600.0)
+
+
+class BulkTest(unittest.TestCase):
+    def test_overlapping_pairs_within_one_set(self):
+        bounds = [(0, 0, 10, 10), (5, 5, 15, 15), (20, 0, 30, 10), (10, 10, 12, 12), (0, 50, 10, 60)]
+        self.assertEqual(sorted(PolygonOps.overlapping_pairs(bounds)), [(0, 1), (0, 3), (1, 3)])
+
+    def test_overlapping_pairs_between_two_sets(self):
+        subjects = [(0, 0, 10, 10), (100, 100, 110, 110)]
+        clips = [(105, 105, 120, 120), (5, 20, 8, 30), (2, 2, 3, 3)]
+        self.assertEqual(sorted(PolygonOps.overlapping_pairs(subjects, clips)), [(0, 2), (1, 0)])
+
+    def test_deduct_leaves_untouched_subjects_out(self):
+        subjects = [(square(0, 0, 100), []), (square(200, 0, 100), [])]
+        clips = [(square(10, 10, 10), []), ([(150, 5), (195, 5), (195, 50)], [])] # The second only overlaps a box
+        results = PolygonOps.deduct(subjects, clips)
+        self.assertEqual(list(results), [0])
+        self.assertAlmostEqual(PolygonOps.polygon_area(*results[0][0]), 9900.0)
+
+    def test_merge_overlapping(self):
+        polygons = [(square(0, 0, 10), []), (square(5, 0, 10), []), (square(100, 0, 10), []), (square(14, 0, 5), [])]
+        groups = PolygonOps.merge_overlapping(polygons)
+        self.assertEqual(len(groups), 1)
+        members, merged = groups[0]
+        self.assertEqual(sorted(members), [0, 1, 3])
+        self.assertAlmostEqual(sum(PolygonOps.polygon_area(*p) for p in merged), 170.0)
+
+
+class RingsBlobTest(unittest.TestCase):
+    def test_round_trip(self):
+        rings = [square(0, 0, 2), [(5.5, 1.0), (7.0, 1.0), (6.0, 3.25)]]
+        self.assertEqual(unpack_rings(pack_rings(rings)), [[(float(x), float(y)) for x, y in ring] for ring in rings])
+
+    def test_no_rings_is_null(self):
+        self.assertIsNone(pack_rings([]))
+        self.assertEqual(unpack_rings(None), [])
+
+    def test_hole_areas_read_the_same_format(self):
+        blobs = [pack_rings([square(0, 0, 2), square(10, 10, 3)]), None, pack_rings([[(0, 0), (4, 0), (0, 4)]])]
+        self.assertEqual(GeometryKernel.hole_areas(blobs).tolist(), [13.0, 0.0, 8.0])
+
+    def test_scaled_values_subtract_holes(self):
+        values = GeometryKernel.scaled_values(['area'], [pack_points(square(0, 0, 10))], 0.5,
+                                              [pack_rings([square(2, 2, 2)])])
+        self.assertAlmostEqual(values[0], (100 - 4) * 0.25)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+# test_ProjectManager.py (Point BLOB encoding; run with python -m unittest)
+import os
+import sqlite3
+import struct
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest import mock
+
+from ProjectManager import MIGRATIONS, ProjectManager, pack_points, unpack_points
+
+
+POINTS = [(1.0, 2.0), (3.0, 4.0), (5.5, -6.25)]
+
+
+class PointEncodingTest(unittest.TestCase):
+    def test_blob_is_little_endian_pairs(self):
+        self.assertEqual(pack_points(POINTS), struct.pack('<6d', 1.0, 2.0, 3.0, 4.0, 5.5, -6.25))
+        self.assertEqual(unpack_points(struct.pack('<6d', 1.0, 2.0, 3.0, 4.0, 5.5, -6.25)), POINTS)
+
+    def test_round_trip_on_big_endian_host(self):
+        # Both sides byteswap on a big-endian host; the pairs must come back as (x, y) floats
+        with mock.patch.object(sys, 'byteorder', 'big'):
+            decoded = unpack_points(pack_points(POINTS))
+        self.assertEqual(decoded, POINTS)
+        self.assertTrue(all(isinstance(x, float) and isinstance(y, float) for x, y in decoded))
+
+    def test_legacy_json_and_empty(self):
+        self.assertEqual(unpack_points('[[1, 2], [3, 4]]'), [(1, 2), (3, 4)])
+        self.assertEqual(unpack_points(None), [])
+        self.assertEqual(unpack_points(b''), [])
+
+
+def item(x, y, value=1.0, item_type='linear', page=0, source_id=1, layer_id=1):
+    return {'layer_id': layer_id, 'source_id': source_id, 'page': page, 'type': item_type,
+            'points': [(x, y), (x + 10, y + 10)], 'value': value, 'unit': 'm', 'style': {}}
+
+
+class ProjectTestCase(unittest.TestCase):
+    """A fresh project file per test, with one layer and one source document."""
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        with redirect_stdout(StringIO()):
+            self.manager = ProjectManager(os.path.join(self.directory.name, 'test.qst'))
+            self.manager.add_sources(['plan.pdf'])
+            self.layer_id = self.manager.add_layer('Walls')
+
+    def tearDown(self):
+        with redirect_stdout(StringIO()):
+            self.manager.close()
+        self.directory.cleanup()
+
+    def item_count(self):
+        return self.manager.conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+
+class TransactionTest(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        # Inserting a negative value fails, to make a write fail on demand
+        self.manager.conn.execute("CREATE TRIGGER reject_negative BEFORE INSERT ON items WHEN NEW.value < 0 "
+                                  "BEGIN SELECT RAISE(ABORT, 'negative value'); END")
+
+    def test_failed_write_outside_a_transaction_returns_failure(self):
+        with redirect_stdout(StringIO()):
+            self.assertEqual(self.manager.save_items([item(0, 0, value=-1)]), [])
+        self.assertEqual(self.item_count(), 0)
+
+    def test_failed_write_rolls_back_the_whole_transaction(self):
+        with self.assertRaises(sqlite3.Error):
+            with self.manager.transaction():
+                self.manager.save_items([item(0, 0)])
+                self.manager.save_items([item(5, 5, value=-1)])
+        self.assertEqual(self.item_count(), 0)
+        self.assertFalse(self.manager.conn.in_transaction)
+
+    def test_caught_error_undoes_only_the_failed_write(self):
+        with self.manager.transaction():
+            self.manager.save_items([item(0, 0)])
+            with self.assertRaises(sqlite3.Error):
+                self.manager.save_items([item(1, 1), item(5, 5, value=-1)])
+        self.assertEqual(self.item_count(), 1)
+
+
+class SpatialIndexTest(ProjectTestCase):
+    def indexed(self):
+        """{item ID: (min_x, max_x, min_y, max_y, min_page, max_page)} of the R*Tree."""
+        rows = self.manager.conn.execute("SELECT * FROM items_rtree").fetchall()
+        return {row[0]: tuple(row[1:]) for row in rows}
+
+    def test_migration_backfills_existing_items(self):
+        path = os.path.join(self.directory.name, 'old.qst')
+        old = ProjectManager()
+        old.conn = sqlite3.connect(path)
+        old.cursor = old.conn.cursor()
+        for migration in MIGRATIONS[:5]: # A file written before the spatial index
+            migration(old)
+        old.cursor.execute("INSERT INTO project (id, name, source_path, source_type) VALUES (1, 'Old', 'plan.pdf', 'pdf')")
+        old.cursor.executemany("INSERT INTO items (project_id, layer_id, page, type, points) VALUES (1, 1, ?, 'linear', ?)",
+                               [(0, pack_points([(0, 0), (10, 20)])), (3, pack_points([(50, 60), (40, 80)])),
+                                (0, pack_points([]))])
+        old.cursor.execute("PRAGMA user_version = 5")
+        old.conn.commit()
+        old.conn.close()
+        with redirect_stdout(StringIO()):
+            manager = ProjectManager(path)
+        try:
+            self.assertTrue(manager.has_rtree)
+            rows = {row[0]: tuple(row[1:]) for row in manager.conn.execute("SELECT * FROM items_rtree")}
+            self.assertEqual(rows, {1: (0, 10, 0, 20, 0, 0), 2: (40, 50, 60, 80, 3, 3)}) # No box without points
+            self.assertEqual(manager.item_ids_in_region(45, 70, 46, 71, page=3, source_id=1), [2])
+        finally:
+            with redirect_stdout(StringIO()):
+                manager.close()
+
+    def test_saved_items_are_indexed(self):
+        first = self.manager.save_item(item(0, 0, page=2))
+        others = self.manager.save_items([item(100, 50), item(200, 0)])
+        self.assertEqual(self.indexed(), {first: (0, 10, 0, 10, 2, 2), others[0]: (100, 110, 50, 60, 0, 0),
+                                          others[1]: (200, 210, 0, 10, 0, 0)})
+        self.assertEqual(self.manager.item_ids_in_region(105, 55, 150, 70, page=0, source_id=1), [others[0]])
+        self.assertEqual(self.manager.item_ids_at_point(5, 5, page=0, source_id=1), [])
+        self.assertEqual(self.manager.item_ids_at_point(5, 5, page=2, source_id=1), [first])
+
+    def test_replaced_items_are_reindexed(self):
+        old_ids = self.manager.save_items([item(0, 0), item(20, 0)])
+        new_ids = self.manager.replace_items(old_ids, [item(500, 500)])
+        self.assertEqual(self.indexed(), {new_ids[0]: (500, 510, 500, 510, 0, 0)})
+
+    def test_moved_points_are_reindexed(self):
+        first, second = self.manager.save_items([item(0, 0), item(20, 0)])
+        self.manager.update_item_points(first, [(300, 300), (310, 330)])
+        self.manager.update_items_points([(second, [(-5, -5), (5, 5)])])
+        self.assertEqual(self.indexed(), {first: (300, 310, 300, 330, 0, 0), second: (-5, 5, -5, 5, 0, 0)})
+        self.assertEqual(self.manager.item_ids_at_point(305, 320, page=0, source_id=1), [first])
+
+    def test_deleted_items_leave_the_index(self):
+        ids = self.manager.save_items([item(0, 0), item(20, 0), item(40, 0), item(60, 0)])
+        self.manager.delete_item(ids[0])
+        self.manager.delete_items(ids[1:3])
+        self.assertEqual(list(self.indexed()), [ids[3]])
+
+    def test_deleted_layer_leaves_the_index(self):
+        other_layer = self.manager.add_layer('Doors')
+        kept = self.manager.save_items([item(0, 0)])
+        self.manager.save_items([item(20, 0, layer_id=other_layer), item(40, 0, layer_id=other_layer)])
+        self.manager.delete_layer(other_layer)
+        self.assertEqual(list(self.indexed()), kept)
+
+
+class SourcePageTest(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        self.manager.add_sources(['details.pdf'])
+        # Page 0 of both documents
+        self.plan_id, self.details_id = self.manager.save_items([item(0, 0, value=2.0), item(0, 0, value=3.0, source_id=2)])
+
+    def test_page_queries_need_a_source(self):
+        with self.assertRaises(ValueError):
+            self.manager.item_ids_in_region(0, 0, 10, 10, page=0)
+        with self.assertRaises(ValueError):
+            self.manager.item_ids_at_point(5, 5, page=0)
+        with self.assertRaises(ValueError):
+            self.manager.load_item_totals(page=0)
+
+    def test_page_queries_stay_in_their_document(self):
+        self.assertEqual(self.manager.item_ids_at_point(5, 5, page=0, source_id=2), [self.details_id])
+        self.assertEqual(sorted(self.manager.item_ids_in_region(0, 0, 10, 10)), [self.plan_id, self.details_id])
+        self.assertEqual([t['total'] for t in self.manager.load_item_totals(page=0, source_id=1)], [2.0])
+        self.assertEqual([t['total'] for t in self.manager.load_item_totals(source_id=2)], [3.0])
+        self.assertEqual([t['total'] for t in self.manager.load_item_totals()], [5.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+# test_ResultsModel.py (Sorting of the measurements table; run with python -m unittest)
+import unittest
+from types import SimpleNamespace
+
+from PyQt6.QtCore import QPersistentModelIndex, Qt
+
+from ResultsModel import COL_ID, COL_VALUE, ResultsModel
+
+
+def measurement(db_id, value):
+    return SimpleNamespace(db_id=db_id, item_type='linear', layer_id=1, value=value, unit='m')
+
+
+class SortTest(unittest.TestCase):
+    def setUp(self):
+        self.model = ResultsModel()
+        self.model.set_items([measurement(1, 5.0), measurement(2, 1.0), measurement(3, 3.0)])
+
+    def ids(self):
+        return [self.model.data(self.model.index(row, COL_ID)) for row in range(self.model.rowCount())]
+
+    def test_sort_by_value(self):
+        self.model.sort(COL_VALUE)
+        self.assertEqual(self.ids(), [2, 3, 1])
+        self.model.sort(COL_VALUE, Qt.SortOrder.DescendingOrder)
+        self.assertEqual(self.ids(), [1, 3, 2])
+
+    def test_persistent_indexes_follow_their_rows(self):
+        first = QPersistentModelIndex(self.model.index(0, COL_VALUE)) # ID 1
+        last = QPersistentModelIndex(self.model.index(2, COL_ID)) # ID 3
+        self.model.sort(COL_VALUE)
+        self.assertEqual((first.row(), first.column()), (2, COL_VALUE))
+        self.assertEqual((last.row(), last.column()), (1, COL_ID))
+        self.model.add_items([measurement(4, 0.5)])
+        self.assertEqual((first.row(), last.row()), (3, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
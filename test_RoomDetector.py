@@ -0,0 +1,82 @@
+# test_RoomDetector.py (One-click room outlines on synthetic rasters; run with python -m unittest)
+import unittest
+
+import numpy as np
+
+import PolygonOps
+from RoomDetector import Runs, detect_room, fill_holes
+
+
+def plan(height=200, width=300):
+    """A blank page with two rooms side by side: 1-pixel walls around (40..140, 40..140) and (140..240, 40..140)."""
+    raster = np.ones((height, width))
+    raster[40, 40:241] = 0.0
+    raster[140, 40:241] = 0.0
+    raster[40:141, 40] = 0.0
+    raster[40:141, 140] = 0.0
+    raster[40:141, 240] = 0.0
+    return raster
+
+
+class DetectRoomTest(unittest.TestCase):
+    def test_closed_room_is_outlined_to_the_wall_faces(self):
+        outline = detect_room(plan(), 90, 90)
+        self.assertEqual(len(outline), 4)
+        self.assertEqual((outline[:, 0].min(), outline[:, 1].min(), outline[:, 0].max(), outline[:, 1].max()),
+                         (41, 41, 140, 140))
+        self.assertAlmostEqual(PolygonOps.ring_area([tuple(p) for p in outline]), 99 * 99)
+
+    def test_clicks_find_their_own_room(self):
+        outline = detect_room(plan(), 190, 60)
+        self.assertEqual((outline[:, 0].min(), outline[:, 0].max()), (141, 240))
+
+    def test_text_inside_the_room_is_filled(self):
+        raster = plan()
+        raster[80:90, 60:100] = 0.0
+        outline = detect_room(raster, 90, 120)
+        self.assertAlmostEqual(PolygonOps.ring_area([tuple(p) for p in outline]), 99 * 99)
+
+    def test_small_gap_in_a_wall_does_not_leak(self):
+        raster = plan()
+        raster[40, 90:93] = 1.0
+        outline = detect_room(raster, 90, 90)
+        self.assertEqual((outline[:, 1].min(), outline[:, 1].max()), (41, 140))
+
+    def test_point_on_a_line_is_rejected(self):
+        with self.assertRaisesRegex(ValueError, "on a line"):
+            detect_room(plan(), 140, 90)
+
+    def test_open_region_is_rejected(self):
+        with self.assertRaisesRegex(ValueError, "not closed"):
+            detect_room(plan(), 10, 10)
+        raster = plan()
+        raster[40, 60:120] = 1.0
+        with self.assertRaisesRegex(ValueError, "not closed"):
+            detect_room(raster, 90, 90)
+
+    def test_point_outside_the_page_is_rejected(self):
+        with self.assertRaisesRegex(ValueError, "outside the page"):
+            detect_room(plan(), 400, 10)
+
+
+class RunsTest(unittest.TestCase):
+    def test_flood_fill_follows_4_connectivity(self):
+        mask = np.array([[1, 1, 0, 0],
+                         [0, 1, 0, 1],
+                         [0, 0, 1, 1]], dtype=bool)
+        runs = Runs(mask)
+        filled = runs.to_mask(runs.flood_fill(0, 0), (0, 0, 3, 4))
+        self.assertEqual(filled.tolist(), [[True, True, False, False],
+                                           [False, True, False, False],
+                                           [False, False, False, False]])
+        self.assertEqual(len(runs.flood_fill(0, 2)), 0)
+
+    def test_fill_holes(self):
+        ring = np.ones((5, 5), dtype=bool)
+        ring[1:4, 1:4] = False
+        ring[2, 2] = True
+        self.assertTrue(fill_holes(ring).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+# test_SymbolMatcher.py (Template correlation, peak picking and template boxes; run with python -m unittest)
+import unittest
+
+import numpy as np
+
+from SymbolMatcher import find_peaks, normalized_cross_correlation, template_from_raster
+
+
+def symbol():
+    """An 8 x 8 cross in a box, black on white."""
+    template = np.ones((8, 8), dtype=np.float32)
+    template[0, :] = template[-1, :] = template[:, 0] = template[:, -1] = 0.0
+    template[3:5, :] = template[:, 3:5] = 0.0
+    return template
+
+
+def page(positions, height=60, width=80):
+    raster = np.ones((height, width), dtype=np.float32)
+    for row, col in positions:
+        raster[row:row + 8, col:col + 8] = symbol()
+    return raster
+
+
+class CorrelationTest(unittest.TestCase):
+    def test_scores_peak_at_the_copies(self):
+        scores = normalized_cross_correlation(page([(5, 7), (30, 50)]), symbol())
+        self.assertEqual(scores.shape, (53, 73))
+        self.assertAlmostEqual(float(scores[5, 7]), 1.0, places=4)
+        self.assertAlmostEqual(float(scores[30, 50]), 1.0, places=4)
+        scores[5, 7] = scores[30, 50] = 0.0
+        self.assertLess(float(scores.max()), 0.9)
+
+    def test_blocks_give_the_same_scores_as_one_transform(self):
+        raster = page([(3, 3), (20, 40), (45, 60)])
+        raster += np.random.default_rng(1).uniform(-0.05, 0.05, raster.shape).astype(np.float32)
+        whole = normalized_cross_correlation(raster, symbol(), fft_size=128)
+        blocked = normalized_cross_correlation(raster, symbol(), fft_size=16)
+        np.testing.assert_allclose(blocked, whole, atol=1e-4)
+
+    def test_blank_paper_scores_zero(self):
+        scores = normalized_cross_correlation(np.ones((30, 30), dtype=np.float32), symbol())
+        self.assertFalse(scores.any())
+
+    def test_template_larger_than_the_page(self):
+        self.assertEqual(normalized_cross_correlation(np.ones((4, 4)), symbol()).size, 0)
+
+
+class PeaksTest(unittest.TestCase):
+    def test_neighbours_of_a_peak_are_suppressed(self):
+        scores = np.zeros((40, 40), dtype=np.float32)
+        scores[10, 10] = 0.95
+        scores[11, 12] = 0.9  # Within half a template of the first
+        scores[10, 20] = 0.8  # Far enough along x
+        scores[30, 30] = 0.5  # Below the threshold
+        self.assertEqual([(row, col) for row, col, _ in find_peaks(scores, 0.7, (8, 8))], [(10, 10), (10, 20)])
+
+    def test_no_candidates(self):
+        self.assertEqual(find_peaks(np.zeros((5, 5)), 0.7, (2, 2)), [])
+
+
+class TemplateTest(unittest.TestCase):
+    def test_box_is_scaled_to_the_raster(self):
+        raster = page([(10, 20)])
+        template = template_from_raster(raster, (40, 20, 56, 36), base_dpi=150, dpi=75)
+        np.testing.assert_array_equal(template, symbol())
+
+    def test_box_is_clamped_to_the_page(self):
+        raster = page([(0, 0), (52, 72)])
+        template = template_from_raster(raster, (-50, -50, 16, 16), base_dpi=150, dpi=75)
+        np.testing.assert_array_equal(template, symbol())
+        template = template_from_raster(raster, (140, 100, 400, 400), base_dpi=150, dpi=75)
+        np.testing.assert_array_equal(template[2:, 2:], symbol())
+
+    def test_box_outside_the_page(self):
+        for rect in ((200, 0, 300, 50), (-60, -60, -20, -20), (30, 0, 20, 10)):
+            with self.assertRaisesRegex(ValueError, "outside the page"):
+                template_from_raster(page([(0, 0)]), rect, base_dpi=150, dpi=75)
+
+    def test_small_or_blank_boxes(self):
+        with self.assertRaisesRegex(ValueError, "too small"):
+            template_from_raster(page([(0, 0)]), (0, 0, 4, 4), base_dpi=150, dpi=75)
+        with self.assertRaisesRegex(ValueError, "no drawing"):
+            template_from_raster(page([(0, 0)]), (60, 60, 100, 100), base_dpi=150, dpi=75)
+
+
+if __name__ == '__main__':
+    unittest.main()